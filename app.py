@@ -1,62 +1,53 @@
+import fcntl
+import json
 import os
 import urllib.parse
-import sqlite3
-import xml.etree.ElementTree as ET
 
-from flask import Flask, g, render_template, redirect, request, send_from_directory, url_for
+import click
+from flask import Flask, render_template, redirect, request, send_from_directory, url_for
 from flask_babel import Babel, _, get_locale
 from babel import Locale
 
 
+def sitemap_version(app):
+    # The sitemaps only change along with the dictionary or the settings
+    # used to build their URLs
+    return json.dumps([
+        file_version(app.config["DB_PATH"])(),
+        app.config["CANONICAL_URL"],
+        app.config["BABEL_DEFAULT_LOCALE"],
+    ])
+
+
 def generate_sitemap(app):
-    db = sqlite3.connect(app.config["DB_PATH"])
-    c = db.cursor()
-    c.execute("SELECT traditional FROM entries")
-
-    records = c.fetchall()
-    if not records:
-        return
-
-    sitemap_urls = []
-    for i in range(0, len(records), 10000):
-        # Sitemaps have a maximum of 50000 urls per file
-        root_elem = ET.Element("urlset")
-        root_elem.set("xmlns", "http://www.sitemaps.org/schemas/sitemap/0.9")
-
-        for j in range(i, min(i + 10000, len(records))):
-            headword = urllib.parse.quote(records[j][0], safe="")
-
-            url_elem = ET.SubElement(root_elem, "url")
-            loc_elem = ET.SubElement(url_elem, "loc")
-            if app.config["BABEL_DEFAULT_LOCALE"] == "en":
-                loc_elem.text = f"{app.config["CANONICAL_URL"]}/dictionary/entry/{headword}"
-            else:
-                loc_elem.text = f"{app.config["CANONICAL_URL"]}/dictionnaire/entree/{headword}"
-
-        tree = ET.ElementTree(root_elem)
-        tree.write(f"{os.getcwd()}/static/sitemap/sitemap{i // 10000}.xml", encoding="utf-8", xml_declaration=True)
-        sitemap_urls.append(f"{app.config["CANONICAL_URL"]}/sitemap{i // 10000}.xml")
-
-    root_elem = ET.Element("sitemapindex")
-    root_elem.set("xmlns", "http://www.sitemaps.org/schemas/sitemap/0.9")
-    for url in sitemap_urls:
-        sitemap_elem = ET.SubElement(root_elem, "sitemap")
-        loc_elem = ET.SubElement(sitemap_elem, "loc")
-        loc_elem.text = url
-    tree = ET.ElementTree(root_elem)
-    tree.write(f"{os.getcwd()}/static/sitemap/sitemap_index.xml", encoding="utf-8", xml_declaration=True)
-
-    with open(f"{os.getcwd()}/static/robots/robots.txt", "w") as robots:
-        for url in sitemap_urls:
-            robots.write(f"Sitemap: {url}\n")
+    canonical_url = app.config["CANONICAL_URL"]
+    if app.config["BABEL_DEFAULT_LOCALE"] == "en":
+        entry_path = "/dictionary/entry"
+    else:
+        entry_path = "/dictionnaire/entree"
+
+    # The dates on which the entry pages last changed are kept between
+    # builds, outside of the dictionary that is replaced on each update
+    os.makedirs(app.instance_path, exist_ok=True)
+    build_sitemaps(
+        app.config["DB_PATH"],
+        os.path.join(app.instance_path, "sitemap_lastmod.db"),
+        app.static_folder,
+        canonical_url,
+        entry_path,
+    )
 
 
 try:
     # For Gunicorn
     from dictionnaire.urls import dictionary_app
+    from dictionnaire.sitemap import build_sitemaps, open_atomically
+    from dictionnaire.utils.cache_utils import file_version
 except:
     # For local development
     from .dictionnaire.urls import dictionary_app
+    from .dictionnaire.sitemap import build_sitemaps, open_atomically
+    from .dictionnaire.utils.cache_utils import file_version
 
 app = Flask(__name__)
 app.config.from_object('cantonais_org.default_settings')
@@ -70,15 +61,34 @@ app.register_blueprint(dictionary_app, name="dictionary", url_prefix="/dictionar
 app.jinja_env.filters["quote"] = lambda x: urllib.parse.quote(x, safe="")
 app.jinja_env.filters["log"] = lambda x: print(x)
 
-generate_sitemap(app)
 
+@app.cli.command("build-sitemap")
+@click.option("--force", is_flag=True, help="Rebuild even if the dictionary has not changed.")
+def build_sitemap(force):
+    """Writes the sitemaps and robots.txt for the current dictionary."""
+    os.makedirs(app.instance_path, exist_ok=True)
+    version_path = os.path.join(app.instance_path, "sitemap_version.json")
+
+    # Several workers or deploy hooks may run this at once: the others wait
+    # for the first build to finish, then find the sitemaps up to date
+    with open(os.path.join(app.instance_path, "sitemap.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        version = sitemap_version(app)
+        try:
+            with open(version_path) as version_file:
+                built_version = version_file.read()
+        except OSError:
+            built_version = None
 
-@app.teardown_appcontext
-def teardown_db(exception):
-    db = g.pop("db", None)
+        if version == built_version and not force:
+            click.echo("Sitemaps are up to date.")
+            return
 
-    if db is not None:
-        db.close()
+        generate_sitemap(app)
+        with open_atomically(version_path) as version_file:
+            version_file.write(version.encode())
+        click.echo("Sitemaps built.")
 
 
 @app.route('/robots.txt')
@@ -86,7 +96,7 @@ def robot_from_root():
     return send_from_directory(f"{app.static_folder}/robots/", request.path[1:])
 
 @app.route('/sitemap_index.xml')
-@app.route('/sitemap<sitemap_num>.xml')
+@app.route('/sitemap<int:sitemap_num>.xml.gz')
 def sitemap_from_root(sitemap_num=None):
     return send_from_directory(f"{app.static_folder}/sitemap/", request.path[1:])
 
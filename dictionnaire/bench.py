@@ -0,0 +1,153 @@
+import click
+from flask.cli import with_appcontext
+
+# Benchmarks run from the command line, kept out of the modules loaded by
+# the web workers. Their dependencies are imported when they run.
+
+
+def baseline_copy(value, classes=None, strings=None):
+    """Copies loaded results into the shape they had before the models were
+    slotted and their repeated strings interned: every model is an instance
+    of an unslotted class with its own __dict__, each string object gets a
+    copy of its own (so that interned strings are no longer shared), and
+    the definitions snippet is computed up front.
+
+    Args:
+        value: Results, or any value within them
+        classes (dict | None, optional): Unslotted class made for each
+            model. Defaults to None, for a new copy.
+        strings (dict | None, optional): Copy made of each string object.
+            Defaults to None, for a new copy.
+
+    Returns:
+        The copy
+    """
+    import dataclasses
+
+    from . import models
+
+    classes = {} if classes is None else classes
+    strings = {} if strings is None else strings
+
+    if isinstance(value, str):
+        # Encoding and decoding gives a new string, rather than the same one
+        if id(value) not in strings:
+            strings[id(value)] = (value, value.encode().decode())
+        return strings[id(value)][1]
+    if isinstance(value, (list, tuple)):
+        return type(value)(baseline_copy(item, classes, strings) for item in value)
+    if isinstance(value, dict):
+        return {
+            key: baseline_copy(item, classes, strings) for key, item in value.items()
+        }
+    if not dataclasses.is_dataclass(value):
+        return value
+
+    model = type(value)
+    if model not in classes:
+        classes[model] = type(model.__name__, (), {})
+    res = classes[model]()
+    for model_field in dataclasses.fields(value):
+        if model_field.name != "_cached_fields":
+            setattr(
+                res,
+                model_field.name,
+                baseline_copy(getattr(value, model_field.name), classes, strings),
+            )
+    if isinstance(value, models.DefinitionsSet):
+        res._definitions_snippet = baseline_copy(
+            value._definitions_snippet, classes, strings
+        )
+    return res
+
+
+@click.command("benchmark-memory")
+@click.option("--search", "search_term", default="le", show_default=True,
+              help="Full-text search term.")
+@click.option("--limit", default=1000, show_default=True,
+              help="Number of search results hydrated.")
+@click.option("--entry", default="一", show_default=True,
+              help="Headword whose entry page is loaded.")
+@with_appcontext
+def benchmark_memory(search_term, limit, entry):
+    """Measures the memory used to load a large page of search results and
+    an entry page, along with the memory the same results would take up as
+    unslotted models without interned strings (see baseline_copy)."""
+    import gc
+    import tracemalloc
+
+    from . import queries
+
+    def measure(load):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = load()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, retained, peak
+
+    benchmarks = (
+        (f"search {search_term!r} ({limit} results)",
+         lambda: queries.query_full_text.__wrapped__(search_term, None, limit)),
+        (f"entry page {entry!r}",
+         lambda: queries.get_entry_page.__wrapped__(entry)),
+    )
+    for name, load in benchmarks:
+        # Results cached by an earlier run would not be allocated again
+        queries.query_cache.clear()
+        result, retained, peak = measure(load)
+        # The copy is measured on its own, the results being loaded already
+        baseline, baseline_retained, _ = measure(lambda: baseline_copy(result))
+        del result, baseline
+
+        click.echo(
+            f"{name}: {peak / 1024:.0f} KiB peak, {retained / 1024:.0f} KiB retained "
+            f"(baseline models: {baseline_retained / 1024:.0f} KiB retained)"
+        )
+
+
+@click.command("benchmark-script-detection")
+@click.option("--number", default=10000, show_default=True,
+              help="Number of calls timed per search term.")
+@click.option("--repeat", default=5, show_default=True,
+              help="Number of fresh interpreters the module is loaded in.")
+def benchmark_script_detection(number, repeat):
+    """Measures the time taken to load the script detector, and to classify
+    the script of a few search terms."""
+    import os
+    import subprocess
+    import sys
+    import timeit
+
+    from .utils import script_detector
+
+    # Each load is timed in a new interpreter, where the module is not
+    # imported yet, as it would be in a starting worker
+    module = script_detector.__name__
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    load_times = []
+    for _ in range(repeat):
+        res = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        # Each line reads "import time: <self> | <cumulative> | <module>"
+        for line in res.stderr.splitlines():
+            self_time, _, name = line.removeprefix("import time:").split("|")
+            if name.strip() == module:
+                load_times.append(int(self_time))
+    click.echo(f"load: {min(load_times) / 1000:.1f} ms")
+
+    for search_term in ("廣東話", "广东话", "gwong2 dung1 waa2", "le chinois cantonais " * 10):
+        call_time = timeit.timeit(
+            lambda: script_detector.classify_script(search_term), number=number
+        )
+        click.echo(f"classify {search_term[:20]!r}: {call_time / number * 1e6:.2f} µs")
+
+
+COMMANDS = (benchmark_memory, benchmark_script_detection)
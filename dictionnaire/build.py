@@ -0,0 +1,297 @@
+import json
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import urllib.parse
+
+from collections.abc import Callable
+
+from .utils import cantonese_utils, mandarin_utils
+
+# Romanization columns of the entries table that get a syllable index,
+# mapped to the name of the table holding that index
+SYLLABLE_INDEXES = {
+    "jyutping": "jyutping_syllables",
+    "pinyin": "pinyin_syllables",
+}
+# Syllable indexes of the fuzzy key of each syllable, which is shared by the
+# spellings that fuzzy searches let match each other
+FUZZY_KEY_INDEXES = {
+    "jyutping": "jyutping_fuzzy_keys",
+    "pinyin": "pinyin_fuzzy_keys",
+}
+FUZZY_KEYS = {
+    "jyutping": cantonese_utils.get_jyutping_fuzzy_key,
+    "pinyin": mandarin_utils.get_pinyin_fuzzy_key,
+}
+# Tables holding the number of entries containing each syllable, used to
+# rank the possible segmentations of a search term
+SYLLABLE_FREQUENCIES = {
+    "jyutping": "jyutping_syllable_frequencies",
+    "pinyin": "pinyin_syllable_frequencies",
+}
+
+# Example sentences containing headwords shorter than a trigram are looked
+# up in an n-gram table, and in a trigram full-text index otherwise
+EXAMPLE_NGRAMS_TABLE = "chinese_sentence_ngrams"
+EXAMPLE_TRIGRAMS_TABLE = "chinese_sentences_fts"
+MAX_EXAMPLE_NGRAM_LENGTH = 2
+
+# Entries and example sentences shown on each headword's page, so that
+# entry pages do not have to be assembled from the other tables
+ENTRY_PAGES_TABLE = "entry_pages"
+
+# LIKE is only case-insensitive for ASCII characters
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def build_syllable_index(
+    db: sqlite3.Connection,
+    column: str,
+    table: str,
+    key: Callable[[str], str] | None = None,
+) -> None:
+    """Creates an inverted index from each syllable of a romanization to the
+    entries that contain it at a given position, so that fuzzy searches only
+    have to look at the entries whose syllables could match.
+
+    Args:
+        db (sqlite3.Connection): Writable connection to the dictionary
+        column (str): Romanization column of the entries table to index
+        table (str): Name of the table to (re)create
+        key (Callable[[str], str] | None, optional): Function whose result
+            is indexed instead of each syllable, such as a fuzzy key.
+            Defaults to None.
+    """
+    c = db.cursor()
+    c.execute(f"DROP TABLE IF EXISTS {table}")
+    c.execute(
+        f"""CREATE TABLE {table}(
+                position INTEGER,
+                syllable TEXT,
+                fk_entry_id INTEGER,
+                is_last INTEGER,
+                PRIMARY KEY(position, syllable, fk_entry_id)
+            ) WITHOUT ROWID"""
+    )
+
+    def postings():
+        for entry_id, romanization in db.execute(
+            f"SELECT entry_id, {column} FROM entries"
+        ):
+            # Split on single spaces to mirror how search patterns are built
+            syllables = (romanization or "").split(" ")
+            for position, syllable in enumerate(syllables):
+                if key:
+                    syllable = key(syllable)
+                yield position, syllable, entry_id, position == len(syllables) - 1
+
+    c.executemany(f"INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?)", postings())
+
+
+def build_syllable_frequencies(db: sqlite3.Connection, column: str, table: str) -> None:
+    """Counts the entries containing each syllable of a romanization. The
+    syllable index of that romanization should be built first.
+
+    Args:
+        db (sqlite3.Connection): Writable connection to the dictionary
+        column (str): Romanization column of the entries table
+        table (str): Name of the table to (re)create
+    """
+    c = db.cursor()
+    c.execute(f"DROP TABLE IF EXISTS {table}")
+    c.execute(
+        f"""CREATE TABLE {table}(
+                syllable TEXT PRIMARY KEY,
+                frequency INTEGER
+            ) WITHOUT ROWID"""
+    )
+    c.execute(
+        f"""INSERT INTO {table}
+            SELECT syllable, COUNT(DISTINCT fk_entry_id)
+            FROM {SYLLABLE_INDEXES[column]}
+            GROUP BY syllable"""
+    )
+
+
+def build_syllable_indexes(db: sqlite3.Connection) -> None:
+    """Creates the syllable indexes, fuzzy key indexes and syllable
+    frequencies for every romanization.
+
+    Args:
+        db (sqlite3.Connection): Writable connection to the dictionary
+    """
+    for column, table in SYLLABLE_INDEXES.items():
+        build_syllable_index(db, column, table)
+        build_syllable_index(db, column, FUZZY_KEY_INDEXES[column], FUZZY_KEYS[column])
+        build_syllable_frequencies(db, column, SYLLABLE_FREQUENCIES[column])
+
+
+def build_example_indexes(db: sqlite3.Connection) -> None:
+    """Creates the indexes used to find the example sentences that contain a
+    headword without scanning every sentence.
+
+    Args:
+        db (sqlite3.Connection): Writable connection to the dictionary
+    """
+    c = db.cursor()
+    c.execute(f"DROP TABLE IF EXISTS {EXAMPLE_NGRAMS_TABLE}")
+    c.execute(
+        f"""CREATE TABLE {EXAMPLE_NGRAMS_TABLE}(
+                ngram TEXT,
+                fk_chinese_sentence_id INTEGER,
+                PRIMARY KEY(ngram, fk_chinese_sentence_id)
+            ) WITHOUT ROWID"""
+    )
+
+    def postings():
+        for sentence_id, traditional in db.execute(
+            "SELECT chinese_sentence_id, traditional FROM chinese_sentences"
+        ):
+            traditional = (traditional or "").translate(ASCII_LOWERCASE)
+            ngrams = set()
+            for length in range(1, MAX_EXAMPLE_NGRAM_LENGTH + 1):
+                for idx in range(len(traditional) - length + 1):
+                    ngrams.add(traditional[idx:idx + length])
+            for ngram in ngrams:
+                yield ngram, sentence_id
+
+    c.executemany(f"INSERT INTO {EXAMPLE_NGRAMS_TABLE} VALUES (?, ?)", postings())
+
+    c.execute(f"DROP TABLE IF EXISTS {EXAMPLE_TRIGRAMS_TABLE}")
+    c.execute(
+        f"""CREATE VIRTUAL TABLE {EXAMPLE_TRIGRAMS_TABLE} USING fts5(
+                traditional,
+                content='chinese_sentences',
+                content_rowid='chinese_sentence_id',
+                tokenize='trigram'
+            )"""
+    )
+    c.execute(
+        f"INSERT INTO {EXAMPLE_TRIGRAMS_TABLE}({EXAMPLE_TRIGRAMS_TABLE}) VALUES ('rebuild')"
+    )
+
+
+def fetch_entry_page(db: sqlite3.Connection, traditional: str) -> tuple[str, str]:
+    # Imported here, as queries needs the path of the database when loaded
+    from . import queries
+
+    c = db.cursor()
+    entries = queries.fetch_traditional(c, traditional)
+    examples = queries.fetch_examples(
+        c, traditional, per_source_limit=queries.EXAMPLE_SAMPLE_SIZE
+    )
+    return (
+        json.dumps(entries, ensure_ascii=False),
+        json.dumps(examples, ensure_ascii=False),
+    )
+
+
+def build_entry_pages(db: sqlite3.Connection) -> None:
+    """Runs the entry page queries for every headword, and stores their
+    results, so that showing an entry page only takes a single lookup.
+
+    The example indexes should be built first, as example sentences would
+    otherwise be found by scanning every sentence for each headword.
+
+    Args:
+        db (sqlite3.Connection): Writable connection to the dictionary
+    """
+    c = db.cursor()
+    c.execute(f"DROP TABLE IF EXISTS {ENTRY_PAGES_TABLE}")
+    c.execute(
+        f"""CREATE TABLE {ENTRY_PAGES_TABLE}(
+                traditional TEXT PRIMARY KEY,
+                entries TEXT,
+                examples TEXT
+            ) WITHOUT ROWID"""
+    )
+
+    headwords = [
+        headword
+        for (headword,) in db.execute("SELECT DISTINCT traditional FROM entries")
+    ]
+
+    # Headwords containing glob characters do not match themselves
+    c.executemany(
+        f"INSERT INTO {ENTRY_PAGES_TABLE} VALUES (?, ?, ?)",
+        (
+            (headword, *fetch_entry_page(db, headword))
+            for headword in headwords
+            if not any(char in "*?[" for char in headword)
+        ),
+    )
+
+
+def check_entry_pages(db: sqlite3.Connection, sample_size: int | None = None) -> list[str]:
+    """Compares the stored entry pages with the results of the live queries.
+
+    Args:
+        db (sqlite3.Connection): Connection to the dictionary
+        sample_size (int | None, optional): Number of randomly chosen
+            headwords to check. Defaults to None, which checks all of them.
+
+    Returns:
+        list[str]: Headwords whose stored page differs from the live results
+    """
+    headwords = [
+        headword
+        for (headword,) in db.execute(f"SELECT traditional FROM {ENTRY_PAGES_TABLE}")
+    ]
+    if sample_size is not None and sample_size < len(headwords):
+        headwords = random.sample(headwords, sample_size)
+
+    res = []
+    for headword in headwords:
+        stored = db.execute(
+            f"SELECT entries, examples FROM {ENTRY_PAGES_TABLE} WHERE traditional = ?",
+            (headword,),
+        ).fetchone()
+        live = fetch_entry_page(db, headword)
+        if tuple(map(json.loads, stored)) != tuple(map(json.loads, live)):
+            res.append(headword)
+
+    return res
+
+
+def build_indexes(source_path: str, destination_path: str | None = None) -> None:
+    """Adds the lookup tables used to speed up searches to a copy of the
+    dictionary, which then replaces the destination file.
+
+    The dictionary is opened read-only and immutable by the server, so it
+    must never be written to in place: the tables are built on a copy,
+    which is swapped in once complete, and the server then opens the new
+    file.
+
+    Args:
+        source_path (str): Path to the dictionary
+        destination_path (str | None, optional): Path the dictionary with
+            its lookup tables is written to. Defaults to None, to replace
+            the source.
+    """
+    destination_path = destination_path or source_path
+    directory, name = os.path.split(os.path.abspath(destination_path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+    os.close(fd)
+
+    try:
+        # The backup API copies a consistent snapshot of the dictionary
+        source = sqlite3.connect(f"file:{urllib.parse.quote(source_path)}?mode=ro", uri=True)
+        db = sqlite3.connect(temp_path)
+        try:
+            source.backup(db)
+            with db:
+                build_syllable_indexes(db)
+                build_example_indexes(db)
+                build_entry_pages(db)
+        finally:
+            db.close()
+            source.close()
+
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, destination_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -1,19 +1,54 @@
-from dataclasses import dataclass
+import functools
+import sys
 
-from .utils import cantonese_utils, chinese_utils, default_settings, mandarin_utils
+from dataclasses import dataclass, field
+
+from .utils import cantonese_utils, chinese_utils, mandarin_utils
 
 # Python doesn't really have a good way to hide fields,
 # so I'm just gonna use a single underscore prefix to
-# denote a read-only member of a class
+# denote a read-only member of a class.
+# Read-only members derived from the romanizations are only computed
+# the first time they are used, as most pages only show a few of them.
+#
+# Models are slotted, as a page of results holds thousands of them
+
+
+def intern(value: str | None) -> str | None:
+    # Source names, languages and labels are repeated across most results,
+    # so keep a single copy of each
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def cached_field(func):
+    """Same as functools.cached_property, for slotted classes: the value is
+    computed on first access, and then kept in the _cached_fields slot.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def getter(self):
+        if self._cached_fields is None:
+            self._cached_fields = {}
+        elif name in self._cached_fields:
+            return self._cached_fields[name]
+
+        value = self._cached_fields[name] = func(self)
+        return value
+
+    return property(getter)
 
 
-@dataclass
+@dataclass(slots=True)
 class Translation:
     translation: str
     language: str
 
+    def __post_init__(self):
+        self.language = intern(self.language)
+
 
-@dataclass
+@dataclass(slots=True)
 class TranslationSet:
     source: str
     # _sourceShortString: str
@@ -21,8 +56,11 @@ class TranslationSet:
 
     translations: list[Translation] | None = None
 
+    def __post_init__(self):
+        self.source = intern(self.source)
+
 
-@dataclass
+@dataclass(slots=True)
 class SourceSentence:
     source_language: str
     simplified: str
@@ -31,49 +69,58 @@ class SourceSentence:
     jyutping: str
     pinyin: str
 
-    _yale: str | None = None
-    _cantonese_IPA: str | None = None
-
-    _pretty_pinyin: str | None = None
-    _numbered_pinyin: str | None = None
-    _zhuyin: str | None = None
-    _mandarin_IPA: str | None = None
-
     translations: TranslationSet | None = None
+    _cached_fields: dict | None = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
-        self._yale = cantonese_utils.jyutping_to_yale(
-            self.jyutping, use_spaces_to_segment=True
-        )
-        self._cantonese_IPA = cantonese_utils.jyutping_to_IPA(
-            self.jyutping, use_spaces_to_segment=True
-        )
-
-        self._pretty_pinyin = mandarin_utils.pretty_pinyin(self.pinyin)
-        self._numbered_pinyin = mandarin_utils.numbered_pinyin(self.pinyin)
-        self._zhuyin = mandarin_utils.pinyin_to_zhuyin(
-            self.pinyin, use_spaces_to_segment=True
-        )
-        self._mandarin_IPA = mandarin_utils.pinyin_to_IPA(
-            self.pinyin, use_spaces_to_segment=True
-        )
-
-
-@dataclass
+        self.source_language = intern(self.source_language)
+
+    @cached_field
+    def _yale(self) -> str:
+        return cantonese_utils.jyutping_to_yale(self.jyutping, use_spaces_to_segment=True)
+
+    @cached_field
+    def _cantonese_IPA(self) -> str:
+        return cantonese_utils.jyutping_to_IPA(self.jyutping, use_spaces_to_segment=True)
+
+    @cached_field
+    def _pretty_pinyin(self) -> str:
+        return mandarin_utils.pretty_pinyin(self.pinyin)
+
+    @cached_field
+    def _numbered_pinyin(self) -> str:
+        return mandarin_utils.numbered_pinyin(self.pinyin)
+
+    @cached_field
+    def _zhuyin(self) -> str:
+        return mandarin_utils.pinyin_to_zhuyin(self.pinyin, use_spaces_to_segment=True)
+
+    @cached_field
+    def _mandarin_IPA(self) -> str:
+        return mandarin_utils.pinyin_to_IPA(self.pinyin, use_spaces_to_segment=True)
+
+
+@dataclass(slots=True)
 class Definition:
     definition_content: str
     label: str
     sentences: list[SourceSentence] | None = None
 
+    def __post_init__(self):
+        self.label = intern(self.label)
+
 
-@dataclass
+@dataclass(slots=True)
 class DefinitionsSet:
     source: str
     definitions: list[Definition] | None = None
-    _definitions_snippet: str | None = None
+    _cached_fields: dict | None = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
-        # Generate the definitions snippet
+        self.source = intern(self.source)
+
+    @cached_field
+    def _definitions_snippet(self) -> str:
         definition_contents = []
         for definition in self.definitions:
             newline_idx = definition.definition_content.find("\n")
@@ -81,10 +128,10 @@ class DefinitionsSet:
                 definition_contents.append(definition.definition_content[:newline_idx])
             else:
                 definition_contents.append(definition.definition_content)
-        self._definitions_snippet = "; ".join(definition_contents)
+        return "; ".join(definition_contents)
 
 
-@dataclass
+@dataclass(slots=True)
 class Entry:
     traditional: str
     simplified: str
@@ -92,58 +139,70 @@ class Entry:
     jyutping: str
     pinyin: str
 
-    _coloured_traditional: str | None = None
-    _coloured_simplified: str | None = None
-
-    _traditional_difference: str | None = None
-    _coloured_traditional_difference: str | None = None
-    _simplified_difference: str | None = None
-    _coloured_simplified_difference: str | None = None
-
-    _yale: str | None = None
-    _cantonese_IPA: str | None = None
-
-    _pretty_pinyin: str | None = None
-    _numbered_pinyin: str | None = None
-    _zhuyin: str | None = None
-    _mandarin_IPA: str | None = None
-
     definitions_sets: list[DefinitionsSet] | None = None
-
-    def __post_init__(self):
-        # Generate all the read-only fields
-        self._coloured_traditional = chinese_utils.apply_colours(
-            self.traditional,
-            cantonese_utils.extract_jyutping_tones(self.jyutping),
-            default_settings.DEFAULT_JYUTPING_TONES,
-        )
-        self._coloured_simplified = chinese_utils.apply_colours(
-            self.traditional,
-            cantonese_utils.extract_jyutping_tones(self.jyutping),
-            default_settings.DEFAULT_JYUTPING_TONES,
-        )
-
-        self._traditional_difference = chinese_utils.compare_strings(
-            self.simplified, self.traditional
-        )
-        self._coloured_traditional_difference = chinese_utils.apply_colours(
-            self._traditional_difference,
-            cantonese_utils.extract_jyutping_tones(self.jyutping),
-            default_settings.DEFAULT_JYUTPING_TONES,
-        )
-        self._simplified_difference = chinese_utils.compare_strings(
-            self.traditional, self.simplified
-        )
-        self._coloured_simplified_difference = chinese_utils.apply_colours(
-            self._simplified_difference,
-            cantonese_utils.extract_jyutping_tones(self.jyutping),
-            default_settings.DEFAULT_JYUTPING_TONES,
-        )
-
-        self._yale = cantonese_utils.jyutping_to_yale(self.jyutping)
-        self._cantonese_IPA = cantonese_utils.jyutping_to_IPA(self.jyutping)
-
-        self._pretty_pinyin = mandarin_utils.pretty_pinyin(self.pinyin)
-        self._numbered_pinyin = mandarin_utils.numbered_pinyin(self.pinyin)
-        self._zhuyin = mandarin_utils.pinyin_to_zhuyin(self.pinyin)
-        self._mandarin_IPA = mandarin_utils.pinyin_to_IPA(self.pinyin)
+    _cached_fields: dict | None = field(default=None, init=False, repr=False, compare=False)
+
+    @cached_field
+    def _headword(self) -> chinese_utils.HeadwordVariants:
+        return chinese_utils.render_headword(self.traditional, self.simplified, self.jyutping)
+
+    @property
+    def _coloured_traditional(self) -> str:
+        return self._headword.coloured_traditional
+
+    @property
+    def _coloured_simplified(self) -> str:
+        return self._headword.coloured_simplified
+
+    @property
+    def _traditional_difference(self) -> str:
+        return self._headword.traditional_difference
+
+    @property
+    def _coloured_traditional_difference(self) -> str:
+        return self._headword.coloured_traditional_difference
+
+    @property
+    def _simplified_difference(self) -> str:
+        return self._headword.simplified_difference
+
+    @property
+    def _coloured_simplified_difference(self) -> str:
+        return self._headword.coloured_simplified_difference
+
+    @cached_field
+    def _yale(self) -> str:
+        return cantonese_utils.jyutping_to_yale(self.jyutping)
+
+    @cached_field
+    def _cantonese_IPA(self) -> str:
+        return cantonese_utils.jyutping_to_IPA(self.jyutping)
+
+    @cached_field
+    def _pretty_pinyin(self) -> str:
+        return mandarin_utils.pretty_pinyin(self.pinyin)
+
+    @cached_field
+    def _numbered_pinyin(self) -> str:
+        return mandarin_utils.numbered_pinyin(self.pinyin)
+
+    @cached_field
+    def _zhuyin(self) -> str:
+        return mandarin_utils.pinyin_to_zhuyin(self.pinyin)
+
+    @cached_field
+    def _mandarin_IPA(self) -> str:
+        return mandarin_utils.pinyin_to_IPA(self.pinyin)
+
+
+@dataclass(slots=True)
+class EntriesPage:
+    entries: list[Entry]
+    # Number of entries matching the query, across all pages, counted up to
+    # a limit
+    total: int
+    # Whether more entries than total match the query
+    total_capped: bool = False
+    # Opaque position after the last entry of this page, or None if this
+    # is the last page
+    next_cursor: str | None = None
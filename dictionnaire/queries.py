@@ -1,36 +1,336 @@
+import json
 import os
 import re
 import sqlite3
+import threading
+import time
+import urllib.parse
 
 from collections import defaultdict
 
-from flask import g
-
-from .models import Entry, SourceSentence
-from .utils import chinese_utils, query_utils
+from . import build
+from .models import EntriesPage, Entry, SourceSentence
+from .utils import cache_utils, chinese_utils, mandarin_utils, query_utils, script_detector
 
 DB_PATH = os.environ["CANTONAIS_ORG_DB_PATH"]
+# The dictionary is never written to by the site, so open it read-only and
+# immutable; SQLite can then skip locking and change detection entirely.
+# A new database must be shipped by replacing the file (e.g. with mv) rather
+# than writing to it, after which connections and cached results are renewed.
+DB_URI = f"file:{urllib.parse.quote(DB_PATH)}?mode=ro&immutable=1"
+DB_PRAGMAS = (
+    ("mmap_size", 268435456),
+    ("cache_size", -65536),
+    ("temp_store", "MEMORY"),
+)
+# Number of query results kept in memory by each worker, and number of
+# seconds after which they expire (by default, only when the database changes)
+CACHE_SIZE = int(os.environ.get("CANTONAIS_ORG_CACHE_SIZE", 4096))
+CACHE_TTL = (
+    float(os.environ["CANTONAIS_ORG_CACHE_TTL"])
+    if "CANTONAIS_ORG_CACHE_TTL" in os.environ
+    else None
+)
+# Each query checks whether the database has been replaced, but the file
+# is only looked at again once this many seconds have passed
+DB_VERSION_INTERVAL = 1.0
+SEARCH_PAGE_SIZE = 50
+# Number of matching entries past which a search stops counting them
+SEARCH_COUNT_LIMIT = 1000
+# Number of example sentences from each source shown on an entry page
+EXAMPLE_SAMPLE_SIZE = 5
+# Columns that search results are sorted by, and whether each is sorted in
+# descending order; the last column must identify the entry
+FREQUENCY_ORDER = (("frequency", True), ("entry_id", True))
+RELEVANCE_ORDER = (("RANK", False), ("frequency", True), ("entry_id", True))
 REGEX_OPERATOR = "REGEXP"
 GLOB_OPERATOR = "GLOB"
 
+# Interpretations of a search term that auto search can choose from,
+# listed in order of priority
+AUTO_SIMPLIFIED = "simplified"
+AUTO_TRADITIONAL = "traditional"
+AUTO_JYUTPING = "jyutping"
+AUTO_FUZZY_JYUTPING = "fuzzy_jyutping"
+AUTO_PINYIN = "pinyin"
+AUTO_FUZZY_PINYIN = "fuzzy_pinyin"
+AUTO_FULL_TEXT = "full_text"
+
 print(f"database path: {DB_PATH}")
 
-def get_db():
-    if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH)
+# Each worker thread keeps its own connection for the lifetime of the
+# process, so that the page cache stays warm between requests
+_connections = threading.local()
 
-    def regexp(y, x, search=re.search):
-        return 1 if search(y, x) else 0
+# Duration of each phase of the searches run by the current request
+_timings = threading.local()
 
-    g.db.create_function("REGEXP", 2, regexp)
+db_version = cache_utils.file_version(DB_PATH, DB_VERSION_INTERVAL)
+query_cache = cache_utils.QueryCache(CACHE_SIZE, CACHE_TTL, db_version)
 
-    return g.db
 
+def regexp(y, x, search=re.search):
+    return 1 if search(y, x) else 0
+
+
+class Connection(sqlite3.Connection):
+    """Connection to the dictionary, along with what has been read from its
+    schema and small tables. These are forgotten along with the connection,
+    which is reopened whenever the database changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tables = {}
+        self.syllable_frequencies = {}
+
+
+def open_db() -> Connection:
+    db = sqlite3.connect(DB_URI, uri=True, factory=Connection)
+
+    for pragma, value in DB_PRAGMAS:
+        db.execute(f"PRAGMA {pragma} = {value}")
+
+    db.create_function("REGEXP", 2, regexp, deterministic=True)
+
+    return db
+
+
+def get_db() -> Connection:
+    # Connections must not be shared with a forked child (e.g. when
+    # Gunicorn preloads the app), so reopen if the process has changed.
+    # An immutable connection would also keep reading the previous database
+    # after it has been replaced.
+    version = db_version()
+    pid = getattr(_connections, "pid", None)
+    if pid != os.getpid() or getattr(_connections, "version", None) != version:
+        # The connection of a parent process is left for the parent to
+        # close, but one to a replaced database is closed right away, so
+        # that the old file is not kept open
+        if pid == os.getpid():
+            _connections.db.close()
+        _connections.db = open_db()
+        _connections.pid = os.getpid()
+        _connections.version = version
+
+    return _connections.db
+
+
+def record_timing(name: str, start: float) -> None:
+    if not hasattr(_timings, "phases"):
+        _timings.phases = []
+    _timings.phases.append((name, (time.perf_counter() - start) * 1000))
+
+
+def pop_timings() -> list[tuple[str, float]]:
+    """Returns the duration in milliseconds of each search phase run by this
+    thread since the last call, and forgets them.
+
+    Returns:
+        list[tuple[str, float]]: Name and duration of each phase
+    """
+    phases = getattr(_timings, "phases", [])
+    _timings.phases = []
+    return phases
 
-def get_traditional(traditional: str) -> list[Entry] | None:
-    db = get_db()
-    c = db.cursor()
 
+def has_table(db: sqlite3.Connection, name: str) -> bool:
+    # The schema only needs to be looked up once per pooled connection.
+    # Other connections (e.g. the one building the indexes, which changes
+    # the schema) look it up every time.
+    tables = getattr(db, "tables", None)
+    if tables is not None and name in tables:
+        return tables[name]
+
+    c = db.execute(
+        "SELECT EXISTS (SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?)",
+        (name,),
+    )
+    res = bool(c.fetchone()[0])
+    if tables is not None:
+        tables[name] = res
+    return res
+
+
+def get_syllable_frequencies(db: sqlite3.Connection, column: str) -> dict[str, int] | None:
+    # Number of entries containing each syllable, whatever its tone; the
+    # table is small, and only read once per pooled connection
+    memo = getattr(db, "syllable_frequencies", None)
+    if memo is None:
+        return read_syllable_frequencies(db, column)
+
+    if column not in memo:
+        memo[column] = read_syllable_frequencies(db, column)
+    return memo[column]
+
+
+def read_syllable_frequencies(db: sqlite3.Connection, column: str) -> dict[str, int] | None:
+    table = build.SYLLABLE_FREQUENCIES[column]
+    if not has_table(db, table):
+        return None
+
+    res = defaultdict(int)
+    for syllable, frequency in db.execute(f"SELECT syllable, frequency FROM {table}"):
+        res[mandarin_utils.get_toneless_syllable(syllable.lower())] += frequency
+    return dict(res)
+
+
+def prepare_pinyin_bind_values(pinyin: str, fuzzy: bool) -> tuple[str, ...]:
+    return query_utils.prepare_pinyin_bind_value_alternatives(
+        pinyin, fuzzy, get_syllable_frequencies(get_db(), "pinyin")
+    )
+
+
+def romanization_condition(
+    column: str, query_param: str, fuzzy: bool, name: str
+) -> tuple[str, dict[str, str]]:
+    """Builds the condition that entries must satisfy to match a Jyutping
+    or Pinyin search, along with its named bind values.
+
+    Fuzzy searches are regexes, which would have to be run against every
+    entry; when the syllable index exists and the regex can be broken down
+    into per-syllable patterns, candidates are looked up in the index first,
+    and the regex only checked against those. Syllables are looked up by
+    their fuzzy key when the fuzzy key index exists.
+
+    Args:
+        column (str): Either "jyutping" or "pinyin"
+        query_param (str): Bind value prepared by prepare_jyutping_bind_values
+            or prepare_pinyin_bind_values
+        fuzzy (bool): Whether query_param is a regex rather than a glob
+        name (str): Name of the bind parameter, also used as the prefix of
+            the syllable index bind parameters
+
+    Returns:
+        tuple[str, dict[str, str]]: SQL condition, and its bind values
+    """
+    if not fuzzy:
+        return f"{column} {GLOB_OPERATOR} :{name}", {name: query_param}
+
+    condition = f"{column} {REGEX_OPERATOR} :{name}"
+    bind_values = {name: query_param}
+
+    table = build.SYLLABLE_INDEXES[column]
+    patterns = query_utils.parse_fuzzy_bind_value(query_param)
+    if patterns is None or not has_table(get_db(), table):
+        return condition, bind_values
+
+    position_patterns, anchored = patterns
+    tables = table
+    key_table = build.FUZZY_KEY_INDEXES[column]
+    if has_table(get_db(), key_table):
+        key_patterns = query_utils.get_fuzzy_key_patterns(
+            position_patterns, build.FUZZY_KEYS[column]
+        )
+        tables = [table if keys is None else key_table for keys in key_patterns]
+        position_patterns = [
+            spellings if keys is None else keys
+            for spellings, keys in zip(position_patterns, key_patterns)
+        ]
+
+    index_query, index_bind_values = query_utils.construct_syllable_index_query(
+        tables, position_patterns, anchored, name
+    )
+    bind_values.update(index_bind_values)
+    return f"entry_id IN ({index_query}) AND {condition}", bind_values
+
+
+def romanization_alternatives_condition(
+    column: str, query_params: tuple[str, ...], fuzzy: bool, name: str
+) -> tuple[str, dict[str, str]]:
+    """Builds the condition that entries must satisfy to match any of the
+    bind values of a Jyutping or Pinyin search (one for each way of
+    segmenting the search term), along with its named bind values. SQLite
+    looks up each alternative in the indexes, and merges the results.
+
+    Args:
+        column (str): Either "jyutping" or "pinyin"
+        query_params (tuple[str, ...]): Bind values prepared by
+            query_utils.prepare_pinyin_bind_value_alternatives
+        fuzzy (bool): Whether query_params are regexes rather than globs
+        name (str): Prefix of the names of the bind parameters
+
+    Returns:
+        tuple[str, dict[str, str]]: SQL condition, and its bind values
+    """
+    if len(query_params) == 1:
+        return romanization_condition(column, query_params[0], fuzzy, name)
+
+    conditions = []
+    bind_values = {}
+    for idx, query_param in enumerate(query_params):
+        condition, alternative_bind_values = romanization_condition(
+            column, query_param, fuzzy, f"{name}_{idx}"
+        )
+        conditions.append(f"({condition})")
+        bind_values.update(alternative_bind_values)
+
+    return f"({' OR '.join(conditions)})", bind_values
+
+
+def example_sentence_ids_query(
+    db: sqlite3.Connection, param: str
+) -> tuple[str, dict[str, str]]:
+    """Builds the statement selecting the ids of the example sentences whose
+    traditional text contains a headword, along with its named bind values.
+
+    Uses the n-gram table or the trigram full-text index when they exist,
+    rather than matching the pattern against every sentence.
+
+    Args:
+        db (sqlite3.Connection): Connection the statement will be run on
+        param (str): Headword, in traditional characters
+
+    Returns:
+        tuple[str, dict[str, str]]: SQL statement, and its bind values
+    """
+    like_query = """
+SELECT chinese_sentence_id
+FROM chinese_sentences
+WHERE traditional LIKE :like_param ESCAPE '\\'
+"""
+    bind_values = {"like_param": f"%{param}%"}
+
+    # Headwords containing LIKE wildcards have to be matched against every
+    # sentence
+    if not param or any(char in "%_\\" for char in param):
+        return like_query, bind_values
+
+    if len(param) <= build.MAX_EXAMPLE_NGRAM_LENGTH:
+        if not has_table(db, build.EXAMPLE_NGRAMS_TABLE):
+            return like_query, bind_values
+
+        return (
+            f"""
+SELECT fk_chinese_sentence_id AS chinese_sentence_id
+FROM {build.EXAMPLE_NGRAMS_TABLE}
+WHERE ngram = :ngram
+""",
+            {"ngram": param.translate(build.ASCII_LOWERCASE)},
+        )
+
+    if not has_table(db, build.EXAMPLE_TRIGRAMS_TABLE):
+        return like_query, bind_values
+
+    # The trigram index folds the case of every character, while LIKE only
+    # folds ASCII, so matches are checked against the pattern again
+    bind_values["fts_param"] = '"' + param.replace('"', '""') + '"'
+    return (
+        f"""
+SELECT chinese_sentence_id
+FROM chinese_sentences
+WHERE chinese_sentence_id IN (
+    SELECT rowid
+    FROM {build.EXAMPLE_TRIGRAMS_TABLE}
+    WHERE {build.EXAMPLE_TRIGRAMS_TABLE} MATCH :fts_param
+  )
+  AND traditional LIKE :like_param ESCAPE '\\'
+""",
+        bind_values,
+    )
+
+
+def fetch_traditional(c: sqlite3.Cursor, traditional: str) -> list[tuple]:
     c.execute(
         """
 WITH matching_entry_ids AS (
@@ -134,7 +434,14 @@ matching_entries AS (
         (traditional,),
     )
 
-    records = c.fetchall()
+    return c.fetchall()
+
+
+def get_traditional(traditional: str) -> list[Entry] | None:
+    db = get_db()
+    c = db.cursor()
+
+    records = fetch_traditional(c, traditional)
     if not records:
         return None
 
@@ -142,8 +449,14 @@ matching_entries AS (
 
 
 def get_example_sample(param: str) -> dict[str, SourceSentence] | None:
-    examples = query_examples(param)
+    examples = query_examples(param, per_source_limit=EXAMPLE_SAMPLE_SIZE)
 
+    return sample_examples(examples)
+
+
+def sample_examples(
+    examples: list[SourceSentence] | None,
+) -> dict[str, SourceSentence] | None:
     # Display only a subset of the examples on the entry page
     example_sample = defaultdict(list)
 
@@ -154,7 +467,7 @@ def get_example_sample(param: str) -> dict[str, SourceSentence] | None:
         for translations_set in example.translations:
             source = translations_set.source
 
-            if len(example_sample[source]) >= 5:
+            if len(example_sample[source]) >= EXAMPLE_SAMPLE_SIZE:
                 continue
 
             sample = SourceSentence(
@@ -170,10 +483,126 @@ def get_example_sample(param: str) -> dict[str, SourceSentence] | None:
     return dict(example_sample)
 
 
-def query_traditional(traditional: str) -> list[Entry] | None:
+@query_cache.cached()
+def get_entry_page(
+    traditional: str,
+) -> tuple[list[Entry] | None, dict[str, SourceSentence] | None]:
+    """Finds the entries and example sentences shown on the page of a
+    headword, from the entry pages built offline if they exist.
+
+    Args:
+        traditional (str): Headword, in traditional characters
+
+    Returns:
+        tuple[list[Entry] | None, dict[str, SourceSentence] | None]: Entries
+            with that headword, and a sample of example sentences for each
+            source
+    """
     db = get_db()
     c = db.cursor()
 
+    # Pages are only built for exact headwords
+    if has_table(db, build.ENTRY_PAGES_TABLE) and not any(
+        char in "*?[" for char in traditional
+    ):
+        c.execute(
+            f"SELECT entries, examples FROM {build.ENTRY_PAGES_TABLE} WHERE traditional = ?",
+            (traditional,),
+        )
+        page = c.fetchone()
+        if page:
+            entry_records, example_records = map(json.loads, page)
+            entries = (
+                query_utils.parse_returned_records(entry_records)
+                if entry_records
+                else None
+            )
+            examples = (
+                query_utils.parse_returned_sentences(example_records)
+                if example_records
+                else None
+            )
+            return entries, sample_examples(examples)
+
+    # The page as a whole is cached, so its parts are not cached again
+    return get_traditional(traditional), get_example_sample(traditional)
+
+
+def search_entries(
+    matching_query: str,
+    bind_values: dict[str, str],
+    order: tuple[tuple[str, bool], ...],
+    cursor: str | None,
+    limit: int,
+    common_tables: str | None = None,
+) -> EntriesPage | None:
+    """Runs a search in two phases: the ids of the entries in the requested
+    page are selected first, and then hydrated by a single statement shared
+    by every kind of search (so that SQLite can reuse it from the statement
+    cache).
+
+    Args:
+        matching_query (str): Statement selecting the id and the sort
+            columns of every matching entry
+        bind_values (dict[str, str]): Named bind values of matching_query
+        order (tuple[tuple[str, bool], ...]): Sort columns, such as
+            FREQUENCY_ORDER or RELEVANCE_ORDER
+        cursor (str | None): Cursor of the page of results to return, or
+            None for the first page
+        limit (int): Number of entries per page
+        common_tables (str | None, optional): Common table expressions
+            that matching_query depends on. Defaults to None.
+
+    Returns:
+        EntriesPage | None: The page of entries, or None if no entry matched
+    """
+    db = get_db()
+    c = db.cursor()
+
+    cursor_keys = query_utils.decode_cursor(cursor, len(order))
+
+    start = time.perf_counter()
+    c.execute(
+        query_utils.construct_search_query(matching_query, order, common_tables),
+        {
+            **bind_values,
+            **{
+                f"cursor_{idx}": cursor_keys[idx] if cursor_keys else None
+                for idx in range(len(order))
+            },
+            "limit": limit,
+            "count_limit": SEARCH_COUNT_LIMIT,
+        },
+    )
+    id_rows = c.fetchall()
+    record_timing("select", start)
+
+    if not id_rows:
+        return None
+
+    start = time.perf_counter()
+    c.execute(
+        """
+SELECT traditional, simplified, jyutping, pinyin,
+  fk_source_id, sourcename, definition, entry_id
+FROM json_each(:entry_ids) AS page
+  JOIN entries ON entries.entry_id = page.value
+  JOIN definitions AS d ON d.fk_entry_id = entries.entry_id
+  LEFT JOIN sources ON sources.source_id = d.fk_source_id
+ORDER BY page.key, fk_source_id, definition_id
+""",
+        {"entry_ids": json.dumps([row[0] for row in id_rows[:limit]])},
+    )
+    page = query_utils.parse_returned_rows_page(id_rows, c, limit, SEARCH_COUNT_LIMIT)
+    record_timing("hydrate", start)
+
+    return page
+
+
+@query_cache.cached()
+def query_traditional(
+    traditional: str, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE
+) -> EntriesPage | None:
     # Exact match is specified by enclosing the query in double-quotes
     search_exact_match = (
         len(traditional) >= 3 and traditional[0] == '"' and traditional[-1] == '"'
@@ -190,63 +619,26 @@ def query_traditional(traditional: str) -> list[Entry] | None:
     else:
         query_param = f"{traditional}*"
 
-    c.execute(
+    return search_entries(
         """
-WITH matching_entry_ids AS (
-  SELECT rowid FROM entries WHERE traditional GLOB ?
-),
-
-matching_definition_ids AS (
-  SELECT definition_id, definition FROM definitions WHERE fk_entry_id
-    IN matching_entry_ids
-),
-
-matching_definitions AS (
-  SELECT definition_id, fk_entry_id, fk_source_id, definition,
-    label
-  FROM definitions
-  WHERE definitions.definition_id IN (
-    SELECT definition_id FROM matching_definition_ids
+SELECT entry_id, IFNULL(frequency, 0) AS frequency
+FROM entries
+WHERE traditional GLOB :param
+  AND EXISTS (
+    SELECT definition_id FROM definitions WHERE fk_entry_id = entry_id
   )
-),
-
-matching_definition_groups AS (
-  SELECT fk_entry_id,
-    json_object('source', sourcename,
-                'definitions',
-                json_group_array(json_object(
-                  'definition', definition))) AS definitions
-  FROM matching_definitions AS md
-  LEFT JOIN sources ON sources.source_id = md.fk_source_id
-  GROUP BY fk_entry_id, fk_source_id
-),
-
-matching_entries AS (
-  SELECT simplified, traditional, jyutping, pinyin,
-    json_group_array(json(definitions)) AS definitions
-  FROM matching_definition_groups AS mdg
-  LEFT JOIN entries ON entries.entry_id = mdg.fk_entry_id
-  GROUP BY entry_id
-  ORDER BY frequency DESC
-)
-
-SELECT traditional, simplified, jyutping, pinyin, definitions FROM
-  matching_entries
 """,
-        (query_param,),
+        {"param": query_param},
+        FREQUENCY_ORDER,
+        cursor,
+        limit,
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_returned_records(records)
-
-
-def query_simplified(simplified: str) -> list[Entry] | None:
-    db = get_db()
-    c = db.cursor()
 
+@query_cache.cached()
+def query_simplified(
+    simplified: str, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE
+) -> EntriesPage | None:
     # Exact match is specified by enclosing the query in double-quotes
     search_exact_match = (
         len(simplified) >= 3 and simplified[0] == '"' and simplified[-1] == '"'
@@ -263,251 +655,74 @@ def query_simplified(simplified: str) -> list[Entry] | None:
     else:
         query_param = f"{simplified}*"
 
-    c.execute(
+    return search_entries(
         """
-WITH matching_entry_ids AS (
-  SELECT rowid FROM entries WHERE simplified GLOB ?
-),
-
-matching_definition_ids AS (
-  SELECT definition_id, definition FROM definitions WHERE fk_entry_id
-    IN matching_entry_ids
-),
-
-matching_definitions AS (
-  SELECT definition_id, fk_entry_id, fk_source_id, definition,
-    label
-  FROM definitions
-  WHERE definitions.definition_id IN (
-    SELECT definition_id FROM matching_definition_ids
+SELECT entry_id, IFNULL(frequency, 0) AS frequency
+FROM entries
+WHERE simplified GLOB :param
+  AND EXISTS (
+    SELECT definition_id FROM definitions WHERE fk_entry_id = entry_id
   )
-),
-
-matching_definition_groups AS (
-  SELECT fk_entry_id,
-    json_object('source', sourcename,
-                'definitions',
-                json_group_array(json_object(
-                  'definition', definition))) AS definitions
-  FROM matching_definitions AS md
-  LEFT JOIN sources ON sources.source_id = md.fk_source_id
-  GROUP BY fk_entry_id, fk_source_id
-),
-
-matching_entries AS (
-  SELECT simplified, traditional, jyutping, pinyin,
-    json_group_array(json(definitions)) AS definitions
-  FROM matching_definition_groups AS mdg
-  LEFT JOIN entries ON entries.entry_id = mdg.fk_entry_id
-  GROUP BY entry_id
-  ORDER BY frequency DESC
-)
-
-SELECT traditional, simplified, jyutping, pinyin, definitions FROM
-  matching_entries
 """,
-        (query_param,),
+        {"param": query_param},
+        FREQUENCY_ORDER,
+        cursor,
+        limit,
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_returned_records(records)
-
-
-def query_jyutping(jyutping: str, fuzzy: bool) -> Entry | None:
-    db = get_db()
-    c = db.cursor()
 
+@query_cache.cached(normalize=query_utils.prepare_jyutping_bind_values)
+def query_jyutping(
+    jyutping: str, fuzzy: bool, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE
+) -> EntriesPage | None:
     query_param = query_utils.prepare_jyutping_bind_values(jyutping, fuzzy)
+    condition, bind_values = romanization_condition("jyutping", query_param, fuzzy, "param")
 
-    if fuzzy:
-        operator = REGEX_OPERATOR
-    else:
-        operator = GLOB_OPERATOR
-
-    c.execute(
+    return search_entries(
         f"""
-WITH matching_entry_ids AS (
-  SELECT rowid FROM entries WHERE jyutping {operator} ?
-),
-
-matching_definition_ids AS (
-  SELECT definition_id, definition FROM definitions WHERE fk_entry_id
-    IN matching_entry_ids
-),
-
-matching_definitions AS (
-  SELECT definition_id, fk_entry_id, fk_source_id, definition,
-    label
-  FROM definitions
-  WHERE definitions.definition_id IN (
-    SELECT definition_id FROM matching_definition_ids
+SELECT entry_id, IFNULL(frequency, 0) AS frequency
+FROM entries
+WHERE {condition}
+  AND EXISTS (
+    SELECT definition_id FROM definitions WHERE fk_entry_id = entry_id
   )
-),
-
-matching_definition_groups AS (
-  SELECT fk_entry_id,
-    json_object('source', sourcename,
-                'definitions',
-                json_group_array(json_object(
-                  'definition', definition))) AS definitions
-  FROM matching_definitions AS md
-  LEFT JOIN sources ON sources.source_id = md.fk_source_id
-  GROUP BY fk_entry_id, fk_source_id
-),
-
-matching_entries AS (
-  SELECT simplified, traditional, jyutping, pinyin,
-    json_group_array(json(definitions)) AS definitions
-  FROM matching_definition_groups AS mdg
-  LEFT JOIN entries ON entries.entry_id = mdg.fk_entry_id
-  GROUP BY entry_id
-  ORDER BY frequency DESC
-)
-
-SELECT traditional, simplified, jyutping, pinyin, definitions FROM
-  matching_entries
 """,
-        (query_param,),
+        bind_values,
+        FREQUENCY_ORDER,
+        cursor,
+        limit,
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_returned_records(records)
-
-
-def query_jyutping_exists(jyutping: str, fuzzy: bool) -> bool:
-    db = get_db()
-    c = db.cursor()
-
-    query_param = query_utils.prepare_jyutping_bind_values(jyutping, fuzzy)
-
-    if fuzzy:
-        operator = REGEX_OPERATOR
-    else:
-        operator = GLOB_OPERATOR
 
-    c.execute(
-        f"""
-SELECT EXISTS (
-  SELECT
-    rowid
-  FROM entries
-  WHERE jyutping {operator} ?
-) AS existence
-""",
-        (query_param,),
+@query_cache.cached(normalize=prepare_pinyin_bind_values)
+def query_pinyin(
+    pinyin: str, fuzzy: bool, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE
+) -> EntriesPage | None:
+    query_params = prepare_pinyin_bind_values(pinyin, fuzzy)
+    condition, bind_values = romanization_alternatives_condition(
+        "pinyin", query_params, fuzzy, "param"
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_existence(records)
-
-
-def query_pinyin(pinyin: str, fuzzy: bool) -> list[Entry] | None:
-    db = get_db()
-    c = db.cursor()
-
-    query_param = query_utils.prepare_pinyin_bind_values(pinyin, fuzzy)
-
-    if fuzzy:
-        operator = REGEX_OPERATOR
-    else:
-        operator = GLOB_OPERATOR
-
-    c.execute(
+    return search_entries(
         f"""
-WITH matching_entry_ids AS (
-  SELECT rowid FROM entries WHERE pinyin {operator} ?
-),
-
-matching_definition_ids AS (
-  SELECT definition_id, definition FROM definitions WHERE fk_entry_id
-    IN matching_entry_ids
-),
-
-matching_definitions AS (
-  SELECT definition_id, fk_entry_id, fk_source_id, definition,
-    label
-  FROM definitions
-  WHERE definitions.definition_id IN (
-    SELECT definition_id FROM matching_definition_ids
+SELECT entry_id, IFNULL(frequency, 0) AS frequency
+FROM entries
+WHERE {condition}
+  AND EXISTS (
+    SELECT definition_id FROM definitions WHERE fk_entry_id = entry_id
   )
-),
-
-matching_definition_groups AS (
-  SELECT fk_entry_id,
-    json_object('source', sourcename,
-                'definitions',
-                json_group_array(json_object(
-                  'definition', definition))) AS definitions
-  FROM matching_definitions AS md
-  LEFT JOIN sources ON sources.source_id = md.fk_source_id
-  GROUP BY fk_entry_id, fk_source_id
-),
-
-matching_entries AS (
-  SELECT simplified, traditional, jyutping, pinyin,
-    json_group_array(json(definitions)) AS definitions
-  FROM matching_definition_groups AS mdg
-  LEFT JOIN entries ON entries.entry_id = mdg.fk_entry_id
-  GROUP BY entry_id
-  ORDER BY frequency DESC
-)
-
-SELECT traditional, simplified, jyutping, pinyin, definitions FROM
-  matching_entries
 """,
-        (query_param,),
+        bind_values,
+        FREQUENCY_ORDER,
+        cursor,
+        limit,
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_returned_records(records)
-
-
-def query_pinyin_exists(pinyin: str, fuzzy: bool) -> bool:
-    db = get_db()
-    c = db.cursor()
-
-    query_param = query_utils.prepare_pinyin_bind_values(pinyin, fuzzy)
-
-    if fuzzy:
-        operator = REGEX_OPERATOR
-    else:
-        operator = GLOB_OPERATOR
-
-    c.execute(
-        f"""
-SELECT EXISTS (
-  SELECT
-    rowid
-  FROM entries
-  WHERE pinyin {operator} ?
-) AS existence
-""",
-        (query_param,),
-    )
-
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_existence(records)
-
-
-def query_full_text(param: str) -> list[Entry] | None:
-    db = get_db()
-    c = db.cursor()
 
+@query_cache.cached()
+def query_full_text(
+    param: str, cursor: str | None = None, limit: int = SEARCH_PAGE_SIZE
+) -> EntriesPage | None:
     # Exact match is specified by enclosing the query in double-quotes
     search_exact_match = len(param) >= 3 and param[0] == '"' and param[-1] == '"'
 
@@ -520,112 +735,191 @@ def query_full_text(param: str) -> list[Entry] | None:
 
     fts_param = f'"{param}"'
 
-    c.execute(
+    return search_entries(
         """
-WITH matching_entry_ids AS (
+SELECT
+  entry_id,
+  SUM(msr.rank) AS RANK,
+  IFNULL(frequency, 0) AS frequency
+FROM matching_source_ranks AS msr
+  JOIN entries ON entries.entry_id = msr.fk_entry_id
+GROUP BY entry_id
+""",
+        {"fts_param": fts_param, "like_param": like_param},
+        RELEVANCE_ORDER,
+        cursor,
+        limit,
+        # SQLite refuses to run bm25 once these tables are nested inside
+        # the search statement, so they are defined ahead of it
+        common_tables="""
+matching_definition_ranks AS (
   SELECT
-    fk_entry_id,
     rowid AS definition_id,
     bm25(definitions_fts, 0, 1) AS RANK
   FROM definitions_fts
-  WHERE definitions_fts MATCH ? AND definition LIKE ?
-),
-
-matching_definition_ids AS (
-  SELECT
-    definition_id,
-    definition
-  FROM definitions
-  WHERE fk_entry_id IN (
-    SELECT fk_entry_id
-    FROM matching_entry_ids
-  )
-),
-
-definitions_and_ranks AS (
-  SELECT
-    mdi.definition_id AS definition_id,
-    mdi.definition AS definition,
-    mei.rank AS RANK
-  FROM matching_definition_ids AS mdi
-    LEFT JOIN matching_entry_ids AS mei
-      ON mdi.definition_id = mei.definition_id
+  WHERE definitions_fts MATCH :fts_param AND definition LIKE :like_param
 ),
 
-matching_definitions AS (
+matching_source_ranks AS (
   SELECT
-    dar.definition_id,
     d.fk_entry_id,
-    d.fk_source_id,
-    d.definition,
-    d.label,
-    RANK
-  FROM definitions_and_ranks AS dar
+    CASE sourceshortname
+      WHEN 'ABY' THEN AVG(mdr.rank) * 3
+      WHEN 'CCY' THEN AVG(mdr.rank) * 3
+      WHEN 'WHK' THEN AVG(mdr.rank) * 3
+      WHEN 'YF' THEN AVG(mdr.rank) * 3
+      ELSE AVG(mdr.rank)
+    END AS RANK
+  FROM matching_definition_ranks AS mdr
     JOIN definitions AS d
-      ON dar.definition_id = d.definition_id
-),
+      ON mdr.definition_id = d.definition_id
+    LEFT JOIN sources ON sources.source_id = d.fk_source_id
+  GROUP BY d.fk_entry_id, d.fk_source_id
+)
+""",
+    )
 
-matching_definition_groups AS (
-  SELECT fk_entry_id,
-    CASE sourceshortname
-      WHEN 'ABY' THEN AVG(md.rank) * 3
-      WHEN 'CCY' THEN AVG(md.rank) * 3
-      WHEN 'WHK' THEN AVG(md.rank) * 3
-      WHEN 'YF' THEN AVG(md.rank) * 3
-      ELSE AVG(md.rank)
-    END AS RANK,
-    json_object('source', sourcename,
-                'definitions',
-                json_group_array(json_object(
-                  'definition', definition))) AS definitions
-  FROM matching_definitions AS md
-  LEFT JOIN sources ON sources.source_id = md.fk_source_id
-  GROUP BY fk_entry_id, fk_source_id
-),
 
-matching_entries AS (
-  SELECT
-    simplified,
-    traditional,
-    jyutping,
-    pinyin,
-    SUM(RANK) AS RANK,
-    json_group_array(json(definitions)) AS definitions
-  FROM matching_definition_groups AS mdg
-  LEFT JOIN entries ON entries.entry_id = mdg.fk_entry_id
-  GROUP BY entry_id
-  ORDER BY RANK ASC, frequency DESC
-)
+@query_cache.cached()
+def detect_romanization(param: str) -> str:
+    db = get_db()
+    c = db.cursor()
 
-SELECT traditional, simplified, jyutping, pinyin, definitions FROM
-  matching_entries
+    conditions = {}
+    bind_values = {}
+    for interpretation, column, fuzzy in (
+        (AUTO_JYUTPING, "jyutping", False),
+        (AUTO_FUZZY_JYUTPING, "jyutping", True),
+        (AUTO_PINYIN, "pinyin", False),
+        (AUTO_FUZZY_PINYIN, "pinyin", True),
+    ):
+        if column == "jyutping":
+            query_params = (query_utils.prepare_jyutping_bind_values(param, fuzzy),)
+        else:
+            # Every likely segmentation of ambiguous Pinyin is probed at once
+            query_params = prepare_pinyin_bind_values(param, fuzzy)
+        conditions[interpretation], probe_bind_values = romanization_alternatives_condition(
+            column, query_params, fuzzy, interpretation
+        )
+        bind_values.update(probe_bind_values)
+
+    # CASE evaluates its branches in order and stops at the first match,
+    # so every probe runs in a single statement, and the more expensive
+    # fuzzy probes are only reached if the strict ones found nothing
+    c.execute(
+        f"""
+SELECT
+  CASE
+    WHEN EXISTS (SELECT rowid FROM entries WHERE {conditions[AUTO_JYUTPING]})
+      THEN '{AUTO_JYUTPING}'
+    WHEN EXISTS (SELECT rowid FROM entries WHERE {conditions[AUTO_FUZZY_JYUTPING]})
+      THEN '{AUTO_FUZZY_JYUTPING}'
+    WHEN EXISTS (SELECT rowid FROM entries WHERE {conditions[AUTO_PINYIN]})
+      THEN '{AUTO_PINYIN}'
+    WHEN EXISTS (SELECT rowid FROM entries WHERE {conditions[AUTO_FUZZY_PINYIN]})
+      THEN '{AUTO_FUZZY_PINYIN}'
+    ELSE '{AUTO_FULL_TEXT}'
+  END AS interpretation
 """,
-        (
-            fts_param,
-            like_param,
-        ),
+        bind_values,
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
+    return c.fetchone()[0]
+
+
+def query_auto(param: str, cursor: str | None = None) -> tuple[str, EntriesPage | None]:
+    """Finds the most likely interpretation of a search term, and returns
+    that interpretation along with its results.
+
+    Args:
+        param (str): Raw search term
+        cursor (str | None, optional): Cursor of the page of results to
+            return. Defaults to None, which returns the first page.
+
+    Returns:
+        tuple[str, EntriesPage | None]: One of the AUTO_* interpretations,
+            and the page of entries matching the search term under that
+            interpretation
+    """
+    script = script_detector.classify_script(param)
+    if script.has_simplified_only:
+        return AUTO_SIMPLIFIED, query_simplified(param, cursor)
+    elif script.has_traditional_only or script.has_han:
+        return AUTO_TRADITIONAL, query_traditional(param, cursor)
+
+    interpretation = detect_romanization(param)
+    if interpretation == AUTO_JYUTPING:
+        page = query_jyutping(param, fuzzy=False, cursor=cursor)
+    elif interpretation == AUTO_FUZZY_JYUTPING:
+        page = query_jyutping(param, fuzzy=True, cursor=cursor)
+    elif interpretation == AUTO_PINYIN:
+        page = query_pinyin(param, fuzzy=False, cursor=cursor)
+    elif interpretation == AUTO_FUZZY_PINYIN:
+        page = query_pinyin(param, fuzzy=True, cursor=cursor)
+    else:
+        page = query_full_text(param, cursor)
 
-    return query_utils.parse_returned_records(records)
+    return interpretation, page
 
 
-def query_examples(param: str) -> list[SourceSentence] | None:
+def query_examples(
+    param: str, per_source_limit: int | None = None
+) -> list[SourceSentence] | None:
+    """Finds the example sentences containing a headword, in a stable order.
+
+    Args:
+        param (str): Headword, in traditional characters
+        per_source_limit (int | None, optional): If set, only the first
+            sentences with translations from each source are returned, so
+            that the rest are never assembled. Defaults to None, which
+            returns every example sentence.
+
+    Returns:
+        list[SourceSentence] | None: Example sentences
+    """
     db = get_db()
     c = db.cursor()
 
-    like_param = f"%{param}%"
+    records = fetch_examples(c, param, per_source_limit)
+    if not records:
+        return None
+
+    return query_utils.parse_returned_sentences(records)
+
+
+def fetch_examples(
+    c: sqlite3.Cursor, param: str, per_source_limit: int | None = None
+) -> list[tuple]:
+    ids_query, bind_values = example_sentence_ids_query(c.connection, param)
 
     c.execute(
-        """
+        f"""
 WITH
+  all_matching_chinese_sentence_ids AS MATERIALIZED (
+    {ids_query}
+  ),
+  matching_sources AS (
+    SELECT DISTINCT
+      s.sourcename AS source,
+      amcsi.chinese_sentence_id AS chinese_sentence_id
+    FROM
+      all_matching_chinese_sentence_ids AS amcsi
+      LEFT JOIN sentence_links AS sl
+        ON amcsi.chinese_sentence_id = sl.fk_chinese_sentence_id
+      LEFT JOIN sources AS s
+        ON s.source_id = sl.fk_source_id
+  ),
   matching_chinese_sentence_ids AS (
-    SELECT chinese_sentence_id
-    FROM chinese_sentences
-    WHERE traditional LIKE ? ESCAPE '\\'
+    SELECT DISTINCT chinese_sentence_id
+    FROM (
+      SELECT
+        chinese_sentence_id,
+        ROW_NUMBER() OVER (
+          PARTITION BY source ORDER BY chinese_sentence_id
+        ) AS source_rank
+      FROM matching_sources
+    )
+    WHERE :per_source_limit IS NULL OR source_rank <= :per_source_limit
   ),
   translations_with_source AS (
     SELECT
@@ -717,11 +1011,7 @@ SELECT
   translations
 FROM matching_sentences_with_translations
 """,
-        (like_param,),
+        {**bind_values, "per_source_limit": per_source_limit},
     )
 
-    records = c.fetchall()
-    if not records:
-        return None
-
-    return query_utils.parse_returned_sentences(records)
+    return c.fetchall()
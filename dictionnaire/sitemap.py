@@ -0,0 +1,254 @@
+import contextlib
+import datetime
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import urllib.parse
+
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+from xml.sax.saxutils import escape
+
+from .build import ENTRY_PAGES_TABLE
+
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# Limits of the sitemap protocol for each file, before compression
+SITEMAP_MAX_URLS = 50_000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+SITEMAP_HEADER = (
+    f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+).encode()
+SITEMAP_FOOTER = b"</urlset>\n"
+SITEMAP_FILE_REGEX = re.compile(r"sitemap\d+\.xml(\.gz)?")
+
+ENTRY_CHANGES_TABLE = "entry_changes"
+
+
+@contextlib.contextmanager
+def open_atomically(path: str) -> Iterator[BinaryIO]:
+    """Opens a temporary file next to the given path, which replaces the
+    file at that path once it is fully written, so that the file being
+    served is never partially written.
+
+    Args:
+        path (str): Path of the file to write
+
+    Yields:
+        BinaryIO: Temporary file, open for writing
+    """
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            yield temp_file
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def iter_entry_changes(
+    db: sqlite3.Connection, tracking_db: sqlite3.Connection, today: str
+) -> Iterator[tuple[str, str]]:
+    """Finds the date on which the page of each headword last changed, by
+    comparing a digest of its stored entry page with the one recorded by
+    the previous build. Headwords without a stored entry page keep the date
+    on which they were first seen.
+
+    The new digests are recorded in tracking_db, in a transaction that the
+    caller commits once the sitemaps are written.
+
+    Args:
+        db (sqlite3.Connection): Connection to the dictionary
+        tracking_db (sqlite3.Connection): Writable connection to the
+            database holding the digests of the previous build
+        today (str): Date of the build, in the YYYY-MM-DD format
+
+    Yields:
+        tuple[str, str]: Each headword, in order, and the date on which its
+            page last changed
+    """
+    tracking_db.execute(
+        f"""CREATE TABLE IF NOT EXISTS {ENTRY_CHANGES_TABLE}(
+                traditional TEXT PRIMARY KEY,
+                digest TEXT,
+                lastmod TEXT
+            ) WITHOUT ROWID"""
+    )
+    tracking_db.execute(f"DROP TABLE IF EXISTS {ENTRY_CHANGES_TABLE}_next")
+    tracking_db.execute(
+        f"CREATE TABLE {ENTRY_CHANGES_TABLE}_next AS SELECT * FROM {ENTRY_CHANGES_TABLE} WHERE 0"
+    )
+
+    has_entry_pages = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (ENTRY_PAGES_TABLE,),
+    ).fetchone()
+    if has_entry_pages:
+        pages = f"""
+SELECT headwords.traditional, entry_pages.entries, entry_pages.examples
+FROM (SELECT DISTINCT traditional FROM entries) AS headwords
+LEFT JOIN {ENTRY_PAGES_TABLE} AS entry_pages USING (traditional)
+ORDER BY headwords.traditional
+"""
+    else:
+        pages = "SELECT DISTINCT traditional, '', '' FROM entries ORDER BY traditional"
+
+    for traditional, entries, examples in db.execute(pages):
+        if not traditional:
+            continue
+
+        digest = hashlib.blake2b(
+            f"{entries}\0{examples}".encode(), digest_size=16
+        ).hexdigest()
+        previous = tracking_db.execute(
+            f"SELECT digest, lastmod FROM {ENTRY_CHANGES_TABLE} WHERE traditional = ?",
+            (traditional,),
+        ).fetchone()
+        lastmod = previous[1] if previous and previous[0] == digest else today
+
+        tracking_db.execute(
+            f"INSERT INTO {ENTRY_CHANGES_TABLE}_next VALUES (?, ?, ?)",
+            (traditional, digest, lastmod),
+        )
+        yield traditional, lastmod
+
+    tracking_db.execute(f"DROP TABLE {ENTRY_CHANGES_TABLE}")
+    tracking_db.execute(
+        f"ALTER TABLE {ENTRY_CHANGES_TABLE}_next RENAME TO {ENTRY_CHANGES_TABLE}"
+    )
+
+
+def write_sitemaps(
+    folder: str,
+    urls: Iterable[tuple[str, str]],
+    max_urls: int = SITEMAP_MAX_URLS,
+    max_bytes: int = SITEMAP_MAX_BYTES,
+) -> list[tuple[str, str]]:
+    """Streams URLs into gzip-compressed sitemaps, starting a new file
+    whenever one reaches the limits of the sitemap protocol.
+
+    Args:
+        folder (str): Folder where the sitemaps are written
+        urls (Iterable[tuple[str, str]]): Each URL, and the date on which
+            its page last changed
+        max_urls (int, optional): Maximum number of URLs per file. Defaults
+            to SITEMAP_MAX_URLS.
+        max_bytes (int, optional): Maximum size of each file, before
+            compression. Defaults to SITEMAP_MAX_BYTES.
+
+    Returns:
+        list[tuple[str, str]]: Name of each sitemap, and the most recent
+            date on which one of its pages changed
+    """
+    elements = (
+        (
+            f"<url><loc>{escape(loc)}</loc><lastmod>{lastmod}</lastmod></url>\n".encode(),
+            lastmod,
+        )
+        for loc, lastmod in urls
+    )
+    res = []
+
+    element, lastmod = next(elements, (None, None))
+    while element is not None:
+        name = f"sitemap{len(res)}.xml.gz"
+        url_count, size, sitemap_lastmod = 0, len(SITEMAP_HEADER) + len(SITEMAP_FOOTER), ""
+
+        # The modification time is left out of the gzip header, so that
+        # unchanged sitemaps stay identical
+        with open_atomically(os.path.join(folder, name)) as sitemap_file, gzip.GzipFile(
+            fileobj=sitemap_file, mode="wb", mtime=0
+        ) as sitemap:
+            sitemap.write(SITEMAP_HEADER)
+            while element is not None and (
+                # A URL that does not fit in a file by itself gets its own
+                url_count == 0
+                or (url_count < max_urls and size + len(element) <= max_bytes)
+            ):
+                sitemap.write(element)
+                url_count += 1
+                size += len(element)
+                sitemap_lastmod = max(sitemap_lastmod, lastmod)
+                element, lastmod = next(elements, (None, None))
+            sitemap.write(SITEMAP_FOOTER)
+
+        res.append((name, sitemap_lastmod))
+
+    return res
+
+
+def build_sitemaps(
+    db_path: str,
+    tracking_path: str,
+    static_folder: str,
+    canonical_url: str,
+    entry_path: str,
+    today: str | None = None,
+) -> list[str]:
+    """Writes the sitemaps of every entry page, their index, and robots.txt.
+    The previous files stay in place until the new ones are fully written.
+
+    Args:
+        db_path (str): Path to the dictionary
+        tracking_path (str): Path to the database recording when each entry
+            page last changed, which is created if it does not exist
+        static_folder (str): Folder of the static files of the website, in
+            which the sitemap and robots folders are written
+        canonical_url (str): URL of the website
+        entry_path (str): Path of the entry pages on the website
+        today (str | None, optional): Date of the build, in the YYYY-MM-DD
+            format. Defaults to None, for the current date.
+
+    Returns:
+        list[str]: URLs of the sitemaps
+    """
+    today = today or datetime.date.today().isoformat()
+    sitemap_folder = os.path.join(static_folder, "sitemap")
+    robots_folder = os.path.join(static_folder, "robots")
+    os.makedirs(sitemap_folder, exist_ok=True)
+    os.makedirs(robots_folder, exist_ok=True)
+
+    db = sqlite3.connect(f"file:{urllib.parse.quote(db_path)}?mode=ro", uri=True)
+    tracking_db = sqlite3.connect(tracking_path)
+    try:
+        with tracking_db:
+            sitemaps = write_sitemaps(
+                sitemap_folder,
+                (
+                    (f"{canonical_url}{entry_path}/{urllib.parse.quote(traditional, safe='')}", lastmod)
+                    for traditional, lastmod in iter_entry_changes(db, tracking_db, today)
+                ),
+            )
+            sitemap_urls = [f"{canonical_url}/{name}" for name, _ in sitemaps]
+
+            with open_atomically(os.path.join(sitemap_folder, "sitemap_index.xml")) as index:
+                index.write(
+                    f'<?xml version="1.0" encoding="UTF-8"?>\n'
+                    f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'.encode()
+                )
+                for url, (_, lastmod) in zip(sitemap_urls, sitemaps):
+                    index.write(
+                        f"<sitemap><loc>{escape(url)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n".encode()
+                    )
+                index.write(b"</sitemapindex>\n")
+
+            with open_atomically(os.path.join(robots_folder, "robots.txt")) as robots:
+                robots.write("".join(f"Sitemap: {url}\n" for url in sitemap_urls).encode())
+    finally:
+        tracking_db.close()
+        db.close()
+
+    # Remove the sitemaps left over from larger or older builds
+    current = {name for name, _ in sitemaps}
+    for name in os.listdir(sitemap_folder):
+        if SITEMAP_FILE_REGEX.fullmatch(name) and name not in current:
+            os.unlink(os.path.join(sitemap_folder, name))
+
+    return sitemap_urls
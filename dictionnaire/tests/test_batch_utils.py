@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from ..utils import batch_utils
+
+
+class TestBatchMap(TestCase):
+    def test_order(self):
+        self.assertEqual(batch_utils.batch_map(str.upper, iter(["b", "a", "c"])), ["B", "A", "C"])
+
+    def test_distinct(self):
+        calls = []
+
+        def upper(item):
+            calls.append(item)
+            return item.upper()
+
+        self.assertEqual(batch_utils.batch_map(upper, ["a", "b", "a"]), ["A", "B", "A"])
+        self.assertEqual(calls, ["a", "b"])
+
+    def test_processes(self):
+        items = [str(i % 50) for i in range(200)]
+        self.assertEqual(
+            batch_utils.batch_map(len, items, processes=2), [len(item) for item in items]
+        )
+
+
+class TestSyllableCache(TestCase):
+    def test_table_then_rules(self):
+        calls = []
+
+        def convert(syllable):
+            calls.append(syllable)
+            return syllable.upper()
+
+        cache = batch_utils.SyllableCache({"a": "à"}, convert)
+        self.assertEqual([cache["a"], cache["b"], cache["b"]], ["à", "B", "B"])
+        self.assertEqual(calls, ["b"])
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from .. import build
+from .test_query_plans import FIXTURE, SCHEMA
+
+
+class TestBuildExampleIndexes(TestCase):
+    SENTENCES = [
+        "我哋去飲茶。",
+        "佢食咗飯未？",
+        "我OK啦。",
+        "飲茶食點心。",
+        None,
+    ]
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute(
+            "CREATE TABLE chinese_sentences(chinese_sentence_id INTEGER PRIMARY KEY, traditional TEXT)"
+        )
+        self.db.executemany(
+            "INSERT INTO chinese_sentences(traditional) VALUES (?)",
+            [(sentence,) for sentence in self.SENTENCES],
+        )
+        build.build_example_indexes(self.db)
+
+    def tearDown(self):
+        self.db.close()
+
+    def like(self, param):
+        return self.db.execute(
+            "SELECT chinese_sentence_id FROM chinese_sentences "
+            "WHERE traditional LIKE ? ORDER BY chinese_sentence_id",
+            (f"%{param}%",),
+        ).fetchall()
+
+    def ngrams(self, param):
+        return self.db.execute(
+            f"SELECT fk_chinese_sentence_id FROM {build.EXAMPLE_NGRAMS_TABLE} "
+            "WHERE ngram = ?",
+            (param.translate(build.ASCII_LOWERCASE),),
+        ).fetchall()
+
+    def trigrams(self, param):
+        return self.db.execute(
+            f"SELECT rowid FROM {build.EXAMPLE_TRIGRAMS_TABLE} "
+            f"WHERE {build.EXAMPLE_TRIGRAMS_TABLE} MATCH ?",
+            (f'"{param}"',),
+        ).fetchall()
+
+    def test_single_character(self):
+        self.assertEqual(self.ngrams("我"), self.like("我"))
+        self.assertEqual(self.ngrams("我"), [(1,), (3,)])
+
+    def test_two_characters(self):
+        self.assertEqual(self.ngrams("飲茶"), self.like("飲茶"))
+        self.assertEqual(self.ngrams("飲茶"), [(1,), (4,)])
+
+    def test_ascii_case(self):
+        self.assertEqual(self.ngrams("ok"), self.like("ok"))
+        self.assertEqual(self.ngrams("ok"), [(3,)])
+
+    def test_trigram(self):
+        self.assertEqual(self.trigrams("食咗飯"), self.like("食咗飯"))
+        self.assertEqual(self.trigrams("食咗飯"), [(2,)])
+
+    def test_no_match(self):
+        self.assertEqual(self.ngrams("冇"), [])
+        self.assertEqual(self.trigrams("冇問題"), [])
+
+
+class TestBuildIndexes(TestCase):
+    """Builds the indexes of a dictionary file with plain connections, as the
+    build-indexes and check-entry-pages commands do."""
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "dict.db")
+        db = sqlite3.connect(self.path)
+        db.executescript(SCHEMA)
+        db.executescript(FIXTURE)
+        db.close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_build_and_check(self):
+        build.build_indexes(self.path)
+
+        db = sqlite3.connect(self.path)
+        try:
+            self.assertGreater(
+                db.execute(f"SELECT COUNT(*) FROM {build.ENTRY_PAGES_TABLE}").fetchone()[0], 0
+            )
+            self.assertEqual(build.check_entry_pages(db), [])
+        finally:
+            db.close()
+
+    def test_destination(self):
+        destination = os.path.join(self.folder.name, "indexed.db")
+        build.build_indexes(self.path, destination)
+
+        for path, has_pages in ((self.path, 0), (destination, 1)):
+            db = sqlite3.connect(path)
+            try:
+                self.assertEqual(
+                    db.execute(
+                        "SELECT COUNT(*) FROM sqlite_master WHERE name = ?",
+                        (build.ENTRY_PAGES_TABLE,),
+                    ).fetchone()[0],
+                    has_pages,
+                )
+            finally:
+                db.close()
+
+    def test_replaced_rather_than_modified(self):
+        # A server holding the old file open keeps reading it unchanged
+        before = os.stat(self.path)
+        build.build_indexes(self.path)
+        self.assertNotEqual(os.stat(self.path).st_ino, before.st_ino)
+        self.assertEqual(sorted(os.listdir(self.folder.name)), ["dict.db"])
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from ..utils import cache_utils
+
+
+class TestQueryCache(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def query(self, param):
+        self.calls.append(param)
+        return param.upper()
+
+    def test_hit(self):
+        cache = cache_utils.QueryCache(maxsize=2)
+        self.assertEqual(cache.get("a", lambda: self.query("a")), "A")
+        self.assertEqual(cache.get("a", lambda: self.query("a")), "A")
+        self.assertEqual(self.calls, ["a"])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_none_is_cached(self):
+        cache = cache_utils.QueryCache(maxsize=2)
+        cache.get("a", lambda: self.calls.append("a"))
+        cache.get("a", lambda: self.calls.append("a"))
+        self.assertEqual(self.calls, ["a"])
+
+    def test_least_recently_used_eviction(self):
+        cache = cache_utils.QueryCache(maxsize=2)
+        cache.get("a", lambda: self.query("a"))
+        cache.get("b", lambda: self.query("b"))
+        cache.get("a", lambda: self.query("a"))
+        cache.get("c", lambda: self.query("c"))
+        cache.get("a", lambda: self.query("a"))
+        cache.get("b", lambda: self.query("b"))
+        self.assertEqual(self.calls, ["a", "b", "c", "b"])
+        self.assertEqual(cache.stats()["evictions"], 2)
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_disabled(self):
+        cache = cache_utils.QueryCache(maxsize=0)
+        cache.get("a", lambda: self.query("a"))
+        cache.get("a", lambda: self.query("a"))
+        self.assertEqual(self.calls, ["a", "a"])
+
+    def test_ttl(self):
+        cache = cache_utils.QueryCache(maxsize=2, ttl=0.01)
+        cache.get("a", lambda: self.query("a"))
+        time.sleep(0.02)
+        cache.get("a", lambda: self.query("a"))
+        self.assertEqual(self.calls, ["a", "a"])
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_version_change(self):
+        version = [1]
+        cache = cache_utils.QueryCache(maxsize=2, version=lambda: version[0])
+        cache.get("a", lambda: self.query("a"))
+        version[0] = 2
+        cache.get("a", lambda: self.query("a"))
+        cache.get("a", lambda: self.query("a"))
+        self.assertEqual(self.calls, ["a", "a"])
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_cached_decorator(self):
+        cache = cache_utils.QueryCache(maxsize=4)
+
+        @cache.cached(normalize=lambda param, fuzzy: param.replace(" ", ""))
+        def query(param, fuzzy, limit=10):
+            self.calls.append((param, fuzzy, limit))
+            return param
+
+        self.assertEqual(query("nei hou", True), "nei hou")
+        self.assertEqual(query("neihou", True), "nei hou")
+        self.assertEqual(query("neihou", fuzzy=True, limit=10), "nei hou")
+        query("neihou", False)
+        query("neihou", True, limit=20)
+        self.assertEqual(
+            self.calls,
+            [("nei hou", True, 10), ("neihou", False, 10), ("neihou", True, 20)],
+        )
+
+
+class TestFileVersion(TestCase):
+    def test_replaced_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dict.db")
+            with open(path, "w") as f:
+                f.write("a")
+            version = cache_utils.file_version(path)
+            before = version()
+            self.assertEqual(version(), before)
+
+            replacement = os.path.join(directory, "new.db")
+            with open(replacement, "w") as f:
+                f.write("bb")
+            os.replace(replacement, path)
+            self.assertNotEqual(version(), before)
+
+    def test_missing_file(self):
+        version = cache_utils.file_version("/nonexistent/dict.db")
+        self.assertIsNone(version())
+
+    def test_interval(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dict.db")
+            with open(path, "w") as f:
+                f.write("a")
+            version = cache_utils.file_version(path, interval=0.05)
+            before = version()
+
+            with open(path, "w") as f:
+                f.write("bb")
+            self.assertEqual(version(), before)
+            time.sleep(0.06)
+            self.assertNotEqual(version(), before)
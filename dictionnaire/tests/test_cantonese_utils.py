@@ -1,3 +1,4 @@
+import time
 from unittest import TestCase
 
 from ..utils import cantonese_utils
@@ -73,6 +74,16 @@ class TestJyutpingToYale(TestCase):
         res = cantonese_utils.jyutping_to_yale("mat 6")
         self.assertEqual(res, "mat 6")
 
+    def test_table_matches_rules(self):
+        for syllable in cantonese_utils.get_jyutping_syllables():
+            res = cantonese_utils.jyutping_to_yale(syllable, use_spaces_to_segment=True)
+            self.assertEqual(res, cantonese_utils.convert_yale_syllable(syllable))
+
+    def test_not_in_table(self):
+        self.assertNotIn("sheung1", cantonese_utils.get_jyutping_to_yale())
+        res = cantonese_utils.jyutping_to_yale("sheung1", use_spaces_to_segment=True)
+        self.assertEqual(res, "sēung")
+
 
 class TestJyutpingToIPA(TestCase):
     def test_simple(self):
@@ -121,6 +132,16 @@ class TestJyutpingToIPA(TestCase):
         )
         self.assertEqual(res, "säːm˥ kɐu̯˧˥ sei̯˧ lɪŋ˨˩ ŋ̍˩˧ jiː˨ t͡sʰɐt̚˥ päːt̚˧ lʊk̚˨")
 
+    def test_table_matches_rules(self):
+        for syllable in cantonese_utils.get_jyutping_syllables():
+            res = cantonese_utils.jyutping_to_IPA(syllable, use_spaces_to_segment=True)
+            self.assertEqual(res, cantonese_utils.convert_IPA_syllable(syllable))
+
+    def test_not_in_table(self):
+        self.assertNotIn("sheung1", cantonese_utils.get_jyutping_to_IPA())
+        res = cantonese_utils.jyutping_to_IPA("sheung1", use_spaces_to_segment=True)
+        self.assertEqual(res, "she^ng1")
+
     def test_no_tone(self):
         res = cantonese_utils.jyutping_to_yale("mok")
         self.assertEqual(res, "mok")
@@ -522,6 +543,72 @@ class TestJyutpingAutocorrect(TestCase):
         res = cantonese_utils.jyutping_autocorrect("shut goh")
         self.assertEqual(res, "s(a|y!u)t gou")
 
+    def test_separated_parts(self):
+        # Corrected part by part, but as if the whole string were rewritten
+        for jyutping in (
+            "tsat tsing'tsa", " tsat", "zeong 'zeong", "gey yuk'gey", "yum tsyum",
+        ):
+            res = cantonese_utils.jyutping_autocorrect(jyutping)
+            self.assertEqual(
+                res,
+                cantonese_utils.apply_rewrite_rules(
+                    jyutping, cantonese_utils.JYUTPING_AUTOCORRECT_STAGES
+                ),
+            )
+
+
+class TestApplyRewriteRules(TestCase):
+    def test_longest_match(self):
+        stages = cantonese_utils.compile_rewrite_rules(
+            ((("ab", "1"), ("abc", "2"), ("b", "3")),)
+        )
+        res = cantonese_utils.apply_rewrite_rules("abcabbc", stages)
+        self.assertEqual(res, "213c")
+
+    def test_stages(self):
+        stages = cantonese_utils.compile_rewrite_rules(
+            ((("a", "b"),), (("b", "c"),))
+        )
+        res = cantonese_utils.apply_rewrite_rules("ab", stages)
+        self.assertEqual(res, "cc")
+
+    def test_syllable_end(self):
+        stages = cantonese_utils.compile_rewrite_rules(((("ao$", "au"),),))
+        res = cantonese_utils.apply_rewrite_rules("gao gaog'gao", stages)
+        self.assertEqual(res, "gau gaog'gau")
+
+    def test_kept_pattern(self):
+        stages = cantonese_utils.compile_rewrite_rules(
+            ((("y", "j"), ("yu", "yu")),)
+        )
+        res = cantonese_utils.apply_rewrite_rules("yyu", stages)
+        self.assertEqual(res, "jyu")
+
+    def test_function(self):
+        stages = cantonese_utils.compile_rewrite_rules(
+            ((
+                ("x", "y"),
+                ("o", lambda before, text, end: f"[{before}|{text[end:]}]"),
+            ),)
+        )
+        res = cantonese_utils.apply_rewrite_rules("xoxo", stages)
+        self.assertEqual(res, "y[y|xo]y[]y|]")
+
+    def test_long_text(self):
+        # Rewriting used to copy the rest of the text at every match, so the
+        # time taken grew with the square of the length of the text
+        def rewrite(repeat):
+            start = time.perf_counter()
+            res = cantonese_utils.apply_rewrite_rules(
+                "gey " * repeat, cantonese_utils.JYUTPING_AUTOCORRECT_STAGES
+            )
+            self.assertEqual(res, "gei " * repeat)
+            return time.perf_counter() - start
+
+        short_time = min(rewrite(25_000) for _ in range(3))
+        # Eight times longer, with some leeway for noise
+        self.assertLess(rewrite(200_000), 16 * short_time)
+
 
 class TestJyutpingSoundChanges(TestCase):
     def test_ng(self):
@@ -834,6 +921,38 @@ class TestJyutpingSoundChanges(TestCase):
         self.assertEqual(res, ["buk?"])
 
 
+class TestJyutpingFuzzyKey(TestCase):
+    def test_initials(self):
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("nei5"), "lei5")
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("lei5"), "lei5")
+        self.assertEqual(
+            cantonese_utils.get_jyutping_fuzzy_key("ngo5"),
+            cantonese_utils.get_jyutping_fuzzy_key("o5"),
+        )
+        self.assertEqual(
+            cantonese_utils.get_jyutping_fuzzy_key("kwan4"),
+            cantonese_utils.get_jyutping_fuzzy_key("gwan4"),
+        )
+
+    def test_go(self):
+        self.assertNotEqual(
+            cantonese_utils.get_jyutping_fuzzy_key("gwok3"),
+            cantonese_utils.get_jyutping_fuzzy_key("gok3"),
+        )
+
+    def test_syllabic_nasals(self):
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("ng5"), "m5")
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("m4"), "m4")
+
+    def test_finals(self):
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("saang1"), "san1")
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("sik6"), "sik6")
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("baak3"), "bat3")
+
+    def test_no_tone(self):
+        self.assertEqual(cantonese_utils.get_jyutping_fuzzy_key("taai"), "dai")
+
+
 class TestJyutpingSegmentation(TestCase):
     def test_simple(self):
         _, res = cantonese_utils.segment_jyutping("m4 goi1")
@@ -930,6 +1049,55 @@ class TestJyutpingSegmentation(TestCase):
         self.assertEqual(validity, False)
         self.assertEqual(res, ["kljnxclkjvnl"])
 
+    def test_keep_regex_characters(self):
+        _, res = cantonese_utils.segment_jyutping(
+            "(g|k)aa!m(jaa!|jyu|yu)(k|t)6", True, False, False
+        )
+        self.assertEqual(res, ["(g|k)aa!m", "(jaa!|jyu|yu)", "(k|t)6"])
+
+    def test_long_regex(self):
+        syllable = cantonese_utils.jyutping_autocorrect("gwongdung")
+        _, res = cantonese_utils.segment_jyutping(syllable * 50, True, False, False)
+        self.assertEqual(res, ["gw(o|u)ng", "d(y!u|a|eo)ng"] * 50)
+
+
+class TestMatchJyutpingComponents(TestCase):
+    def assertMatchesUnfolded(self, jyutping):
+        res = cantonese_utils.match_jyutping_components(jyutping, 0, len(jyutping))
+        res += [0] * (len(jyutping) - len(res))
+        self.assertEqual(
+            res,
+            [
+                cantonese_utils.get_unfolded_component_kinds(jyutping[:length])
+                for length in range(1, len(jyutping) + 1)
+            ],
+        )
+
+    def test_plain(self):
+        res = cantonese_utils.match_jyutping_components("ngaang", 0, 6)
+        self.assertEqual(
+            res[:2],
+            [
+                cantonese_utils.JYUTPING_INITIAL,
+                cantonese_utils.JYUTPING_INITIAL | cantonese_utils.JYUTPING_FINAL,
+            ],
+        )
+        self.assertFalse(any(res[2:]))
+
+    def test_alternatives(self):
+        self.assertMatchesUnfolded("(jaa!|jyu|yu)(k|t)")
+        self.assertMatchesUnfolded("(c|z)(y!u|aa!|eo)n")
+
+    def test_optional_character(self):
+        self.assertMatchesUnfolded("gw!ong")
+        self.assertMatchesUnfolded("(ng)!aa!u")
+        self.assertMatchesUnfolded("(a|e)!i")
+
+    def test_irregular(self):
+        self.assertMatchesUnfolded("o(an)|!")
+        self.assertMatchesUnfolded("a|!(b)")
+        self.assertMatchesUnfolded(")aa(")
+
 
 class TestFuzzyJyutping(TestCase):
     def test_clarence(self):
@@ -1003,3 +1171,21 @@ class TestFuzzyJyutping(TestCase):
             output = cantonese_utils.jyutping_sound_changes(intermediate)
 
             self.assertEqual(expected_output, output)
+
+
+class TestJyutpingBatch(TestCase):
+    JYUTPINGS = ["si1 zi2 saan1", "", "gwong2dung1waa2", "si1 zi2 saan1", "joeng", "m4 hai6 ?"]
+
+    def test_same_as_single(self):
+        for batch, single in (
+            (cantonese_utils.jyutping_to_yale_batch, cantonese_utils.jyutping_to_yale),
+            (cantonese_utils.jyutping_to_IPA_batch, cantonese_utils.jyutping_to_IPA),
+            (cantonese_utils.extract_jyutping_tones_batch, cantonese_utils.extract_jyutping_tones),
+            (cantonese_utils.segment_jyutping_batch, cantonese_utils.segment_jyutping),
+        ):
+            with self.subTest(batch.__name__):
+                self.assertEqual(batch(self.JYUTPINGS), [single(j) for j in self.JYUTPINGS])
+
+    def test_use_spaces_to_segment(self):
+        res = cantonese_utils.jyutping_to_yale_batch(iter(["si1 zi2", "saan1"]), use_spaces_to_segment=True)
+        self.assertEqual(res, ["sī jí", "sāan"])
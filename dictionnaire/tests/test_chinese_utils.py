@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from ..utils import chinese_utils, default_settings
+from ..utils import cantonese_utils, chinese_utils, default_settings
 
 class TestApplyColours(TestCase):
     def test_jyutping(self):
@@ -56,3 +56,40 @@ class TestCompareStrings(TestCase):
     def test_compatibility_variant_normalization(self):
         res = chinese_utils.compare_strings("響", "響")
         self.assertEqual(res, "－")
+
+
+class TestRenderHeadword(TestCase):
+    def assertSameAsHelpers(self, traditional, simplified, jyutping):
+        tones = cantonese_utils.extract_jyutping_tones(jyutping)
+        colours = default_settings.DEFAULT_JYUTPING_TONES
+        traditional_difference = chinese_utils.compare_strings(simplified, traditional)
+        simplified_difference = chinese_utils.compare_strings(traditional, simplified)
+
+        res = chinese_utils.render_headword(traditional, simplified, jyutping)
+        self.assertEqual(res.coloured_traditional, chinese_utils.apply_colours(traditional, tones, colours))
+        self.assertEqual(res.coloured_simplified, chinese_utils.apply_colours(simplified, tones, colours))
+        self.assertEqual(res.traditional_difference, traditional_difference)
+        self.assertEqual(
+            res.coloured_traditional_difference,
+            chinese_utils.apply_colours(traditional_difference, tones, colours),
+        )
+        self.assertEqual(res.simplified_difference, simplified_difference)
+        self.assertEqual(
+            res.coloured_simplified_difference,
+            chinese_utils.apply_colours(simplified_difference, tones, colours),
+        )
+
+    def test_han(self):
+        self.assertSameAsHelpers("語言藝術", "语言艺术", "jyu5 jin4 ngai6 seot6")
+
+    def test_missing_tones(self):
+        self.assertSameAsHelpers("廣東話", "广东话", "gwong2")
+
+    def test_different_lengths(self):
+        self.assertSameAsHelpers("齮齕", "𬺈", "ji2 hat1")
+
+    def test_letters_and_special_characters(self):
+        self.assertSameAsHelpers("卡拉OK，好", "卡拉OK，好", "kaa1 laa1 ou1 kei1 hou2")
+
+    def test_compatibility_variant_normalization(self):
+        self.assertSameAsHelpers("響", "響", "hoeng2")
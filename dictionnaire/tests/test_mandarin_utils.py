@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from ..utils import mandarin_utils
 
@@ -201,6 +201,57 @@ class TestPinyinToIPA(TestCase):
         self.assertEqual(res, "t͡ɕʰɥɑɻ˥˥")
 
 
+class TestSyllableTables(TestCase):
+    """Checks the conversions through the syllable tables against the
+    conversion rules alone."""
+
+    def assertSameAsRules(self, convert, table, strings):
+        with_tables = [convert(string) for string in strings]
+        with mock.patch.dict(table, clear=True):
+            with_rules = [convert(string) for string in strings]
+        self.assertEqual(with_tables, with_rules)
+
+    def test_pretty_pinyin(self):
+        self.assertSameAsRules(
+            mandarin_utils.pretty_pinyin,
+            mandarin_utils.get_pinyin_to_pretty(),
+            mandarin_utils.get_pinyin_syllables(),
+        )
+
+    def test_zhuyin(self):
+        self.assertSameAsRules(
+            lambda pinyin: mandarin_utils.pinyin_to_zhuyin(pinyin, use_spaces_to_segment=True),
+            mandarin_utils.get_pinyin_to_zhuyin(),
+            mandarin_utils.get_pinyin_syllables(),
+        )
+
+    def test_IPA(self):
+        # Tones depend on the previous and next syllables
+        strings = [
+            f"{before} {syllable} {after}"
+            for syllable in mandarin_utils.get_pinyin_syllables()
+            for before, after in (("ni3", "ma5"), ("bu4", "hao3"), (",", "5"))
+        ]
+        self.assertSameAsRules(
+            lambda pinyin: mandarin_utils.pinyin_to_IPA(pinyin, use_spaces_to_segment=True),
+            mandarin_utils.get_pinyin_to_IPA(),
+            strings,
+        )
+
+    def test_u_colon_spellings(self):
+        self.assertEqual(mandarin_utils.pretty_pinyin("nu:3"), "nǚ")
+        self.assertEqual(mandarin_utils.pretty_pinyin("nü3"), "nǚ")
+        self.assertEqual(
+            mandarin_utils.get_pinyin_to_zhuyin()["lu:e4"],
+            mandarin_utils.get_pinyin_to_zhuyin()["lve4"],
+        )
+
+    def test_not_in_table(self):
+        self.assertNotIn("ngai2", mandarin_utils.get_pinyin_to_pretty())
+        res = mandarin_utils.pretty_pinyin("ngai2")
+        self.assertEqual(res, "ngái")
+
+
 class TestPinyinSoundChanges(TestCase):
     def test_z(self):
         res = mandarin_utils.pinyin_sound_changes(["zuan"])
@@ -351,6 +402,21 @@ class TestPinyinSoundChanges(TestCase):
         self.assertEqual(res, ["ping!?"])
 
 
+class TestPinyinFuzzyKey(TestCase):
+    def test_initials(self):
+        self.assertEqual(mandarin_utils.get_pinyin_fuzzy_key("zhong1"), "zong1")
+        self.assertEqual(mandarin_utils.get_pinyin_fuzzy_key("ren2"), "len2")
+        self.assertEqual(mandarin_utils.get_pinyin_fuzzy_key("nu:3"), "lu:3")
+
+    def test_finals(self):
+        self.assertEqual(
+            mandarin_utils.get_pinyin_fuzzy_key("shang4"),
+            mandarin_utils.get_pinyin_fuzzy_key("san4"),
+        )
+        self.assertEqual(mandarin_utils.get_pinyin_fuzzy_key("qing"), "qin")
+        self.assertEqual(mandarin_utils.get_pinyin_fuzzy_key("zhuang1"), "zuan1")
+
+
 class TestPinyinSegmentation(TestCase):
     def test_simple(self):
         _, res = mandarin_utils.segment_pinyin("guang3 dong1")
@@ -447,3 +513,72 @@ class TestPinyinSegmentation(TestCase):
     def test_garbage(self):
         _, res = mandarin_utils.segment_pinyin("kljnxclkjvnl")
         self.assertEqual(res, ["kljnxclkjvnl"])
+
+
+class TestPinyinSegmentationAlternatives(TestCase):
+    def test_ambiguous(self):
+        res = mandarin_utils.segment_pinyin_alternatives("xian")
+        self.assertEqual(res, [["xian"], ["xi", "an"]])
+
+        res = mandarin_utils.segment_pinyin_alternatives("fangan")
+        self.assertEqual(res, [["fang", "an"], ["fan", "gan"]])
+
+    def test_greedy_first(self):
+        res = mandarin_utils.segment_pinyin_alternatives("naren")
+        self.assertEqual(res[0], mandarin_utils.segment_pinyin("naren")[1])
+        self.assertIn(["na", "ren"], res)
+
+    def test_separators(self):
+        res = mandarin_utils.segment_pinyin_alternatives("xi'an")
+        self.assertEqual(res, [["xi", "an"]])
+
+        res = mandarin_utils.segment_pinyin_alternatives(
+            "xian* dong?", remove_glob_characters=False
+        )
+        self.assertEqual(
+            res, [["xian", "* ", "dong", "?"], ["xi", "an", "* ", "dong", "?"]]
+        )
+
+    def test_tones(self):
+        res = mandarin_utils.segment_pinyin_alternatives("xi1an1")
+        self.assertEqual(res, [["xi1", "an1"]])
+
+    def test_limit(self):
+        res = mandarin_utils.segment_pinyin_alternatives("changan", limit=1)
+        self.assertEqual(res, [["chang", "an"]])
+
+    def test_garbage(self):
+        res = mandarin_utils.segment_pinyin_alternatives("kljnxclkjvnl")
+        self.assertEqual(res, [["kljnxclkjvnl"]])
+
+    def test_frequencies(self):
+        res = mandarin_utils.rank_pinyin_word_segmentations("fangan", 2)
+        self.assertEqual([syllables for _, syllables in res], [("fan", "gan"), ("fang", "an")])
+
+        res = mandarin_utils.rank_pinyin_word_segmentations(
+            "fangan", 2, {"fang": 10, "an": 10, "fan": 1, "gan": 1}
+        )
+        self.assertEqual([syllables for _, syllables in res], [("fang", "an"), ("fan", "gan")])
+
+
+
+class TestPinyinBatch(TestCase):
+    PINYINS = ["shuai4 ge1", "", "  ", "xiang1gang3", "shuai4 ge1", "ba", "ni3 hao3 ?"]
+
+    def test_same_as_single(self):
+        for batch, single in (
+            (mandarin_utils.pretty_pinyin_batch, mandarin_utils.pretty_pinyin),
+            (mandarin_utils.pinyin_to_zhuyin_batch, mandarin_utils.pinyin_to_zhuyin),
+            (mandarin_utils.pinyin_to_IPA_batch, mandarin_utils.pinyin_to_IPA),
+            (mandarin_utils.extract_pinyin_tones_batch, mandarin_utils.extract_pinyin_tones),
+            (mandarin_utils.segment_pinyin_batch, mandarin_utils.segment_pinyin),
+        ):
+            with self.subTest(batch.__name__):
+                self.assertEqual(batch(self.PINYINS), [single(p) for p in self.PINYINS])
+
+    def test_syllables_converted_once(self):
+        with mock.patch.object(
+            mandarin_utils, "convert_zhuyin_syllable", wraps=mandarin_utils.convert_zhuyin_syllable
+        ) as convert_zhuyin_syllable:
+            mandarin_utils.pinyin_to_zhuyin_batch(["ni3 ?", "? hao3"], use_spaces_to_segment=True)
+            convert_zhuyin_syllable.assert_called_once_with("?")
@@ -0,0 +1,88 @@
+from unittest import TestCase, mock
+
+from ..models import Definition, DefinitionsSet, Entry, SourceSentence
+from ..utils import cantonese_utils, chinese_utils, default_settings, mandarin_utils
+
+
+class TestEntry(TestCase):
+    def test_fields_computed_on_first_use(self):
+        with mock.patch.object(
+            cantonese_utils, "jyutping_to_yale", wraps=cantonese_utils.jyutping_to_yale
+        ) as jyutping_to_yale:
+            entry = Entry("廣東話", "广东话", "gwong2 dung1 waa2", "guang3 dong1 hua4")
+            jyutping_to_yale.assert_not_called()
+
+            self.assertEqual(entry._yale, "gwóng dūng wá")
+            self.assertEqual(entry._yale, "gwóng dūng wá")
+            jyutping_to_yale.assert_called_once()
+
+    def test_fields(self):
+        entry = Entry("廣東話", "广东话", "gwong2 dung1 waa2", "guang3 dong1 hua4")
+        self.assertEqual(entry._pretty_pinyin, mandarin_utils.pretty_pinyin(entry.pinyin))
+        self.assertEqual(entry._zhuyin, mandarin_utils.pinyin_to_zhuyin(entry.pinyin))
+        self.assertEqual(entry._simplified_difference, "广东话")
+        self.assertEqual(entry._traditional_difference, "廣東話")
+        self.assertEqual(
+            entry._coloured_simplified_difference,
+            chinese_utils.apply_colours(
+                "广东话", [2, 1, 2], default_settings.DEFAULT_JYUTPING_TONES
+            ),
+        )
+
+    def test_coloured_simplified(self):
+        entry = Entry("廣東話", "广东话", "gwong2 dung1 waa2", "guang3 dong1 hua4")
+        self.assertEqual(
+            entry._coloured_simplified,
+            chinese_utils.apply_colours(
+                "广东话", [2, 1, 2], default_settings.DEFAULT_JYUTPING_TONES
+            ),
+        )
+
+    def test_coloured_simplified_regression(self):
+        # The simplified headword used to be coloured from the traditional
+        # one, so it showed the traditional characters
+        entry = Entry("廣東話", "广东话", "gwong2 dung1 waa2", "guang3 dong1 hua4")
+        tones = default_settings.DEFAULT_JYUTPING_TONES
+        old = chinese_utils.apply_colours("廣東話", [2, 1, 2], tones)
+        new = chinese_utils.apply_colours("广东话", [2, 1, 2], tones)
+
+        self.assertEqual(
+            new,
+            f'<span style="color: {tones[2]}">广</span>'
+            f'<span style="color: {tones[1]}">东</span>'
+            f'<span style="color: {tones[2]}">话</span>',
+        )
+        self.assertEqual(entry._coloured_simplified, new)
+        self.assertNotEqual(entry._coloured_simplified, old)
+
+
+class TestDefinitionsSet(TestCase):
+    def test_slotted(self):
+        definitions_set = DefinitionsSet("YFDICT", [Definition("bonjour", "")])
+        self.assertFalse(hasattr(definitions_set, "__dict__"))
+
+    def test_interned(self):
+        # Build the strings at runtime, so that they are not constants
+        first = DefinitionsSet("".join(["YF", "DICT"]), [Definition("a", "".join(["ad", "j"]))])
+        second = DefinitionsSet("".join(["YFD", "ICT"]), [Definition("b", "".join(["a", "dj"]))])
+        self.assertIs(first.source, second.source)
+        self.assertIs(first.definitions[0].label, second.definitions[0].label)
+
+    def test_snippet(self):
+        definitions_set = DefinitionsSet(
+            "YFDICT", [Definition("tu\ntoi", ""), Definition("vous", "")]
+        )
+        self.assertEqual(definitions_set._definitions_snippet, "tu; vous")
+
+
+class TestSourceSentence(TestCase):
+    def test_fields(self):
+        sentence = SourceSentence("yue", "你好吗？", "你好嗎？", "nei5 hou2 maa3", "ni3 hao3 ma5")
+        self.assertEqual(
+            sentence._yale,
+            cantonese_utils.jyutping_to_yale("nei5 hou2 maa3", use_spaces_to_segment=True),
+        )
+        self.assertEqual(
+            sentence._mandarin_IPA,
+            mandarin_utils.pinyin_to_IPA("ni3 hao3 ma5", use_spaces_to_segment=True),
+        )
@@ -0,0 +1,416 @@
+import gc
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from unittest import TestCase, mock
+
+# queries needs the path of the database when it is imported, but every
+# statement below is run against the fixture database instead
+os.environ.setdefault("CANTONAIS_ORG_DB_PATH", os.devnull)
+
+from .. import build, queries
+
+# Schema of the dictionary as generated by jyut-dict
+SCHEMA = """
+CREATE TABLE entries(
+  entry_id INTEGER PRIMARY KEY, traditional TEXT, simplified TEXT,
+  pinyin TEXT, jyutping TEXT, frequency REAL,
+  UNIQUE(traditional, simplified, pinyin, jyutping) ON CONFLICT IGNORE
+);
+CREATE TABLE sources(
+  source_id INTEGER PRIMARY KEY ON CONFLICT IGNORE,
+  sourcename TEXT UNIQUE ON CONFLICT ABORT, sourceshortname TEXT,
+  version TEXT, description TEXT, legal TEXT, link TEXT, update_url TEXT,
+  other TEXT
+);
+CREATE TABLE definitions(
+  definition_id INTEGER PRIMARY KEY, fk_entry_id INTEGER,
+  fk_source_id INTEGER, definition TEXT, label TEXT,
+  FOREIGN KEY(fk_entry_id) REFERENCES entries(entry_id) ON UPDATE CASCADE,
+  FOREIGN KEY(fk_source_id) REFERENCES sources(source_id) ON DELETE CASCADE,
+  UNIQUE(fk_entry_id, fk_source_id, definition) ON CONFLICT IGNORE
+);
+CREATE TABLE chinese_sentences(
+  chinese_sentence_id INTEGER PRIMARY KEY, traditional TEXT,
+  simplified TEXT, pinyin TEXT, jyutping TEXT, language TEXT,
+  UNIQUE(traditional, simplified, pinyin, jyutping, language) ON CONFLICT IGNORE
+);
+CREATE TABLE nonchinese_sentences(
+  non_chinese_sentence_id INTEGER PRIMARY KEY ON CONFLICT IGNORE,
+  sentence TEXT, language TEXT,
+  UNIQUE(non_chinese_sentence_id, sentence, language) ON CONFLICT IGNORE
+);
+CREATE TABLE sentence_links(
+  fk_chinese_sentence_id INTEGER, fk_non_chinese_sentence_id INTEGER,
+  fk_source_id INTEGER, direct BOOLEAN,
+  FOREIGN KEY(fk_chinese_sentence_id) REFERENCES chinese_sentences(chinese_sentence_id),
+  FOREIGN KEY(fk_non_chinese_sentence_id) REFERENCES nonchinese_sentences(non_chinese_sentence_id),
+  FOREIGN KEY(fk_source_id) REFERENCES sources(source_id) ON DELETE CASCADE,
+  UNIQUE(fk_chinese_sentence_id, fk_non_chinese_sentence_id) ON CONFLICT IGNORE
+);
+CREATE TABLE definitions_chinese_sentences_links(
+  fk_definition_id INTEGER, fk_chinese_sentence_id INTEGER,
+  FOREIGN KEY(fk_definition_id) REFERENCES definitions(definition_id) ON DELETE CASCADE,
+  FOREIGN KEY(fk_chinese_sentence_id) REFERENCES chinese_sentences(chinese_sentence_id),
+  UNIQUE(fk_definition_id, fk_chinese_sentence_id) ON CONFLICT IGNORE
+);
+CREATE TABLE database_metadata(key TEXT, value TEXT, UNIQUE(key) ON CONFLICT ABORT);
+CREATE VIRTUAL TABLE definitions_fts USING fts5(fk_entry_id UNINDEXED, definition);
+CREATE INDEX fk_entry_id_index ON definitions(fk_entry_id);
+CREATE INDEX fk_definition_id_index ON definitions_chinese_sentences_links(fk_definition_id);
+CREATE INDEX fk_chinese_sentence_id_index ON definitions_chinese_sentences_links(fk_chinese_sentence_id);
+CREATE INDEX fk_chinese_sentence_id_sentence_links_index ON sentence_links(fk_chinese_sentence_id);
+CREATE INDEX fk_non_chinese_sentence_id_index ON sentence_links(fk_non_chinese_sentence_id);
+CREATE INDEX traditional_index ON entries(traditional);
+CREATE INDEX simplified_index ON entries(simplified);
+CREATE INDEX jyutping_index ON entries(jyutping);
+CREATE INDEX pinyin_index ON entries(pinyin);
+"""
+
+FIXTURE = """
+INSERT INTO sources(source_id, sourcename, sourceshortname)
+VALUES (1, 'YFDICT', 'YF'), (2, 'Tatoeba', 'TTB');
+INSERT INTO entries VALUES
+  (1, '你好', '你好', 'ni3 hao3', 'nei5 hou2', 10.0),
+  (2, '你', '你', 'ni3', 'nei5', 20.0),
+  (3, '好', '好', 'hao3', 'hou2', 30.0),
+  (4, '廣東話', '广东话', 'guang3 dong1 hua4', 'gwong2 dung1 waa2', 5.0);
+INSERT INTO definitions(fk_entry_id, fk_source_id, definition, label) VALUES
+  (1, 1, 'bonjour', ''),
+  (2, 1, 'tu ; toi', ''),
+  (3, 1, 'bien ; bon', ''),
+  (4, 1, 'cantonais (langue)', '');
+INSERT INTO definitions_fts(rowid, fk_entry_id, definition)
+SELECT definition_id, fk_entry_id, definition FROM definitions;
+INSERT INTO chinese_sentences(traditional, simplified, pinyin, jyutping, language)
+VALUES ('你好嗎？', '你好吗？', 'ni3 hao3 ma5', 'nei5 hou2 maa3', 'yue'),
+  ('我講廣東話。', '我讲广东话。', 'wo3 jiang3 guang3 dong1 hua4', 'ngo5 gong2 gwong2 dung1 waa2', 'yue');
+INSERT INTO nonchinese_sentences VALUES (1, 'Comment vas-tu ?', 'fra'), (2, 'Je parle cantonais.', 'fra');
+INSERT INTO sentence_links VALUES (1, 1, 2, 1), (2, 2, 2, 1);
+INSERT INTO definitions_chinese_sentences_links VALUES (1, 1), (4, 2);
+INSERT INTO database_metadata VALUES ('version', '3');
+"""
+
+# e.g. "SCAN entries", "SCAN cs USING INDEX ...",
+# "SCAN definitions_fts VIRTUAL TABLE INDEX 0:M2"
+SCAN_PATTERN = re.compile(r"^SCAN (?:main\.)?(\w+)(?: VIRTUAL TABLE INDEX \d+:(\S*))?")
+ALIAS_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+AS\s+(\w+)", re.IGNORECASE)
+
+
+class QueryPlanTestCase(TestCase):
+    """Runs the functions of queries against a small database with the
+    production schema, and checks the query plan of every statement they
+    issue."""
+
+    build_indexes = True
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:", factory=queries.Connection)
+        self.db.create_function("REGEXP", 2, queries.regexp, deterministic=True)
+        self.db.executescript(SCHEMA)
+        self.db.executescript(FIXTURE)
+        if self.build_indexes:
+            with self.db:
+                build.build_syllable_indexes(self.db)
+                build.build_example_indexes(self.db)
+                build.build_entry_pages(self.db)
+
+        self.tables = {
+            name
+            for (name,) in self.db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+
+        for patch in (
+            mock.patch.object(queries, "get_db", return_value=self.db),
+            mock.patch.object(queries.query_cache, "maxsize", 0),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        # Read in full once per database, rather than by each search
+        queries.get_syllable_frequencies(self.db, "pinyin")
+
+    def tearDown(self):
+        self.db.close()
+
+    def plans(self, func, *args) -> list[tuple[str, list[str]]]:
+        statements = []
+        self.db.set_trace_callback(statements.append)
+        try:
+            func(*args)
+        finally:
+            self.db.set_trace_callback(None)
+
+        # Leave out schema lookups, and the statements run by SQLite itself
+        # (e.g. by full-text indexes) rather than by queries
+        statements = [
+            statement
+            for statement in statements
+            if not statement.lstrip().startswith(("--", "PRAGMA"))
+            and "sqlite_master" not in statement
+            and "'main'." not in statement
+        ]
+        self.assertTrue(statements)
+
+        return [
+            (
+                statement,
+                [
+                    row[3]
+                    for row in self.db.execute(f"EXPLAIN QUERY PLAN {statement}")
+                ],
+            )
+            for statement in statements
+        ]
+
+    def full_scans(self, plans: list[tuple[str, list[str]]]) -> set[str]:
+        """Returns the tables of the dictionary that are read in full."""
+        res = set()
+        for statement, details in plans:
+            aliases = {
+                alias: table for table, alias in ALIAS_PATTERN.findall(statement)
+            }
+            for detail in details:
+                match = SCAN_PATTERN.match(detail)
+                if not match:
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                # Virtual tables are only read in full when they are given
+                # no constraint, such as MATCH
+                is_virtual = match.group(2) is not None
+                if table in self.tables and (not is_virtual or not match.group(2)):
+                    res.add(table)
+        return res
+
+    def assertIndexed(self, func, *args, uses=()):
+        plans = self.plans(func, *args)
+        self.assertEqual(self.full_scans(plans), set(), plans)
+
+        details = [detail for _, statement_details in plans for detail in statement_details]
+        for expected in uses:
+            self.assertTrue(
+                any(expected in detail for detail in details),
+                f"{expected!r} not found in {details}",
+            )
+
+    def assertFullScans(self, tables, func, *args):
+        plans = self.plans(func, *args)
+        self.assertEqual(self.full_scans(plans), set(tables), plans)
+
+
+class TestSearchQueryPlans(QueryPlanTestCase):
+    TRADITIONAL_RANGE = "INDEX traditional_index (traditional>? AND traditional<?)"
+    SIMPLIFIED_RANGE = "INDEX simplified_index (simplified>? AND simplified<?)"
+    JYUTPING_RANGE = "INDEX jyutping_index (jyutping>? AND jyutping<?)"
+    PINYIN_RANGE = "INDEX pinyin_index (pinyin>? AND pinyin<?)"
+    HYDRATION = "SEARCH d USING COVERING INDEX sqlite_autoindex_definitions_1"
+
+    def test_traditional_prefix(self):
+        self.assertIndexed(
+            queries.query_traditional, "你", uses=(self.TRADITIONAL_RANGE, self.HYDRATION)
+        )
+
+    def test_traditional_exact(self):
+        self.assertIndexed(queries.query_traditional, '"你好"', uses=(self.TRADITIONAL_RANGE,))
+
+    def test_traditional_end_anchored(self):
+        self.assertIndexed(queries.query_traditional, "你好$", uses=(self.TRADITIONAL_RANGE,))
+
+    def test_simplified_prefix(self):
+        self.assertIndexed(queries.query_simplified, "广东", uses=(self.SIMPLIFIED_RANGE,))
+
+    def test_simplified_exact(self):
+        self.assertIndexed(queries.query_simplified, '"广东话"', uses=(self.SIMPLIFIED_RANGE,))
+
+    def test_jyutping_prefix(self):
+        self.assertIndexed(queries.query_jyutping, "nei", False, uses=(self.JYUTPING_RANGE,))
+
+    def test_jyutping_exact(self):
+        self.assertIndexed(queries.query_jyutping, '"nei5"', False, uses=(self.JYUTPING_RANGE,))
+
+    def test_jyutping_end_anchored(self):
+        self.assertIndexed(
+            queries.query_jyutping, "nei hou$", False, uses=(self.JYUTPING_RANGE,)
+        )
+
+    def test_fuzzy_jyutping(self):
+        # The last syllable may be the beginning of a longer one, so it is
+        # looked up by spelling rather than by fuzzy key
+        self.assertIndexed(
+            queries.query_jyutping,
+            "leihou",
+            True,
+            uses=(
+                "SEARCH jyutping_fuzzy_keys USING PRIMARY KEY",
+                "SEARCH jyutping_syllables USING PRIMARY KEY",
+            ),
+        )
+
+    def test_fuzzy_jyutping_end_anchored(self):
+        self.assertIndexed(
+            queries.query_jyutping,
+            "nei hou$",
+            True,
+            uses=("SEARCH jyutping_fuzzy_keys USING PRIMARY KEY",),
+        )
+
+    def test_fuzzy_jyutping_wildcard(self):
+        # Regexes spanning several syllables cannot be looked up in the
+        # syllable index
+        self.assertFullScans({"entries"}, queries.query_jyutping, "ne*", True)
+
+    def test_pinyin_prefix(self):
+        self.assertIndexed(queries.query_pinyin, "ni", False, uses=(self.PINYIN_RANGE,))
+
+    def test_fuzzy_pinyin(self):
+        self.assertIndexed(
+            queries.query_pinyin,
+            "nihao",
+            True,
+            uses=(
+                "SEARCH pinyin_fuzzy_keys USING PRIMARY KEY",
+                "SEARCH pinyin_syllables USING PRIMARY KEY",
+            ),
+        )
+
+    def test_pinyin_alternatives(self):
+        # Each segmentation of ambiguous Pinyin is looked up in the index
+        self.assertIndexed(
+            queries.query_pinyin, "xian", False, uses=("MULTI-INDEX OR", self.PINYIN_RANGE)
+        )
+
+    def test_detect_romanization(self):
+        self.assertIndexed(
+            queries.detect_romanization,
+            "neihou",
+            uses=(self.JYUTPING_RANGE, self.PINYIN_RANGE),
+        )
+
+    def test_full_text(self):
+        self.assertIndexed(
+            queries.query_full_text,
+            "bonjour",
+            uses=("SCAN definitions_fts VIRTUAL TABLE INDEX 0:M",),
+        )
+
+
+class TestEntryPageQueryPlans(QueryPlanTestCase):
+    def test_entry_page(self):
+        self.assertIndexed(
+            queries.get_entry_page,
+            "你好",
+            uses=(f"SEARCH {build.ENTRY_PAGES_TABLE} USING PRIMARY KEY",),
+        )
+
+    def test_traditional(self):
+        self.assertIndexed(
+            queries.get_traditional,
+            "你好",
+            uses=("INDEX traditional_index (traditional>? AND traditional<?)",),
+        )
+
+    def test_examples_ngram(self):
+        self.assertIndexed(
+            queries.query_examples,
+            "你好",
+            uses=(f"SEARCH {build.EXAMPLE_NGRAMS_TABLE} USING PRIMARY KEY",),
+        )
+
+    def test_examples_trigram(self):
+        self.assertIndexed(
+            queries.query_examples,
+            "廣東話",
+            uses=(f"SCAN {build.EXAMPLE_TRIGRAMS_TABLE} VIRTUAL TABLE INDEX 0:M",),
+        )
+
+    def test_examples_wildcard(self):
+        # LIKE wildcards can only be matched against every sentence
+        self.assertFullScans({"chinese_sentences"}, queries.query_examples, "你_")
+
+
+class TestUnindexedQueryPlans(QueryPlanTestCase):
+    """Without the tables added by build_indexes, only fuzzy searches and
+    example sentences should need to read a whole table."""
+
+    build_indexes = False
+
+    def test_prefix(self):
+        self.assertIndexed(queries.query_traditional, "你")
+        self.assertIndexed(queries.query_jyutping, "nei", False)
+        self.assertIndexed(queries.query_pinyin, "ni", False)
+
+    def test_fuzzy(self):
+        self.assertFullScans({"entries"}, queries.query_jyutping, "leihou", True)
+        self.assertFullScans({"entries"}, queries.query_pinyin, "nihao", True)
+
+    def test_entry_page(self):
+        self.assertFullScans({"chinese_sentences"}, queries.get_entry_page, "你好")
+
+    def test_entry_page_cached_once(self):
+        # Without stored pages, the page is put together from the live
+        # queries, and only the page itself takes a place in the cache
+        queries.query_cache.clear()
+        self.addCleanup(queries.query_cache.clear)
+        with mock.patch.object(queries.query_cache, "maxsize", 16):
+            queries.get_entry_page("你好")
+            self.assertEqual(queries.query_cache.stats()["size"], 1)
+
+
+class TestConnectionSchema(TestCase):
+    def test_per_connection(self):
+        indexed = sqlite3.connect(":memory:", factory=queries.Connection)
+        indexed.execute(f"CREATE TABLE {build.EXAMPLE_NGRAMS_TABLE}(ngram TEXT)")
+        unindexed = sqlite3.connect(":memory:", factory=queries.Connection)
+
+        self.assertTrue(queries.has_table(indexed, build.EXAMPLE_NGRAMS_TABLE))
+        self.assertFalse(queries.has_table(unindexed, build.EXAMPLE_NGRAMS_TABLE))
+        self.assertIsNone(queries.get_syllable_frequencies(unindexed, "pinyin"))
+
+        # Nothing else keeps a reference to a connection once it is replaced
+        unindexed.close()
+        ref = weakref.ref(unindexed)
+        del unindexed
+        gc.collect()
+        self.assertIsNone(ref())
+        indexed.close()
+
+
+class TestGetDb(TestCase):
+    def setUp(self):
+        self.version = 1
+        self.opened = []
+        for patch in (
+            mock.patch.object(queries, "db_version", lambda: self.version),
+            mock.patch.object(queries, "open_db", self.open_db),
+            mock.patch.object(queries, "_connections", threading.local()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def open_db(self):
+        db = mock.Mock()
+        self.opened.append(db)
+        return db
+
+    def test_reused(self):
+        self.assertIs(queries.get_db(), queries.get_db())
+        self.assertEqual(len(self.opened), 1)
+
+    def test_replaced_database(self):
+        old = queries.get_db()
+        self.version = 2
+        new = queries.get_db()
+        self.assertIsNot(new, old)
+        old.close.assert_called_once()
+        new.close.assert_not_called()
+
+    def test_forked_process(self):
+        # The connection belongs to the parent process, which closes it
+        old = queries.get_db()
+        with mock.patch.object(queries.os, "getpid", return_value=-1):
+            self.assertIsNot(queries.get_db(), old)
+        old.close.assert_not_called()
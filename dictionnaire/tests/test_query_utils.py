@@ -0,0 +1,284 @@
+import re
+import sqlite3
+from unittest import TestCase
+
+from .. import build
+from ..utils import query_utils
+
+
+class TestUnfoldFuzzySyllable(TestCase):
+    def test_plain(self):
+        res = query_utils.unfold_fuzzy_syllable("nei5")
+        self.assertEqual(res, ["nei5"])
+
+    def test_alternatives(self):
+        res = query_utils.unfold_fuzzy_syllable("(n|l)ei")
+        self.assertEqual(res, ["nei", "lei"])
+
+    def test_optional_character(self):
+        res = query_utils.unfold_fuzzy_syllable("gw?ong")
+        self.assertEqual(res, ["gwong", "gong"])
+
+    def test_optional_group(self):
+        res = query_utils.unfold_fuzzy_syllable("(ng)?o")
+        self.assertEqual(res, ["ngo", "o"])
+
+    def test_nested_groups(self):
+        res = query_utils.unfold_fuzzy_syllable("(c|z)(y?u|a|eo)n")
+        self.assertEqual(
+            res,
+            ["cyun", "cun", "can", "ceon", "zyun", "zun", "zan", "zeon"],
+        )
+
+    def test_duplicates(self):
+        res = query_utils.unfold_fuzzy_syllable("(a|a)")
+        self.assertEqual(res, ["a"])
+
+    def test_wildcard(self):
+        res = query_utils.unfold_fuzzy_syllable("ne.*")
+        self.assertIsNone(res)
+
+    def test_unbalanced(self):
+        res = query_utils.unfold_fuzzy_syllable("(n|lei")
+        self.assertIsNone(res)
+
+    def test_too_many_alternatives(self):
+        res = query_utils.unfold_fuzzy_syllable("(a|b)" * 7)
+        self.assertIsNone(res)
+
+
+class TestPreparePinyinBindValueAlternatives(TestCase):
+    def test_ambiguous(self):
+        res = query_utils.prepare_pinyin_bind_value_alternatives("xian", False)
+        self.assertEqual(res, ("xian?*", "xi? an?*"))
+
+    def test_fuzzy(self):
+        res = query_utils.prepare_pinyin_bind_value_alternatives("xian$", True)
+        self.assertEqual(res, ("^xiang?.$", "^xi. ang?.$"))
+
+    def test_exact(self):
+        res = query_utils.prepare_pinyin_bind_value_alternatives('"xi an"', False)
+        self.assertEqual(res, ("xi an",))
+
+    def test_first_alternative(self):
+        res = query_utils.prepare_pinyin_bind_value_alternatives("fangan", False)
+        self.assertEqual(res[0], query_utils.prepare_pinyin_bind_values("fangan", False))
+
+
+class TestParseFuzzyBindValue(TestCase):
+    def test_prefix(self):
+        res = query_utils.parse_fuzzy_bind_value("^(n|l)ei. hou..*")
+        self.assertEqual(res, ([["nei?", "lei?"], ["hou?*"]], False))
+
+    def test_anchored(self):
+        res = query_utils.parse_fuzzy_bind_value("^(n|l)ei5 hou2$")
+        self.assertEqual(res, ([["nei5", "lei5"], ["hou2"]], True))
+
+    def test_wildcard_across_syllables(self):
+        res = query_utils.parse_fuzzy_bind_value("^sik.*.*")
+        self.assertIsNone(res)
+
+    def test_not_a_fuzzy_bind_value(self):
+        res = query_utils.parse_fuzzy_bind_value("nei*")
+        self.assertIsNone(res)
+
+
+class TestSyllableIndexQuery(TestCase):
+    ROMANIZATIONS = [
+        "nei5 hou2",
+        "lei5 hou2",
+        "nei5",
+        "nei5 hou2 maa3",
+        "ngo5 dei6",
+        "o1",
+        "gwong2 dung1 waa2",
+        "gong2",
+        "zung1 man4",
+    ]
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.create_function(
+            "REGEXP", 2, lambda y, x: 1 if re.search(y, x) else 0
+        )
+        self.db.execute(
+            "CREATE TABLE entries(entry_id INTEGER PRIMARY KEY, jyutping TEXT, pinyin TEXT)"
+        )
+        self.db.executemany(
+            "INSERT INTO entries(jyutping, pinyin) VALUES (?, '')",
+            [(romanization,) for romanization in self.ROMANIZATIONS],
+        )
+        build.build_syllable_indexes(self.db)
+
+    def tearDown(self):
+        self.db.close()
+
+    def assertSameEntries(self, search_term):
+        query_param = query_utils.prepare_jyutping_bind_values(search_term, True)
+        expected = self.db.execute(
+            "SELECT entry_id FROM entries WHERE jyutping REGEXP ? ORDER BY entry_id",
+            (query_param,),
+        ).fetchall()
+
+        patterns = query_utils.parse_fuzzy_bind_value(query_param)
+        self.assertIsNotNone(patterns)
+        query, bind_values = query_utils.construct_syllable_index_query(
+            "jyutping_syllables", *patterns, "param"
+        )
+        res = self.db.execute(f"{query} ORDER BY fk_entry_id", bind_values).fetchall()
+
+        self.assertTrue(expected)
+        self.assertEqual(res, expected)
+
+        # Looked up by fuzzy key, the candidates still have to be checked
+        # against the regex, but none of the matches may be missing
+        key_patterns = query_utils.get_fuzzy_key_patterns(
+            patterns[0], build.FUZZY_KEYS["jyutping"]
+        )
+        query, bind_values = query_utils.construct_syllable_index_query(
+            [
+                "jyutping_syllables" if keys is None else "jyutping_fuzzy_keys"
+                for keys in key_patterns
+            ],
+            [
+                spellings if keys is None else keys
+                for spellings, keys in zip(patterns[0], key_patterns)
+            ],
+            patterns[1],
+            "param",
+        )
+        res = self.db.execute(query, bind_values).fetchall()
+        self.assertLessEqual(set(expected), set(res))
+
+    def test_prefix(self):
+        self.assertSameEntries("nei")
+
+    def test_multiple_syllables(self):
+        self.assertSameEntries("leihou")
+
+    def test_exact(self):
+        self.assertSameEntries('"nei5 hou2"')
+
+    def test_end_of_entry(self):
+        self.assertSameEntries("nei hou$")
+
+    def test_optional_initial(self):
+        self.assertSameEntries("ngo")
+
+    def test_optional_medial(self):
+        self.assertSameEntries("gong")
+
+
+class TestGetFuzzyKeyPatterns(TestCase):
+    def test_sound_changes(self):
+        patterns, _ = query_utils.parse_fuzzy_bind_value(
+            query_utils.prepare_jyutping_bind_values("nei hou$", True)
+        )
+        res = query_utils.get_fuzzy_key_patterns(
+            patterns, build.FUZZY_KEYS["jyutping"]
+        )
+        self.assertEqual(res, [["lei?"], ["hou?"]])
+
+    def test_tone(self):
+        res = query_utils.get_fuzzy_key_patterns(
+            [["nei5", "lei5"]], build.FUZZY_KEYS["jyutping"]
+        )
+        self.assertEqual(res, [["lei5"]])
+
+    def test_prefix(self):
+        res = query_utils.get_fuzzy_key_patterns(
+            [["nei?", "lei?"], ["ho?*"]], build.FUZZY_KEYS["jyutping"]
+        )
+        self.assertEqual(res, [["lei?"], None])
+
+
+class TestParseReturnedRowsPage(TestCase):
+    # entry id, total, frequency, entry id
+    ID_ROWS = [(7, 3, 2.0, 7), (5, 3, 1.0, 5), (2, 3, 0.0, 2)]
+    # traditional, simplified, jyutping, pinyin, source id, source name,
+    # definition, entry id
+    ROWS = [
+        ("你好", "你好", "nei5 hou2", "ni3 hao3", 1, "YFDICT", "bonjour", 7),
+        ("你好", "你好", "nei5 hou2", "ni3 hao3", 1, "YFDICT", "salut", 7),
+        ("你好", "你好", "nei5 hou2", "ni3 hao3", 2, "CFDICT", "bonjour", 7),
+        ("你", "你", "nei5", "ni3", 1, "YFDICT", "tu\\ntoi", 5),
+        ("好", "好", "hou2", "hao3", 1, "YFDICT", "bien", 2),
+    ]
+
+    def test_grouping(self):
+        res = query_utils.parse_returned_rows_page(self.ID_ROWS, iter(self.ROWS), 3, 1000)
+        self.assertEqual(res.total, 3)
+        self.assertFalse(res.total_capped)
+        self.assertIsNone(res.next_cursor)
+        self.assertEqual([entry.traditional for entry in res.entries], ["你好", "你", "好"])
+
+        sets = res.entries[0].definitions_sets
+        self.assertEqual([definitions_set.source for definitions_set in sets], ["YFDICT", "CFDICT"])
+        self.assertEqual(
+            [definition.definition_content for definition in sets[0].definitions],
+            ["bonjour", "salut"],
+        )
+        self.assertEqual(
+            res.entries[1].definitions_sets[0].definitions[0].definition_content, "tu\ntoi"
+        )
+
+    def test_next_page(self):
+        res = query_utils.parse_returned_rows_page(self.ID_ROWS, iter(self.ROWS[:4]), 2, 1000)
+        self.assertEqual([entry.traditional for entry in res.entries], ["你好", "你"])
+        self.assertEqual(query_utils.decode_cursor(res.next_cursor, 2), (1.0, 5.0))
+
+    def test_capped_total(self):
+        res = query_utils.parse_returned_rows_page(self.ID_ROWS, iter(self.ROWS[:4]), 2, 2)
+        self.assertEqual(res.total, 2)
+        self.assertTrue(res.total_capped)
+
+
+class TestSearchQuery(TestCase):
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.execute(
+            "CREATE TABLE entries(entry_id INTEGER PRIMARY KEY, frequency REAL, score REAL)"
+        )
+        self.db.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?)",
+            [(1, 2.0, 1.0), (2, 2.0, 0.5), (3, 1.0, 0.5), (4, 3.0, 1.0), (5, 2.0, 0.5)],
+        )
+
+    def tearDown(self):
+        self.db.close()
+
+    def fetch_pages(self, order, limit, count_limit=1000, total=5):
+        query = query_utils.construct_search_query(
+            "SELECT entry_id, frequency, score FROM entries", order
+        )
+        pages = []
+        cursor_keys = [None] * len(order)
+        while True:
+            id_rows = self.db.execute(
+                query,
+                {
+                    **{f"cursor_{idx}": key for idx, key in enumerate(cursor_keys)},
+                    "limit": limit,
+                    "count_limit": count_limit,
+                },
+            ).fetchall()
+            pages.append([row[0] for row in id_rows[:limit]])
+            self.assertEqual(id_rows[0][1], total)
+            if len(id_rows) <= limit:
+                return pages
+            cursor_keys = id_rows[limit - 1][2:]
+
+    def test_descending(self):
+        order = (("frequency", True), ("entry_id", True))
+        self.assertEqual(self.fetch_pages(order, 2), [[4, 5], [2, 1], [3]])
+
+    def test_mixed_directions(self):
+        order = (("score", False), ("frequency", True), ("entry_id", True))
+        self.assertEqual(self.fetch_pages(order, 2), [[5, 2], [3, 4], [1]])
+
+    def test_count_limit(self):
+        # Counting stops one entry past the limit, without changing the pages
+        order = (("frequency", True), ("entry_id", True))
+        self.assertEqual(
+            self.fetch_pages(order, 2, count_limit=2, total=3), [[4, 5], [2, 1], [3]]
+        )
@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from unittest import TestCase
+
+from ..utils import script_detector
+
+
+class TestClassifyScript(TestCase):
+    def test_traditional(self):
+        res = script_detector.classify_script("廣東話")
+        self.assertEqual(
+            (res.has_han, res.has_simplified_only, res.has_traditional_only), (True, False, True)
+        )
+
+    def test_simplified(self):
+        res = script_detector.classify_script("广东话")
+        self.assertEqual(
+            (res.has_han, res.has_simplified_only, res.has_traditional_only), (True, True, False)
+        )
+
+    def test_common(self):
+        res = script_detector.classify_script("你好 nei5")
+        self.assertEqual(
+            (res.has_han, res.has_simplified_only, res.has_traditional_only), (True, False, False)
+        )
+
+    def test_romanization(self):
+        res = script_detector.classify_script("gwong2 dung1 waa2")
+        self.assertEqual(
+            (res.has_han, res.has_simplified_only, res.has_traditional_only), (False, False, False)
+        )
+
+    def test_same_as_regexes(self):
+        # The regexes the detector used to match, built from the same lists
+        simplified_regex = re.compile(
+            ".*(" + "|".join(script_detector.SIMPLIFIED_CHINESE_CHARS) + ").*"
+        )
+        traditional_regex = re.compile(
+            ".*(" + "|".join(script_detector.TRADITIONAL_CHINESE_CHARS) + ").*"
+        )
+        codepoints = [
+            chr(int(escape[2:], 16))
+            for escape in script_detector.SIMPLIFIED_CHINESE_CHARS
+            + script_detector.TRADITIONAL_CHINESE_CHARS
+        ] + ["a", "。", "一", "鿿"]
+        for codepoint in codepoints:
+            query = f"ab {codepoint} c"
+            res = script_detector.classify_script(query)
+            self.assertEqual(res.has_simplified_only, simplified_regex.match(query) is not None)
+            self.assertEqual(res.has_traditional_only, traditional_regex.match(query) is not None)
+
+    def test_cantonese_characters(self):
+        # Colloquial Cantonese characters, from the basic block and the
+        # extensions
+        for codepoint in "嘅咗冇嘢㗎㩒㷫㓤𠮶𨋢𡃁𦧲𠹺𢳂𧨾𠱸𡁵𥄫":
+            with self.subTest(codepoint=codepoint):
+                self.assertTrue(script_detector.classify_script(f"{codepoint} gaa3").has_han)
+                self.assertTrue(script_detector.contains_chinese(f"a{codepoint}"))
+
+    def test_every_ideograph(self):
+        for codepoint in range(0x3000, 0x32400):
+            name = unicodedata.name(chr(codepoint), "")
+            if name.startswith(("CJK UNIFIED IDEOGRAPH", "CJK COMPATIBILITY IDEOGRAPH")):
+                self.assertTrue(script_detector.contains_chinese(chr(codepoint)), name)
+
+    def test_not_han(self):
+        for codepoint in "a。䷿ꀀ가ア〇⺀":
+            with self.subTest(codepoint=codepoint):
+                self.assertFalse(script_detector.contains_chinese(codepoint))
@@ -0,0 +1,166 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+from unittest import TestCase
+
+from .. import build, sitemap
+
+NAMESPACE = {"sitemap": sitemap.SITEMAP_NAMESPACE}
+
+
+def read_sitemap(path):
+    with gzip.open(path) as sitemap_file:
+        root = ET.parse(sitemap_file).getroot()
+    return [
+        (url.findtext("sitemap:loc", namespaces=NAMESPACE), url.findtext("sitemap:lastmod", namespaces=NAMESPACE))
+        for url in root.iterfind("sitemap:url", NAMESPACE)
+    ]
+
+
+class TestWriteSitemaps(TestCase):
+    URLS = [(f"https://www.example.com/entree/{i}?a=1&b=2", f"2024-01-{i + 1:02}") for i in range(25)]
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def read(self, sitemaps):
+        return [read_sitemap(os.path.join(self.folder.name, name)) for name, _ in sitemaps]
+
+    def test_single_file(self):
+        sitemaps = sitemap.write_sitemaps(self.folder.name, iter(self.URLS))
+        self.assertEqual(sitemaps, [("sitemap0.xml.gz", "2024-01-25")])
+        self.assertEqual(self.read(sitemaps), [self.URLS])
+
+    def test_max_urls(self):
+        sitemaps = sitemap.write_sitemaps(self.folder.name, iter(self.URLS), max_urls=10)
+        self.assertEqual(
+            sitemaps,
+            [
+                ("sitemap0.xml.gz", "2024-01-10"),
+                ("sitemap1.xml.gz", "2024-01-20"),
+                ("sitemap2.xml.gz", "2024-01-25"),
+            ],
+        )
+        self.assertEqual(self.read(sitemaps), [self.URLS[:10], self.URLS[10:20], self.URLS[20:]])
+
+    def test_max_bytes(self):
+        max_bytes = 2048
+        sitemaps = sitemap.write_sitemaps(self.folder.name, iter(self.URLS), max_bytes=max_bytes)
+        self.assertGreater(len(sitemaps), 1)
+        self.assertEqual(sum(self.read(sitemaps), []), self.URLS)
+        for name, _ in sitemaps:
+            with gzip.open(os.path.join(self.folder.name, name)) as sitemap_file:
+                self.assertLessEqual(len(sitemap_file.read()), max_bytes)
+
+    def test_url_larger_than_max_bytes(self):
+        sitemaps = sitemap.write_sitemaps(self.folder.name, iter(self.URLS[:2]), max_bytes=1)
+        self.assertEqual(self.read(sitemaps), [self.URLS[:1], self.URLS[1:2]])
+
+    def test_no_urls(self):
+        self.assertEqual(sitemap.write_sitemaps(self.folder.name, iter([])), [])
+        self.assertEqual(os.listdir(self.folder.name), [])
+
+
+class TestBuildSitemaps(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.folder.name, "dict.db")
+        self.tracking_path = os.path.join(self.folder.name, "sitemap_lastmod.db")
+        self.static_folder = os.path.join(self.folder.name, "static")
+
+        db = sqlite3.connect(self.db_path)
+        db.execute("CREATE TABLE entries(entry_id INTEGER PRIMARY KEY, traditional TEXT)")
+        db.executemany(
+            "INSERT INTO entries(traditional) VALUES (?)", [("好",), ("我哋",), ("好",), ("飲茶",)]
+        )
+        db.execute(
+            f"CREATE TABLE {build.ENTRY_PAGES_TABLE}(traditional TEXT PRIMARY KEY, entries TEXT, examples TEXT) WITHOUT ROWID"
+        )
+        db.executemany(
+            f"INSERT INTO {build.ENTRY_PAGES_TABLE} VALUES (?, ?, ?)",
+            [("好", "[1, 3]", "[]"), ("我哋", "[2]", "[]"), ("飲茶", "[4]", "[]")],
+        )
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def build(self, today):
+        return sitemap.build_sitemaps(
+            self.db_path,
+            self.tracking_path,
+            self.static_folder,
+            "https://www.example.com",
+            "/dictionnaire/entree",
+            today=today,
+        )
+
+    def lastmods(self):
+        return {
+            loc.rsplit("/", 1)[1]: lastmod
+            for loc, lastmod in read_sitemap(os.path.join(self.static_folder, "sitemap", "sitemap0.xml.gz"))
+        }
+
+    def test_build(self):
+        self.assertEqual(self.build("2024-01-01"), ["https://www.example.com/sitemap0.xml.gz"])
+        self.assertEqual(
+            read_sitemap(os.path.join(self.static_folder, "sitemap", "sitemap0.xml.gz")),
+            [
+                ("https://www.example.com/dictionnaire/entree/%E5%A5%BD", "2024-01-01"),
+                ("https://www.example.com/dictionnaire/entree/%E6%88%91%E5%93%8B", "2024-01-01"),
+                ("https://www.example.com/dictionnaire/entree/%E9%A3%B2%E8%8C%B6", "2024-01-01"),
+            ],
+        )
+
+        index = ET.parse(os.path.join(self.static_folder, "sitemap", "sitemap_index.xml")).getroot()
+        self.assertEqual(
+            [
+                (elem.findtext("sitemap:loc", namespaces=NAMESPACE), elem.findtext("sitemap:lastmod", namespaces=NAMESPACE))
+                for elem in index.iterfind("sitemap:sitemap", NAMESPACE)
+            ],
+            [("https://www.example.com/sitemap0.xml.gz", "2024-01-01")],
+        )
+
+        with open(os.path.join(self.static_folder, "robots", "robots.txt")) as robots:
+            self.assertEqual(robots.read(), "Sitemap: https://www.example.com/sitemap0.xml.gz\n")
+
+    def test_lastmod_of_changed_entries(self):
+        self.build("2024-01-01")
+
+        db = sqlite3.connect(self.db_path)
+        db.execute(f"UPDATE {build.ENTRY_PAGES_TABLE} SET examples = '[7]' WHERE traditional = '好'")
+        db.execute("INSERT INTO entries(traditional) VALUES ('點心')")
+        db.execute(f"INSERT INTO {build.ENTRY_PAGES_TABLE} VALUES ('點心', '[5]', '[]')")
+        db.commit()
+        db.close()
+
+        self.build("2024-02-01")
+        self.assertEqual(
+            self.lastmods(),
+            {
+                "%E5%A5%BD": "2024-02-01",
+                "%E6%88%91%E5%93%8B": "2024-01-01",
+                "%E9%A3%B2%E8%8C%B6": "2024-01-01",
+                "%E9%BB%9E%E5%BF%83": "2024-02-01",
+            },
+        )
+
+        self.build("2024-03-01")
+        self.assertEqual(set(self.lastmods().values()), {"2024-01-01", "2024-02-01"})
+
+    def test_stale_sitemaps_removed(self):
+        sitemap_folder = os.path.join(self.static_folder, "sitemap")
+        os.makedirs(sitemap_folder)
+        for name in ("sitemap0.xml", "sitemap5.xml.gz", "sitemap.xsl"):
+            open(os.path.join(sitemap_folder, name), "w").close()
+
+        self.build("2024-01-01")
+        self.assertEqual(
+            sorted(os.listdir(sitemap_folder)), ["sitemap.xsl", "sitemap0.xml.gz", "sitemap_index.xml"]
+        )
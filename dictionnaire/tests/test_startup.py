@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+# Share of the time taken to import the views that the modules of the
+# package may spend running, the rest going to the libraries they import.
+# Being relative, it holds on slower machines.
+IMPORT_TIME_SHARE = 0.35
+
+# Cached getters building the romanization tables and the sets of
+# characters, which must not be called while a worker imports the views
+TABLE_GETTERS = {
+    "cantonese_utils": (
+        "get_jyutping_syllables",
+        "get_jyutping_to_yale",
+        "get_jyutping_to_IPA",
+    ),
+    "mandarin_utils": (
+        "get_pinyin_syllables",
+        "get_pinyin_to_pretty",
+        "get_pinyin_to_zhuyin",
+        "get_pinyin_to_IPA",
+    ),
+    "script_detector": (
+        "get_simplified_only_codepoints",
+        "get_traditional_only_codepoints",
+    ),
+}
+
+
+def run_python(*args):
+    # The views are imported in a new interpreter, so that modules already
+    # imported and tables already built by other tests do not count
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    env.setdefault("CANTONAIS_ORG_DB_PATH", os.devnull)
+    return subprocess.run(
+        [sys.executable, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+class TestStartup(TestCase):
+    def test_import_time(self):
+        package = __package__.rpartition(".")[0]
+        res = run_python("-X", "importtime", "-c", f"import {package}.views")
+
+        # Each line reads "import time: <self> | <cumulative> | <module>"
+        self_times = {}
+        for line in res.stderr.splitlines():
+            self_time, _, module = line.removeprefix("import time:").split("|")
+            if self_time.strip().isdigit():
+                self_times[module.strip()] = int(self_time)
+
+        self.assertIn(f"{package}.views", self_times)
+        package_times = {
+            module: self_time
+            for module, self_time in self_times.items()
+            if module.startswith(package)
+        }
+        self.assertLessEqual(
+            sum(package_times.values()),
+            IMPORT_TIME_SHARE * sum(self_times.values()),
+            package_times,
+        )
+
+    def test_tables_not_built_on_import(self):
+        package = __package__.rpartition(".")[0]
+        script = f"""
+import json
+import {package}.views
+from {package}.utils import cantonese_utils, mandarin_utils, script_detector
+
+getters = {TABLE_GETTERS!r}
+print(json.dumps({{
+    f"{{module}}.{{name}}": getattr(globals()[module], name).cache_info().currsize
+    for module, names in getters.items()
+    for name in names
+}}))
+"""
+        res = run_python("-c", script)
+
+        built = json.loads(res.stdout.splitlines()[-1])
+        self.assertEqual(len(built), sum(map(len, TABLE_GETTERS.values())))
+        self.assertEqual({name: size for name, size in built.items() if size}, {})
@@ -1,7 +1,9 @@
-from flask import Blueprint, make_response, request, redirect, url_for
+from flask import Blueprint, current_app, g, make_response, request, redirect, url_for
 from flask_babel import _
-from . import views
+from . import bench, build, queries, views
 
+import click
+import sqlite3
 import urllib.parse
 
 dictionary_app = Blueprint(
@@ -13,6 +15,61 @@ dictionary_app = Blueprint(
 )
 
 
+@dictionary_app.cli.command("build-indexes")
+@click.option("--source", type=click.Path(exists=True, dir_okay=False),
+              help="Dictionary to index. Defaults to the one being served.")
+@click.option("--destination", type=click.Path(dir_okay=False),
+              help="Where the indexed dictionary is written. Defaults to the source.")
+def build_indexes(source, destination):
+    """Adds the lookup tables used to speed up searches to a copy of the
+    dictionary, then swaps it in."""
+    source = source or current_app.config["DB_PATH"]
+    build.build_indexes(source, destination)
+
+
+@dictionary_app.cli.command("check-entry-pages")
+@click.option("--sample", type=int, help="Number of randomly chosen headwords to check.")
+def check_entry_pages(sample):
+    """Compares the entry pages built offline with the live queries."""
+    db = sqlite3.connect(current_app.config["DB_PATH"])
+    try:
+        mismatches = build.check_entry_pages(db, sample)
+    finally:
+        db.close()
+
+    for headword in mismatches:
+        click.echo(f"Stale entry page: {headword}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+for command in bench.COMMANDS:
+    dictionary_app.cli.add_command(command)
+
+
+@dictionary_app.before_request
+def reset_timings():
+    queries.pop_timings()
+
+
+@dictionary_app.after_request
+def add_server_timing(resp):
+    # Durations of the search phases, as shown in browser developer tools
+    timings = queries.pop_timings()
+    if timings:
+        resp.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={duration:.1f}" for name, duration in timings
+        )
+
+    # Counters of the query cache of the worker that served the request
+    if current_app.debug:
+        resp.headers["X-Query-Cache"] = ", ".join(
+            f"{name}={value}" for name, value in queries.query_cache.stats().items()
+        )
+
+    return resp
+
+
 def redirect_post():
     if "search_term" in request.form:
         search_term = request.form["search_term"]
@@ -51,11 +108,13 @@ def search_auto(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_auto(search_term))
+    resp = make_response(views.render_search_auto(search_term, cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("auto"))
+    resp.headers["X-Search-Interpretation"] = g.search_interpretation
 
     return resp
 
@@ -67,8 +126,9 @@ def search_traditional(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_traditional(search_term))
+    resp = make_response(views.render_search_traditional(search_term, cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("traditionnel"))
@@ -83,8 +143,9 @@ def search_simplified(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_simplified(search_term))
+    resp = make_response(views.render_search_simplified(search_term, cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("simplifie"))
@@ -99,8 +160,9 @@ def search_jyutping(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_jyutping(search_term, fuzzy=False))
+    resp = make_response(views.render_search_jyutping(search_term, fuzzy=False, cursor=cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("jyutping"))
@@ -119,8 +181,9 @@ def search_fuzzy_jyutping(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_jyutping(search_term, fuzzy=True))
+    resp = make_response(views.render_search_jyutping(search_term, fuzzy=True, cursor=cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("jyutping-approximatif"))
@@ -135,8 +198,9 @@ def search_pinyin(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_pinyin(search_term, fuzzy=False))
+    resp = make_response(views.render_search_pinyin(search_term, fuzzy=False, cursor=cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("pinyin"))
@@ -154,8 +218,9 @@ def search_fuzzy_pinyin(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_pinyin(search_term, fuzzy=True))
+    resp = make_response(views.render_search_pinyin(search_term, fuzzy=True, cursor=cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("pinyin-approximatif"))
@@ -170,8 +235,9 @@ def search_french(search_term):
         return redirect_post()
 
     search_term = urllib.parse.unquote(search_term)
+    cursor = request.args.get(_("curseur"))
 
-    resp = make_response(views.render_search_french(search_term))
+    resp = make_response(views.render_search_french(search_term, cursor))
 
     resp.set_cookie("search_term", search_term)
     resp.set_cookie("search_type", _("fr"))
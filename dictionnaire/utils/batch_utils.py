@@ -0,0 +1,82 @@
+from collections.abc import Callable, Hashable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+
+def map_distinct(
+    func: Callable[[Hashable], Any],
+    items: Iterable[Hashable],
+    processes: int | None = None,
+) -> dict[Hashable, Any]:
+    """Applies a function once to each distinct item of a batch.
+
+    Args:
+        func (Callable[[Hashable], Any]): Function to apply. It must be
+            picklable (e.g. a module-level function, or a functools.partial
+            of one) when processes is set.
+        items (Iterable[Hashable]): Items of the batch, possibly repeated
+        processes (int | None, optional): Number of worker processes the
+            distinct items are spread over. Only worth it for hundreds of
+            thousands of items. Defaults to None, to apply the function in
+            the current process.
+
+    Returns:
+        dict[Hashable, Any]: Result of the function for each distinct item
+    """
+    distinct = list(dict.fromkeys(items))
+
+    if processes and processes > 1 and len(distinct) > 1:
+        # Large chunks keep the cost of sending items to the workers low,
+        # while still giving each worker a few chunks to balance the load
+        chunksize = max(1, len(distinct) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = executor.map(func, distinct, chunksize=chunksize)
+            return dict(zip(distinct, results))
+
+    return {item: func(item) for item in distinct}
+
+
+def batch_map(
+    func: Callable[[Hashable], Any],
+    items: Iterable[Hashable],
+    processes: int | None = None,
+) -> list:
+    """Applies a function to every item of a batch, computing the result
+    only once for repeated items. Repeated items therefore share the same
+    result object.
+
+    Args:
+        func (Callable[[Hashable], Any]): Function to apply, see map_distinct
+        items (Iterable[Hashable]): Items of the batch
+        processes (int | None, optional): Number of worker processes, see
+            map_distinct. Defaults to None.
+
+    Returns:
+        list: Result of the function for each item, in order
+    """
+    items = list(items)
+    results = map_distinct(func, items, processes)
+    return [results[item] for item in items]
+
+
+class SyllableCache(dict):
+    """Conversions of the syllables met while converting a batch, so that
+    every distinct syllable is converted once for the whole batch, including
+    the tokens that go through the conversion rules rather than the table.
+    """
+
+    def __init__(self, table: dict[str, Any], convert: Callable[[str], Any]):
+        """
+        Args:
+            table (dict[str, Any]): Conversions of the syllables in the
+                inventory
+            convert (Callable[[str], Any]): Conversion rules, applied to the
+                syllables that are not in the table
+        """
+        super().__init__()
+        self.table = table
+        self.convert = convert
+
+    def __missing__(self, syllable: str) -> Any:
+        converted = self[syllable] = self.table.get(syllable) or self.convert(syllable)
+        return converted
@@ -0,0 +1,203 @@
+import functools
+import inspect
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+def file_version(path: str, interval: float = 0.0) -> Callable[[], Hashable]:
+    """Creates a function that returns a stamp identifying the current
+    version of a file, which changes whenever the file is replaced or
+    modified.
+
+    Args:
+        path (str): Path to the file
+        interval (float, optional): Number of seconds during which the last
+            stamp is returned rather than checking the file again. Defaults
+            to 0.0, to check the file on every call.
+
+    Returns:
+        Callable[[], Hashable]: Function returning the version stamp, or
+            None if the file does not exist
+    """
+    # Stamp, and time after which the file must be checked again
+    last = [None, float("-inf")]
+
+    def version() -> Hashable:
+        now = time.monotonic()
+        if now < last[1]:
+            return last[0]
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stamp = None
+        else:
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        last[:] = stamp, now + interval
+        return stamp
+
+    return version
+
+
+class QueryCache:
+    """Bounded cache of query results, evicting the least recently used
+    result when full.
+
+    Every result is stored along with the version of the data it was
+    computed from; all results are dropped as soon as that version changes.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float | None = None,
+        version: Callable[[], Hashable] | None = None,
+    ):
+        """
+        Args:
+            maxsize (int): Maximum number of results kept. A size of 0
+                disables caching.
+            ttl (float | None, optional): Number of seconds after which a
+                result expires. Defaults to None, for results that never
+                expire.
+            version (Callable[[], Hashable] | None, optional): Function
+                returning the current version of the data. Defaults to None,
+                for data that never changes.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+
+        self._results = OrderedDict()
+        self._current_version = version() if version else None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self) -> None:
+        if not self.version:
+            return
+
+        version = self.version()
+        if version != self._current_version:
+            self._results.clear()
+            self._current_version = version
+            self.invalidations += 1
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Returns the cached result for a key, computing and storing it if
+        there is none.
+
+        Args:
+            key (Hashable): Key identifying the query and its parameters
+            compute (Callable[[], Any]): Function computing the result
+
+        Returns:
+            Any: The result
+        """
+        if self.maxsize <= 0:
+            return compute()
+
+        with self._lock:
+            self._check_version()
+            version = self._current_version
+
+            if key in self._results:
+                result, expiry = self._results[key]
+                if expiry is None or expiry > time.monotonic():
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                    return result
+
+                del self._results[key]
+                self.expirations += 1
+
+            self.misses += 1
+
+        # Run the query outside of the lock, so that other threads are not
+        # held up by it
+        result = compute()
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+
+        with self._lock:
+            # Discard the result if the data changed while it was computed
+            if version == self._current_version:
+                self._results[key] = (result, expiry)
+                self._results.move_to_end(key)
+                while len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+                    self.evictions += 1
+
+        return result
+
+    def clear(self) -> None:
+        """Removes every result from the cache."""
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Returns the counters of the cache.
+
+        Returns:
+            dict[str, int]: Number of results currently stored, and number
+                of hits, misses, evictions, expirations and invalidations
+                since the cache was created
+        """
+        with self._lock:
+            return {
+                "size": len(self._results),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def cached(
+        self, normalize: Callable[..., Hashable] | None = None
+    ) -> Callable[[Callable], Callable]:
+        """Decorator caching the results of a query function, keyed by the
+        name of the function and its arguments.
+
+        Args:
+            normalize (Callable[..., Hashable] | None, optional): Function
+                taking the leading arguments of the query function (e.g. the
+                search term and whether it is fuzzy), returning the
+                normalized form of its first argument, so that search terms
+                that lead to the same bind value share a result. Defaults to
+                None, which uses the first argument as is.
+
+        Returns:
+            Callable[[Callable], Callable]: The decorator
+        """
+
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+            if normalize:
+                normalize_arity = len(inspect.signature(normalize).parameters)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                arguments = signature.bind(*args, **kwargs)
+                arguments.apply_defaults()
+                values = list(arguments.arguments.values())
+                if normalize:
+                    values[0] = normalize(*values[:normalize_arity])
+
+                return self.get(
+                    (func.__name__, *values), lambda: func(*args, **kwargs)
+                )
+
+            return wrapper
+
+        return decorator
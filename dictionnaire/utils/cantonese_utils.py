@@ -1,5 +1,10 @@
+import functools
 import re
 
+from collections.abc import Callable, Iterable
+
+from . import batch_utils
+
 SPECIAL_CHARACTERS = (
     ".",  "。", ",",  "，", "！", "？", "%",  "－", "…",  "⋯",
     ".",  "·",  "\"", "“",  "”",  "$",  "｜", "：", "１", "２",
@@ -220,6 +225,214 @@ def extract_jyutping_tones(jyutping: str) -> list[int]:
     return res
 
 
+def convert_yale_initial(syllable: str) -> str:
+    for expr, repl in YALE_INITIAL_REGEX:
+        # Special initials need to be replaced
+        if expr.match(syllable):
+            return repl
+
+    for initial_len in range(2, 0, -1):
+        # Normal initials can just be matched to the predefined list
+        # of initials
+        curr_string = syllable[:initial_len]
+        if curr_string in JYUTPING_INITIALS:
+            return curr_string
+
+    return ""
+
+
+def convert_yale_final(syllable: str) -> str:
+    expr_result = YALE_FINAL_REGEX.search(syllable)
+    if not expr_result:
+        return syllable
+
+    final = expr_result.group(1)
+    tone = int(expr_result.group(2))
+
+    if final in YALE_SPECIAL_FINALS:
+        # Some syllables have significant differences compared to Yale
+        # Switch them out here
+        final = YALE_SPECIAL_FINALS[final]
+
+    if tone in (4, 5, 6):
+        # Insert an "h" before the last consonant cluster for light tones
+        # as they are indicated in Yale
+        final = YALE_LIGHT_TONE_REGEX.sub(r"h\1", final + str(tone))
+
+    # Find first vowel and convert it to display the tone
+    for vowel in ("a", "e", "i", "o", "u"):
+        vowel_idx = final.find(vowel)
+        if vowel_idx != -1:
+            final = (
+                f"{final[:vowel_idx]}"
+                f"{YALE_VOWEL_REPLACEMENTS[vowel][tone - 1]}"
+                f"{final[vowel_idx + 1:]}"
+            )
+            break
+
+    return final
+
+
+def convert_yale_syllable(syllable: str) -> str:
+    """Converts a single Jyutping syllable to Yale, by applying the
+    conversion rules. Use get_jyutping_to_yale for syllables in the Jyutping
+    inventory.
+
+    Args:
+        syllable (str): Jyutping syllable, or any other token
+
+    Returns:
+        str: The Yale syllable, or the token unchanged if it is not Jyutping
+    """
+    if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
+        # Most numbers, single characters, etc are not Jyutping
+        return syllable
+
+    # If there is no tone, the syllable cannot be converted to Yale
+    tone = -1
+    for jyutping_tone in JYUTPING_TONES:
+        if syllable.find(str(jyutping_tone)) != -1:
+            tone = jyutping_tone
+            break
+    if tone == -1:
+        return syllable
+
+    syllable_without_tone = syllable[:-1]
+    if syllable_without_tone in YALE_SPECIAL_SYLLABLES:
+        # If the Jyutping matches a special syllable, use the corresponding
+        # item from the predefined dictionary
+        return YALE_SPECIAL_SYLLABLES[syllable_without_tone][tone - 1]
+
+    yale_initial = convert_yale_initial(syllable)
+    yale_final = convert_yale_final(syllable)
+    return f"{yale_initial}{yale_final}"
+
+
+def convert_IPA_components(syllable: str) -> str:
+    initial = ""
+    nucleus = ""
+    coda = ""
+    tone = ""
+
+    match = CANTONESE_IPA_REGEX.match(syllable)
+    if not match:
+        return syllable
+
+    if match.group(1):
+        if match.group(1) in CANTONESE_IPA_INITIALS:
+            initial = CANTONESE_IPA_INITIALS[match.group(1)]
+        else:
+            initial = match.group(1)
+
+    if match.group(2):
+        if match.group(2) in CANTONESE_IPA_NUCLEI:
+            nucleus = CANTONESE_IPA_NUCLEI[match.group(2)]
+        else:
+            nucleus = match[2]
+
+    if match.group(3):
+        if match.group(3) in CANTONESE_IPA_CODAS:
+            coda = CANTONESE_IPA_CODAS[match.group(3)]
+        else:
+            coda = match.group(3)
+
+    if match.group(4):
+        tone = CANTONESE_IPA_TONES[int(match.group(4)) - 1]
+
+    return f"{initial}{nucleus}{coda}{tone}"
+
+
+def convert_IPA_syllable(syllable: str) -> str:
+    """Converts a single Jyutping syllable to Cantonese Sinological IPA, by
+    applying the conversion rules. Use get_jyutping_to_IPA for syllables in the
+    Jyutping inventory.
+
+    Args:
+        syllable (str): Jyutping syllable, or any other token
+
+    Returns:
+        str: The IPA syllable, or the token unchanged if it is not Jyutping
+    """
+    if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
+        # Most numbers, single characters, etc are not Jyutping
+        return syllable
+
+    # If there is no tone, the syllable cannot be converted to IPA
+    tone = -1
+    for jyutping_tone in JYUTPING_TONES:
+        if syllable.find(str(jyutping_tone)) != -1:
+            tone = jyutping_tone
+            break
+    if tone == -1:
+        return syllable
+
+    # Do some pre-processing for initials
+    for pattern, repl in CANTONESE_IPA_PREPROCESS_INITIAL_REGEX.items():
+        syllable = pattern.sub(repl, syllable)
+
+    # Convert special syllables
+    match = CANTONESE_IPA_SPECIAL_SYLLABLE_REGEX.match(syllable)
+    if match:
+        syllable = syllable.replace("m", "m̩")
+        syllable = syllable.replace("ng", "ŋ̍")
+        syllable = CANTONESE_IPA_TONE_REGEX.sub(
+            CANTONESE_IPA_TONES[tone - 1], syllable
+        )
+
+    # Replace checked tones
+    match = CANTONESE_IPA_CHECKED_TONES_REGEX.search(syllable)
+    if match:
+        syllable = syllable.replace("1", "7")
+        syllable = syllable.replace("3", "8")
+        syllable = syllable.replace("6", "9")
+
+    # More preprocessing
+    for spec, repl in CANTONESE_IPA_SPECIAL_FINALS.items():
+        syllable = syllable.replace(spec, repl)
+
+    return convert_IPA_components(syllable)
+
+
+# Every toned syllable that can be written in Jyutping (including ones that
+# do not occur in Cantonese), mapped to its Yale and IPA forms, so that
+# conversions are a single lookup per syllable. Tokens that are not in the
+# inventory go through the conversion rules instead.
+# The inventory and tables are built the first time they are used rather
+# than on import, as building them takes a good part of the startup time of
+# a worker.
+@functools.cache
+def get_jyutping_syllables() -> tuple[str, ...]:
+    return tuple(
+        f"{initial}{final}{tone}"
+        for initial in ("", *dict.fromkeys(JYUTPING_INITIALS))
+        for final in JYUTPING_FINALS
+        for tone in JYUTPING_TONES
+    )
+
+
+@functools.cache
+def get_jyutping_to_yale() -> dict[str, str]:
+    return {syllable: convert_yale_syllable(syllable) for syllable in get_jyutping_syllables()}
+
+
+@functools.cache
+def get_jyutping_to_IPA() -> dict[str, str]:
+    return {syllable: convert_IPA_syllable(syllable) for syllable in get_jyutping_syllables()}
+
+
+SPACE_SPECIAL_CHARACTERS = str.maketrans({c: f" {c} " for c in SPECIAL_CHARACTERS})
+
+
+def split_jyutping(jyutping: str, use_spaces_to_segment: bool) -> list[str]:
+    if use_spaces_to_segment:
+        return jyutping.translate(SPACE_SPECIAL_CHARACTERS).split()
+
+    _, syllables = segment_jyutping(
+        jyutping, remove_special_characters=False, remove_glob_characters=False
+    )
+    return syllables
+
+
 def jyutping_to_yale(jyutping: str, use_spaces_to_segment: bool = False) -> str:
     """Converts Jyutping romanization to Yale romanization.
     Note that the majority of this function and the convertToIPA function
@@ -237,96 +450,14 @@ def jyutping_to_yale(jyutping: str, use_spaces_to_segment: bool = False) -> str:
     Returns:
         str: String of Yale syllables
     """
-
-    def convert_yale_initial(syllable: str) -> str:
-        for expr, repl in YALE_INITIAL_REGEX:
-            # Special initials need to be replaced
-            if expr.match(syllable):
-                return repl
-
-        for initial_len in range(2, 0, -1):
-            # Normal initials can just be matched to the predefined list
-            # of initials
-            curr_string = syllable[:initial_len]
-            if curr_string in JYUTPING_INITIALS:
-                return curr_string
-
-        return ""
-
-    def convert_yale_final(syllable: str) -> str:
-        expr_result = YALE_FINAL_REGEX.search(syllable)
-        if not expr_result:
-            return syllable
-
-        final = expr_result.group(1)
-        tone = int(expr_result.group(2))
-
-        if final in YALE_SPECIAL_FINALS:
-            # Some syllables have significant differences compared to Yale
-            # Switch them out here
-            final = YALE_SPECIAL_FINALS[final]
-
-        if tone in (4, 5, 6):
-            # Insert an "h" before the last consonant cluster for light tones
-            # as they are indicated in Yale
-            final = YALE_LIGHT_TONE_REGEX.sub(r"h\1", final + str(tone))
-
-        # Find first vowel and convert it to display the tone
-        for vowel in ("a", "e", "i", "o", "u"):
-            vowel_idx = final.find(vowel)
-            if vowel_idx != -1:
-                final = (
-                    f"{final[:vowel_idx]}"
-                    f"{YALE_VOWEL_REPLACEMENTS[vowel][tone - 1]}"
-                    f"{final[vowel_idx + 1:]}"
-                )
-                break
-
-        return final
-
-    res = []
-
     if not jyutping:
         return jyutping
 
-    if use_spaces_to_segment:
-        new_jyutping = ""
-        for c in jyutping:
-            new_jyutping += f" {c} " if c in SPECIAL_CHARACTERS else c
-        syllables = new_jyutping.split()
-    else:
-        _, syllables = segment_jyutping(
-            jyutping, remove_special_characters=False, remove_glob_characters=False
-        )
-
-    for syllable in syllables:
-        if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
-            # Most numbers, single characters, etc are not Jyutping
-            res.append(syllable)
-            continue
-
-        # If there is no tone, the syllable cannot be converted to Yale
-        tone = -1
-        for jyutping_tone in JYUTPING_TONES:
-            if syllable.find(str(jyutping_tone)) != -1:
-                tone = jyutping_tone
-                break
-        if tone == -1:
-            res.append(syllable)
-            continue
-
-        syllable_without_tone = syllable[:-1]
-        if syllable_without_tone in YALE_SPECIAL_SYLLABLES:
-            # If the Jyutping matches a special syllable, use the corresponding
-            # item from the predefined dictionary
-            res.append(YALE_SPECIAL_SYLLABLES[syllable_without_tone][tone - 1])
-            continue
-
-        yale_initial = convert_yale_initial(syllable)
-        yale_final = convert_yale_final(syllable)
-        res.append(f"{yale_initial}{yale_final}")
-
-    return " ".join(res)
+    yale = get_jyutping_to_yale()
+    return " ".join(
+        yale.get(syllable) or convert_yale_syllable(syllable)
+        for syllable in split_jyutping(jyutping, use_spaces_to_segment)
+    )
 
 
 def jyutping_to_IPA(jyutping: str, use_spaces_to_segment: bool = False) -> str:
@@ -343,95 +474,11 @@ def jyutping_to_IPA(jyutping: str, use_spaces_to_segment: bool = False) -> str:
     Returns:
         str: String of Cantonese Sinological IPA syllables
     """
-
-    def convert_ipa_syllable(syllable):
-        initial = ""
-        nucleus = ""
-        coda = ""
-        tone = ""
-
-        match = CANTONESE_IPA_REGEX.match(syllable)
-        if not match:
-            return syllable
-
-        if match.group(1):
-            if match.group(1) in CANTONESE_IPA_INITIALS:
-                initial = CANTONESE_IPA_INITIALS[match.group(1)]
-            else:
-                initial = match.group(1)
-
-        if match.group(2):
-            if match.group(2) in CANTONESE_IPA_NUCLEI:
-                nucleus = CANTONESE_IPA_NUCLEI[match.group(2)]
-            else:
-                nucleus = match[2]
-
-        if match.group(3):
-            if match.group(3) in CANTONESE_IPA_CODAS:
-                coda = CANTONESE_IPA_CODAS[match.group(3)]
-            else:
-                coda = match.group(3)
-
-        if match.group(4):
-            tone = CANTONESE_IPA_TONES[int(match.group(4)) - 1]
-
-        return f"{initial}{nucleus}{coda}{tone}"
-
-    res = []
-
-    if use_spaces_to_segment:
-        new_jyutping = ""
-        for c in jyutping:
-            new_jyutping += f" {c} " if c in SPECIAL_CHARACTERS else c
-        syllables = new_jyutping.split()
-    else:
-        _, syllables = segment_jyutping(
-            jyutping, remove_special_characters=False, remove_glob_characters=False
-        )
-
-    for syllable in syllables:
-        if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
-            # Most numbers, single characters, etc are not Jyutping
-            res.append(syllable)
-            continue
-
-        # If there is no tone, the syllable cannot be converted to IPA
-        tone = -1
-        for jyutping_tone in JYUTPING_TONES:
-            if syllable.find(str(jyutping_tone)) != -1:
-                tone = jyutping_tone
-                break
-        if tone == -1:
-            res.append(syllable)
-            continue
-
-        # Do some pre-processing for initials
-        for pattern, repl in CANTONESE_IPA_PREPROCESS_INITIAL_REGEX.items():
-            syllable = pattern.sub(repl, syllable)
-
-        # Convert special syllables
-        match = CANTONESE_IPA_SPECIAL_SYLLABLE_REGEX.match(syllable)
-        if match:
-            syllable = syllable.replace("m", "m̩")
-            syllable = syllable.replace("ng", "ŋ̍")
-            syllable = CANTONESE_IPA_TONE_REGEX.sub(
-                CANTONESE_IPA_TONES[tone - 1], syllable
-            )
-
-        # Replace checked tones
-        match = CANTONESE_IPA_CHECKED_TONES_REGEX.search(syllable)
-        if match:
-            syllable = syllable.replace("1", "7")
-            syllable = syllable.replace("3", "8")
-            syllable = syllable.replace("6", "9")
-
-        # More preprocessing
-        for spec, repl in CANTONESE_IPA_SPECIAL_FINALS.items():
-            syllable = syllable.replace(spec, repl)
-
-        res.append(convert_ipa_syllable(syllable))
-
-    return " ".join(res)
+    ipa = get_jyutping_to_IPA()
+    return " ".join(
+        ipa.get(syllable) or convert_IPA_syllable(syllable)
+        for syllable in split_jyutping(jyutping, use_spaces_to_segment)
+    )
 
 
 def unfold_jyutping_regex(jyutping: str) -> tuple[bool, list[str]]:
@@ -489,12 +536,535 @@ def unfold_jyutping_regex(jyutping: str) -> tuple[bool, list[str]]:
     return True, res
 
 
+# Kinds of Jyutping component, as flags
+JYUTPING_INITIAL = 1
+JYUTPING_FINAL = 2
+
+
+def build_component_trie() -> tuple[list[dict[str, int]], list[int]]:
+    """Builds a trie over the Jyutping initials and finals.
+
+    Returns:
+        tuple[list[dict[str, int]], list[int]]: For each node (the root
+            being node 0), the node reached by each character, and the kinds
+            of component spelled by the path to that node
+    """
+    edges, kinds = [{}], [0]
+    for kind, components in (
+        (JYUTPING_INITIAL, JYUTPING_INITIALS),
+        (JYUTPING_FINAL, JYUTPING_FINALS),
+    ):
+        for component in components:
+            node = 0
+            for c in component:
+                if c not in edges[node]:
+                    edges[node][c] = len(edges)
+                    edges.append({})
+                    kinds.append(0)
+                node = edges[node][c]
+            kinds[node] |= kind
+
+    return edges, kinds
+
+
+JYUTPING_COMPONENT_EDGES, JYUTPING_COMPONENT_KINDS = build_component_trie()
+
+
+def advance_components(nodes: set[int], c: str) -> set[int]:
+    return {
+        JYUTPING_COMPONENT_EDGES[node][c]
+        for node in nodes
+        if c in JYUTPING_COMPONENT_EDGES[node]
+    }
+
+
+def get_component_kinds(nodes: set[int]) -> int:
+    kinds = 0
+    for node in nodes:
+        kinds |= JYUTPING_COMPONENT_KINDS[node]
+    return kinds
+
+
+def get_unfolded_component_kinds(jyutping: str) -> int:
+    _, strings_to_search = unfold_jyutping_regex(jyutping)
+
+    kinds = 0
+    for s in strings_to_search:
+        nodes = {0}
+        for c in s:
+            nodes = advance_components(nodes, c)
+        kinds |= get_component_kinds(nodes)
+    return kinds
+
+
+def match_jyutping_components(jyutping: str, start: int, end: int) -> list[int]:
+    """Finds the kinds of Jyutping component that every substring starting
+    at an index can be, in a single pass through the component trie.
+
+    The regex terms written by jyutping_autocorrect (one set of alternatives
+    in parentheses, such as "(aa!|eo)", and one character made optional by
+    a "!") are read as they go, by following every possibility through the
+    trie at once. They mean the same as in unfold_jyutping_regex; the few
+    substrings where its result depends on how the alternatives are sliced,
+    such as ")a(" or "(a)|b", are unfolded with it instead.
+
+    Args:
+        jyutping (str): Jyutping, possibly containing regex characters
+        start (int): Index of the first character of the substrings
+        end (int): Index after the last character of the longest substring
+
+    Returns:
+        list[int]: JYUTPING_INITIAL and JYUTPING_FINAL flags of the substrings,
+            indexed by their length minus one. Stops early once no longer
+            substring can be a component.
+    """
+    res = []
+    counts = {"(": 0, ")": 0, "!": 0}
+
+    # Trie nodes after the last character and before it, when the regex
+    # characters are read as they are
+    nodes, previous_nodes = {0}, set()
+    # Same, when the alternatives in parentheses are expanded
+    group_nodes, previous_group_nodes = {0}, set()
+    group_start, alternatives, group_closed = None, [], False
+    has_stray_bar, is_irregular = False, False
+
+    for idx in range(start, end):
+        c = jyutping[idx]
+
+        if c in counts:
+            counts[c] += 1
+            if counts[c] > 1:
+                # Not unfolded by unfold_jyutping_regex, however long
+                break
+
+        if c == "!":
+            nodes = nodes | previous_nodes
+        else:
+            previous_nodes, nodes = nodes, advance_components(nodes, c)
+
+        if is_irregular:
+            pass
+        elif c == "(":
+            if counts[")"] or has_stray_bar:
+                is_irregular = True
+            else:
+                group_start = (group_nodes, previous_group_nodes)
+        elif c == "|":
+            if group_start is None:
+                has_stray_bar = True
+            elif group_closed:
+                is_irregular = True
+            else:
+                alternatives.append((group_nodes, previous_group_nodes))
+                group_nodes, previous_group_nodes = group_start
+        elif c == ")":
+            if group_start is not None:
+                alternatives.append((group_nodes, previous_group_nodes))
+                group_nodes = set().union(*(after for after, _ in alternatives))
+                previous_group_nodes = set().union(
+                    *(before for _, before in alternatives)
+                )
+                group_closed = True
+        elif c == "!":
+            group_nodes = group_nodes | previous_group_nodes
+        else:
+            previous_group_nodes, group_nodes = (
+                group_nodes,
+                advance_components(group_nodes, c),
+            )
+
+        if counts["("] and counts[")"]:
+            if is_irregular:
+                res.append(get_unfolded_component_kinds(jyutping[start:idx + 1]))
+                continue
+            res.append(get_component_kinds(group_nodes))
+        else:
+            res.append(get_component_kinds(nodes))
+
+        if not (
+            nodes or previous_nodes or group_nodes or previous_group_nodes
+            or (group_start and not group_closed
+                and (any(group_start) or any(any(a) for a in alternatives)))
+            # A "|" after the parentheses changes how they are unfolded
+            or (group_closed and jyutping.find("|", idx + 1, end) != -1)
+        ):
+            # Every path through the trie is dead
+            break
+
+    return res
+
+
+# Initials after which jyutping_autocorrect rewrites an ambiguous final: the
+# first cluster is always read as part of the final, the second as a final
+# followed by the initial of the next syllable, and the third as either
+# depending on whether another initial follows
+AUTOCORRECT_EY_CLUSTERS = (
+    # <initial> + "-ei" exists in Jyutping
+    ("p", "f", "d", "n", "l", "h", "w"),
+    # <initial> + "-e j-" exists in Jyutping
+    ("c", "j", "y"),
+    # Both exist in Jyutping
+    ("b", "m", "g", "k", "z", "s"),
+)
+AUTOCORRECT_OH_CLUSTERS = (
+    # <initial> + "-ou" exists in Jyutping
+    ("n", "j"),
+    (),
+    # Both "-ou" and "-o h-" exist in Jyutping
+    ("b", "p", "m", "f", "d", "t", "l", "g", "h", "w", "z", "c", "s"),
+)
+AUTOCORRECT_OW_CLUSTERS = (
+    # <initial> + "-(a)au" exists in Jyutping
+    ("b", "m", "k", "s"),
+    (),
+    # Both "-o w-" and "-(a)au" exist in Jyutping
+    ("p", "m", "f", "d", "t", "n", "l", "g", "h", "z", "c", "s"),
+)
+AUTOCORRECT_UM_CLUSTERS = (
+    # <initial> + "-am" exists in Jyutping
+    ("b", "p", "m", "d", "t", "n", "l", "k", "h", "z", "c", "s"),
+    (),
+    # Both "-am" and "-u m-" exist in Jyutping
+    ("g",),
+)
+
+SYLLABLE_SEPARATORS = (" ", "'")
+
+
+# Number of characters of rewritten text the replacements of rewrite rules
+# read before their match
+REWRITE_CONTEXT_LENGTH = 2
+
+
+def get_preceding_initial(before: str) -> str:
+    # Skips the parenthesis closing a set of alternatives, as in "(k)u"
+    if len(before) >= 2 and before[-1] == ")":
+        return before[-2]
+    return before[-1]
+
+
+def starts_with_initial(text: str, start: int) -> bool:
+    return (
+        text[start:start + 2] in JYUTPING_INITIALS
+        or text[start:start + 1] in JYUTPING_INITIALS
+        or text[start:start + 1] == "y"
+    )
+
+
+def autocorrect_final(
+        clusters: tuple[tuple[str, ...], tuple[str, ...], tuple[str, ...]],
+        final: str,
+        split_final: str,
+        unchanged: str,
+) -> Callable[[str, str, int], str]:
+    """Makes the replacement of a rewrite rule for a final that might also
+    be read as a shorter final followed by an initial, such as "ey".
+
+    Args:
+        clusters (tuple): Initials after which the match is a final, is a
+            final followed by an initial, or is either depending on whether
+            another initial follows
+        final (str): Replacement when the match is a final
+        split_final (str): Replacement when the match is a final followed
+            by an initial
+        unchanged (str): Replacement after any other initial
+
+    Returns:
+        Callable[[str, str, int], str]: Replacement, given the end of the
+        rewritten text before the match, the text being rewritten and the
+        end of the match in it
+    """
+    final_cluster, split_cluster, ambiguous_cluster = clusters
+
+    def replace(before: str, text: str, end: int) -> str:
+        # Unambiguous if there is a separator at the end of the syllable,
+        # or it is the end of the string
+        if not before or end == len(text) or text[end] in SYLLABLE_SEPARATORS:
+            return final
+
+        initial = get_preceding_initial(before)
+        if initial in final_cluster:
+            return final
+        elif initial in split_cluster:
+            return split_final
+        elif initial in ambiguous_cluster:
+            # The split can only occur if what follows is not an initial
+            return final if starts_with_initial(text, end) else split_final
+        return unchanged
+
+    return replace
+
+
+def autocorrect_y_final(
+        close_front_cluster: tuple[str, ...],
+        initial_replacement: str,
+        final_replacement: str,
+        start_replacement: str | None = None,
+) -> Callable[[str, str, int], str]:
+    """Makes the replacement of a rewrite rule for a "y" that is either the
+    initial [j] or the nucleus [y], such as the one in "yum".
+
+    Args:
+        close_front_cluster (tuple[str, ...]): Initials that can be followed
+            by the nucleus [y]
+        initial_replacement (str): Replacement when the "y" is an initial
+        final_replacement (str): Replacement after the initials of
+            close_front_cluster
+        start_replacement (str, optional): Replacement at the start of the
+            string, if not initial_replacement
+
+    Returns:
+        Callable[[str, str, int], str]: Replacement, given the end of the
+        rewritten text before the match, the text being rewritten and the
+        end of the match in it
+    """
+    start_replacement = start_replacement or initial_replacement
+
+    def replace(before: str, text: str, end: int) -> str:
+        if not before:
+            return start_replacement
+        if get_preceding_initial(before) in close_front_cluster:
+            return final_replacement
+        return initial_replacement
+
+    return replace
+
+
+def autocorrect_start(
+        replacement: str, unchanged: str
+) -> Callable[[str, str, int], str]:
+    def replace(before: str, text: str, end: int) -> str:
+        return unchanged if before else replacement
+
+    return replace
+
+
+# Rewrite rules of jyutping_autocorrect, as (pattern, replacement) pairs.
+#
+# The stages are applied one after the other, and each one in a single pass
+# through the string, which replaces the longest pattern that matches at
+# every index. So the rules of a stage must not match the text written by
+# another rule of the same stage, nor overlap the text matched by a rule
+# listed before them. A pattern ending with "$" only matches at the end of a
+# syllable. A rule that replaces a pattern with itself keeps the shorter
+# patterns it starts with from matching.
+#
+# Replacements are either strings, or functions of the last characters of the
+# rewritten text before the match (at most REWRITE_CONTEXT_LENGTH of them,
+# enough to read an initial before a closing parenthesis), of the text being
+# rewritten and of the end of the match in it. Besides " ts", no rule reads or
+# writes across a separator before the last character of the match.
+JYUTPING_AUTOCORRECT_RULES = (
+    (
+        # This is for some romanizations like "shui" for 水
+        # And needs to happen before the "sh" -> "s" conversion
+        ("hui", "heoi"),
+        # The initial + nucleus "cu-" never appears in Jyutping, so the user
+        # probably intended to make the IPA [kʰɐ] sound
+        # Surround the k with capturing group to prevent replacement with (g|k)
+        # if sound changes are enabled
+        ("cu", "(k)u"),
+        # "x" never appears in Jyutping, the user might be more familiar
+        # with Pinyin and assume that it's an "s" sound
+        ("x", "s"),
+    ),
+    (
+        ("ch", "c"),
+        ("sh", "s"),
+        ("zh", "z"),
+        ("eung", "oeng"),
+        ("erng", "oeng"),
+        ("eui", "eoi"),
+        ("euk", "oek"),
+        ("eun", "(eo|yu)n"),
+        ("eut", "(eo|yu)t"),
+        ("eu", "(e|y)u"),
+        ("ern", "eon"),
+        ("oeng", "oeng"),
+        ("oen", "eon"),
+        ("oei", "eoi"),
+        ("oet", "eot"),
+        ("eong$", "oeng"),
+        ("eok", "oek"),
+        ("ao$", "au"),
+        ("ar", "aa"),
+    ),
+    (
+        ("ee", "i"),
+        ("ay", "ei"),
+        ("oy", "oi"),
+    ),
+    (
+        ("oo", "(y!u)"),
+        ("ong", "(o|u)ng"),
+        ("young", "jung"),
+        ("yue", "jyu"),
+        ("tsz", "zi"),
+        ("ck", "k"),
+        ("cck", "k"),
+    ),
+    # The following changes may be unsafe because it is ambiguous whether
+    # they are final + initial or a "misspelling" of a final
+    (
+        ("ue", "(yu)"),
+        # 2. Check if the user intends to write an [-ɛː j-] or [-ei̯] cluster
+        ("ey", autocorrect_final(AUTOCORRECT_EY_CLUSTERS, "ei", "e j", "ey")),
+    ),
+    (
+        # 3. Check if the user intends to write an [-ɔː h-] or [-ou̯] cluster
+        ("oh", autocorrect_final(AUTOCORRECT_OH_CLUSTERS, "ou", "o h", "oh")),
+    ),
+    (
+        # 4. Check if the user intends to write an [-ɔː w-] or [-auː] cluster
+        ("ow", autocorrect_final(AUTOCORRECT_OW_CLUSTERS, "au", "o w", "ow")),
+    ),
+    (
+        # 5. Check if the user intends to write an [ɐm] or [-uː  m-] cluster
+        ("um", autocorrect_final(AUTOCORRECT_UM_CLUSTERS, "am", "u m", "um")),
+    ),
+    # Every replacement of this stage ends with the same letter as its
+    # match, so the rules read the same initial before them as if they were
+    # applied one after the other
+    (
+        # 6. Check if the user intends to write an [-yː j-] or [-ɐm] cluster
+        ("yum", autocorrect_y_final(("z", "c", "s", "j"), "jam", "yu m")),
+        # 7. Check if the user intends to write an [-yː p-] or [-ɐp] cluster
+        ("yup", autocorrect_y_final(("z", "s", "j"), "jap", "yu p")),
+        # 8. Check if the user intends to write an [-yː k-] or [jʊk] cluster
+        ("yuk", autocorrect_y_final(("z", "s", "c", "j"), "juk", "yu k")),
+        # 9. Check if the user intends to write an [-yn g-] or [jʊŋ] cluster
+        ("yung", autocorrect_y_final(("z", "s", "c", "j"), "jung", "(yu)n g")),
+        # 10. Check if the user intends to write an [-yn] or [jɐn], [jyn],
+        # [yn] cluster
+        ("yun", autocorrect_y_final(
+            ("z", "s", "c", "j"), "(ja|jyu|yu)n", "yun", "j(a|yu)n"
+        )),
+        # 11. Check if the user intends to write an [-yt] or [jɐt], [jyt],
+        # [yt] cluster
+        ("yut", autocorrect_y_final(
+            ("z", "s", "c", "j"), "(ja|jyu|yu)t", "(yu)t", "j(a|yu)t"
+        )),
+    ),
+    (
+        # Unsafe because it is ambiguous whether these are final + initial
+        # or a "misspelling" of an initial
+        # But unambiguous if they are at the start of a syllable
+        ("ts", autocorrect_start("c", "ts")),
+        (" ts", "c"),
+        ("kwu", "(g|k)w!u"),
+        # Change any "y" that is not followed by a "u" to "j"
+        # This needs to happen before the final replacements
+        ("y", "j"),
+        ("yu", "yu"),
+        ("y!u", "y!u"),
+        ("y)u", "y)u"),
+    ),
+    (
+        ("ui", "(eo|u)i"),
+        ("un", "(y!u|a|eo)n"),
+        ("ut", "(a|y!u)t"),
+    ),
+)
+
+
+def compile_rewrite_rules(
+        stages: tuple[tuple[tuple[str, str | Callable[[str, str, int], str]], ...], ...]
+) -> tuple[tuple[re.Pattern, dict[str, str | Callable[[str, str, int], str]]], ...]:
+    """Compiles stages of rewrite rules into one regex per stage, which
+    matches the longest of the patterns of the stage in a single pass.
+
+    Args:
+        stages (tuple): Stages of (pattern, replacement) pairs, as in
+            JYUTPING_AUTOCORRECT_RULES
+
+    Returns:
+        tuple: Regex and replacements of every stage, keyed by the text
+        they replace
+    """
+    syllable_end = "(?=[{}]|\\Z)".format(re.escape("".join(SYLLABLE_SEPARATORS)))
+
+    res = []
+    for rules in stages:
+        alternatives = []
+        replacements = {}
+        for pattern, replacement in rules:
+            text = pattern.removesuffix("$")
+            alternatives.append(
+                re.escape(text) + (syllable_end if pattern.endswith("$") else "")
+            )
+            replacements[text] = replacement
+
+        alternatives.sort(key=len, reverse=True)
+        res.append((re.compile("|".join(alternatives)), replacements))
+    return tuple(res)
+
+
+JYUTPING_AUTOCORRECT_STAGES = compile_rewrite_rules(JYUTPING_AUTOCORRECT_RULES)
+
+
+def apply_rewrite_rules(
+        text: str,
+        stages: tuple[tuple[re.Pattern, dict[str, str | Callable[[str, str, int], str]]], ...],
+) -> str:
+    """Rewrites a string with compiled rewrite rules.
+
+    Args:
+        text (str): String to rewrite
+        stages (tuple): Rules compiled by compile_rewrite_rules
+
+    Returns:
+        str: Rewritten string
+    """
+    for pattern, replacements in stages:
+        match = pattern.search(text)
+        if not match:
+            continue
+
+        # The rewritten text is joined once the stage is done, and only its
+        # last characters are kept for the replacements to read, so that a
+        # stage takes linear time however many matches there are
+        rewritten = []
+        before = ""
+        end = 0
+        while match:
+            rewritten.append(text[end:match.start()])
+            before = (before + rewritten[-1])[-REWRITE_CONTEXT_LENGTH:]
+            end = match.end()
+
+            replacement = replacements[match[0]]
+            if not isinstance(replacement, str):
+                replacement = replacement(before, text, end)
+            rewritten.append(replacement)
+            before = (before + replacement)[-REWRITE_CONTEXT_LENGTH:]
+
+            match = pattern.search(text, end)
+        rewritten.append(text[end:])
+        text = "".join(rewritten)
+
+    return text
+
+
+SYLLABLE_SEPARATOR_REGEX = re.compile(
+    "(?=[{}])".format(re.escape("".join(SYLLABLE_SEPARATORS)))
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def autocorrect_syllables(jyutping: str) -> str:
+    return apply_rewrite_rules(jyutping, JYUTPING_AUTOCORRECT_STAGES)
+
+
 def jyutping_autocorrect(
         jyutping: str
 ) -> str:
     """Attempts to correct for common misspellings for Jyutping syllables.
     Handles syllables *before* Jyutping segmentation.
 
+    Applies the rules of JYUTPING_AUTOCORRECT_RULES to every part of the
+    string that starts at a separator, since they do not depend on the rest
+    of the string. The parts are corrected once and cached.
+
     Args:
         jyutping (str): Raw Jyutping or Jyutping-adjacent string to correct
 
@@ -502,375 +1072,7 @@ def jyutping_autocorrect(
         str: Corrected Jyutping string, formatted with REGEX operators "()",
         "|", "?" (notated as "!") in case of ambiguity
     """
-    result = jyutping
-
-    # This is for some romanizations like "shui" for 水
-    # And needs to happen before the "sh" -> "s" conversion
-    result = result.replace("hui", "heoi")
-
-    # The initial + nucleus "cu-" never appears in Jyutping, so the user
-    # probably intended to make the IPA [kʰɐ] sound
-    # Surround the k with capturing group to prevent replacement with (g|k)
-    # if sound changes are enabled
-    result = result.replace("cu", "(k)u")
-
-    # "x" never appears in Jyutping, the user might be more familiar
-    # with Pinyin and assume that it's an "s" sound
-    result = result.replace("x", "s")
-
-    result = result.replace("ch", "c")
-    result = result.replace("sh", "s")
-    result = result.replace("zh", "z")
-
-    result = result.replace("eung", "oeng")
-    result = result.replace("erng", "oeng")
-
-    result = result.replace("eui", "eoi")
-    result = result.replace("euk", "oek")
-    result = result.replace("eun", "(eo|yu)n")
-    result = result.replace("eut", "(eo|yu)t")
-    result = result.replace("eu", "(e|y)u")
-    result = result.replace("ern", "eon")
-
-    idx = result.find("oen")
-    while idx != -1:
-        if result[idx:idx+4] == "oeng":
-            pass
-        else:
-            result = result[:idx] + "eon" + result[idx+3:]
-        idx = result.find("oen", idx+1)
-
-    result = result.replace("oei", "eoi")
-    result = result.replace("oet", "eot")
-
-    result = result.replace("eong ", "oeng ")
-    result = result.replace("eong'", "oeng'")
-    if result.endswith("eong"):
-        idx = result.rfind("eong")
-        result = result[:idx] + "oeng"
-    result = result.replace("eok", "oek")
-
-    result = result.replace("ao ", "au ")
-    result = result.replace("ao'", "au'")
-    if result.endswith("ao"):
-        idx = result.rfind("ao")
-        result = result[:idx] + "au"
-
-    result = result.replace("ar", "aa")
-    result = result.replace("ee", "i")
-    result = result.replace("ay", "ei")
-    result = result.replace("oy", "oi")
-    result = result.replace("oo", "(y!u)")
-    result = result.replace("ong", "(o|u)ng")
-    result = result.replace("young", "jung")
-
-    result = result.replace("yue", "jyu")
-    result = result.replace("ue", "(yu)")
-    result = result.replace("tsz", "zi")
-    result = result.replace("ck", "k")
-
-    result = result.replace("ck", "k")
-
-    # The following changes may be unsafe because it is ambiguous whether
-    # they are final + initial or a "misspelling" of a final
-    # However, it is unambiguous if there is a separator at the end of the
-    # syllable, or it is the end of the string
-
-    # 2. Check if the user intends to write an [-ɛː j-] or [-ei̯] cluster
-    result = result.replace("ey ", "ei ")
-    result = result.replace("ey'", "ei'")
-    if result.endswith("ey"):
-        result = result[:len(result)-2] + "ei"
-
-    # Initials for which <initial> + "-ei" exist in Jyutping
-    close_front_cluster = ("p", "f", "d", "n", "l", "h", "w")
-    # Initials for which <initial> + "-e j-" exist in Jyutping
-    open_mid_cluster = ("c", "j", "y")
-    # Initials for which both exist in Jyutping
-    ambiguous_cluster = ("b", "m", "g", "k", "z", "s")
-
-    idx = result.find("ey")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "ei" + result[2:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "ei" + result[idx+2:]
-                elif result[initial_idx] in open_mid_cluster:
-                    result = result[:idx] + "e j" + result[idx+2:]
-                elif result[initial_idx] in ambiguous_cluster:
-                    # The [j-] cluster can only occur if what follows is not an initial
-                    initial_found = False
-                    for initial_len in range(2, 0, -1):
-                        initial = result[idx+2:idx+2+initial_len]
-                        if initial in JYUTPING_INITIALS or initial == "y":
-                            initial_found = True
-                    if initial_found:
-                        result = result[:idx] + "ei" + result[idx+2:]
-                    else:
-                        result = result[:idx] + "e j" + result[idx+2:]
-        idx = result.find("ey", idx+1)
-
-    # 3. Check if the user intends to write an [-ɔː h-] or [-ou̯] cluster
-    result = result.replace("oh ", "ou ")
-    result = result.replace("oh'", "ou'")
-    if result.endswith("oh"):
-        result = result[:len(result)-2] + "ou"
-
-    # Initials for which <initial> + "-ou" exist in Jyutping
-    close_back_cluster = ("n", "j")
-    # Initials for which both "-ou" and "-o h-" exist in Jyutping
-    ambiguous_cluster = ("b", "p", "m", "f", "d", "t", "l", "g", "h", "w", "z", "c", "s")
-
-    idx = result.find("oh")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "ou" + result[2:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_back_cluster:
-                    result = result[:idx] + "ou" + result[idx+2:]
-                elif result[initial_idx] in ambiguous_cluster:
-                    # The [h-] cluster can only occur if what follows is not an initial
-                    initial_found = False
-                    for initial_len in range(2, 0, -1):
-                        initial = result[idx+2:idx+2+initial_len]
-                        if initial in JYUTPING_INITIALS or initial == "y":
-                            initial_found = True
-                    if initial_found:
-                        result = result[:idx] + "ou" + result[idx+2:]
-                    else:
-                        result = result[:idx] + "o h" + result[idx+2:]
-        idx = result.find("oh", idx+1)
-
-    # 4. Check if the user intends to write an [-ɔː w-] or [-auː] cluster
-    result = result.replace("ow ", "au ")
-    result = result.replace("ow'", "au'")
-    if result.endswith("ow"):
-        result = result[:len(result)-2] + "au"
-
-    # Initials for which <initial> + "-(a)au" exist in Jyutping
-    close_back_cluster = ("b", "m", "k", "s")
-    # Initials for which both "-o w-" and "-(a)au" exist in Jyutping
-    ambiguous_cluster = ("p", "m", "f", "d", "t", "n", "l", "g", "h", "z", "c", "s")
-
-    idx = result.find("ow")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "au" + result[2:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_back_cluster:
-                    result = result[:idx] + "au" + result[idx+2:]
-                elif result[initial_idx] in ambiguous_cluster:
-                    # The [h-] cluster can only occur if what follows is not an initial
-                    initial_found = False
-                    for initial_len in range(2, 0, -1):
-                        initial = result[idx+2:idx+2+initial_len]
-                        if initial in JYUTPING_INITIALS or initial == "y":
-                            initial_found = True
-                    if initial_found:
-                        result = result[:idx] + "au" + result[idx+2:]
-                    else:
-                        result = result[:idx] + "o w" + result[idx+2:]
-        idx = result.find("ow", idx+1)
-
-    # 5. Check if the user intends to write an [ɐm] or [-uː  m-] cluster
-    result = result.replace("um ", "am ")
-    result = result.replace("um'", "am'")
-    if result.endswith("um"):
-        result = result[:len(result)-2] + "am"
-
-    # Initials for which <initial> + "-am" exist in Jyutping
-    open_mid_central_cluster = ("b", "p", "m", "d", "t", "n", "l", "k", "h", "z", "c", "s")
-    # Initials for which both "-o w-" and "-(a)au" exist in Jyutping
-    close_back_cluster = ("f", "w", "a", "e", "i", "o")
-
-    idx = result.find("um")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "am" + result[2:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in open_mid_central_cluster:
-                    result = result[:idx] + "am" + result[idx+2:]
-                elif result[initial_idx] in close_back_cluster:
-                    pass
-                elif result[initial_idx] == "g":
-                    # The [m-] cluster can only occur if what follows is not an initial
-                    initial_found = False
-                    for initial_len in range(2, 0, -1):
-                        initial = result[idx+2:idx+2+initial_len]
-                        if initial in JYUTPING_INITIALS or initial == "y":
-                            initial_found = True
-                    if initial_found:
-                        result = result[:idx] + "am" + result[idx+2:]
-                    else:
-                        result = result[:idx] + "u m" + result[idx+2:]
-        idx = result.find("um", idx+1)
-
-    # 6. Check if the user intends to write an [-yː j-] or [-ɐm] cluster
-    # Initials for which <initial> + "-yu m-" exist in Jyutping
-    close_front_cluster = ("z", "c", "s", "j")
-
-    idx = result.find("yum")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "jam" + result[3:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "yu m" + result[idx+3:]
-                else:
-                    result = result[:idx] + "jam" + result[idx+3:]
-        idx = result.find("yum", idx+1)
-
-    # 7. Check if the user intends to write an [-yː p-] or [-ɐp] cluster
-    # Initials for which <initial> + "-yu p-" exist in Jyutping
-    close_front_cluster = ("z", "s", "j")
-
-    idx = result.find("yup")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "jap" + result[3:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "yu p" + result[idx+3:]
-                else:
-                    result = result[:idx] + "jap" + result[idx+3:]
-        idx = result.find("yup", idx+1)
-
-    # 8. Check if the user intends to write an [-yː k-] or [jʊk] cluster
-    # Initials for which <initial> + "-yu k-" exist in Jyutping
-    close_front_cluster = ("z", "s", "c", "j")
-
-    idx = result.find("yuk")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "juk" + result[3:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "yu k" + result[idx+3:]
-                else:
-                    result = result[:idx] + "juk" + result[idx+3:]
-        idx = result.find("yuk", idx+1)
-
-    # 9. Check if the user intends to write an [-yn g-] or [jʊŋ] cluster
-    # Initials for which <initial> + "-yun g-" exist in Jyutping
-    close_front_cluster = ("z", "s", "c", "j")
-
-    idx = result.find("yung")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "jung" + result[4:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "(yu)n g" + result[idx+4:]
-                else:
-                    result = result[:idx] + "jung" + result[idx+4:]
-        idx = result.find("yung", idx+1)
-
-    # 10. Check if the user intends to write an [-yn] or [jɐn], [jyn], [yn] cluster
-    # Initials for which <initial> + "-yu n-" exist in Jyutping
-    close_front_cluster = ("z", "s", "c", "j")
-
-    idx = result.find("yun")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "j(a|yu)n" + result[3:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "yun" + result[idx+3:]
-                else:
-                    result = result[:idx] + "(ja|jyu|yu)n" + result[idx+3:]
-        idx = result.find("yun", idx+1)
-
-    # 11. Check if the user intends to write an [-yt] or [jɐt], [jyt], [yt] cluster
-    # Initials for which <initial> + "-yu t-" exist in Jyutping
-    close_front_cluster = ("z", "s", "c", "j")
-
-    idx = result.find("yut")
-    while idx != -1:
-        match idx:
-            case 0:
-                result = "j(a|yu)t" + result[3:]
-            case _:
-                initial_idx = idx - 1
-                if idx >= 2 and result[initial_idx] == ")":
-                    initial_idx = idx - 2
-
-                if result[initial_idx] in close_front_cluster:
-                    result = result[:idx] + "(yu)t" + result[idx+3:]
-                else:
-                    result = result[:idx] + "(ja|jyu|yu)t" + result[idx+3:]
-        idx = result.find("yut", idx+1)
-
-    # Unsafe because it is ambiguous whether these are final + initial
-    # or a "misspelling" of an initial
-    # But unambiguous if they are at the start of a syllable
-    if result.startswith("ts"):
-        result = "c" + result[2:]
-    result = result.replace(" ts", "c")
-    if result.startswith("kwu"):
-        result = "(g|k)w!u" + result[3:]
-    result = result.replace("kwu", "(g|k)w!u")
-
-    # Change any "y" that is not followed by a "u" to "j"
-    # This needs to happen before the final replacements
-    idx = result.find("y")
-    while idx != -1:
-        if result[idx:idx+2] == "yu" or result[idx:idx+3] in ("y!u", "y)u"):
-            pass
-        else:
-            result = result[:idx] + "j" + result[idx+1:]
-        idx = result.find("y", idx+1)
-
-    result = result.replace("ui", "(eo|u)i")
-    result = result.replace("un", "(y!u|a|eo)n")
-    result = result.replace("ut", "(a|y!u)t")
-
-    return result
+    return "".join(map(autocorrect_syllables, SYLLABLE_SEPARATOR_REGEX.split(jyutping)))
 
 
 def jyutping_sound_changes(syllables: list[str]) -> list[str]:
@@ -972,6 +1174,49 @@ def jyutping_sound_changes(syllables: list[str]) -> list[str]:
     return res
 
 
+# Initials that jyutping_sound_changes lets match each other, mapped to the
+# one that stands for them in fuzzy keys
+JYUTPING_FUZZY_KEY_INITIALS = {"n": "l", "t": "d", "c": "z", "k": "g"}
+
+
+def get_jyutping_fuzzy_key(syllable: str) -> str:
+    """Gives the same key to the spellings of a Jyutping syllable that
+    jyutping_sound_changes lets match each other, such as "nei5" and "lei5".
+
+    Args:
+        syllable (str): Jyutping syllable, with or without its tone
+
+    Returns:
+        str: Syllable with merged sounds replaced by a single spelling, e.g.
+        "lei5"
+    """
+    tone = ""
+    if syllable[-1:].isdigit():
+        syllable, tone = syllable[:-1], syllable[-1]
+
+    # 1. Whole-syllable sound changes
+    if syllable in ("ng", "m"):
+        return "m" + tone
+
+    # 2. Initial sound changes
+    if syllable.startswith("ng"):
+        syllable = syllable[2:]
+    # Syllables starting with "go" or "ko" also match "gwo" and "kwo", but
+    # not the other way around, so they keep a key of their own
+    syllable = JYUTPING_FUZZY_KEY_INITIALS.get(syllable[:1], syllable[:1]) + syllable[1:]
+
+    # 3. Nucleus sound changes
+    syllable = syllable.replace("aa", "a")
+
+    # 4. Final sound changes
+    if syllable.endswith(("ang", "ong")):
+        syllable = syllable[:-1]
+    elif syllable.endswith("k") and not syllable.endswith(("ik", "uk")):
+        syllable = syllable[:-1] + "t"
+
+    return syllable + tone
+
+
 def segment_jyutping(
     jyutping: str,
     remove_special_characters: bool = True,
@@ -1012,6 +1257,30 @@ def segment_jyutping(
         for c in REGEX_CHARACTERS:
             jyutping = jyutping.replace(c, " ")
 
+    # Without regex characters, components are read as they are, and are
+    # never longer than 4 characters. Otherwise, substrings of up to 17
+    # characters are unfolded.
+    max_component_len = 4 if remove_regex_characters else 17
+    component_kinds = {}
+
+    def is_component(idx: int, length: int, kind: int) -> bool:
+        # Substrings are cut at the end of the Jyutping
+        length = min(length, len(jyutping) - idx)
+        if length <= 0:
+            return False
+
+        if length > max_component_len:
+            kinds = match_jyutping_components(jyutping, idx, idx + length)
+        else:
+            # The trie is walked once per index, for every length at once
+            if idx not in component_kinds:
+                component_kinds[idx] = match_jyutping_components(
+                    jyutping, idx, min(idx + max_component_len, len(jyutping))
+                )
+            kinds = component_kinds[idx]
+
+        return length <= len(kinds) and bool(kinds[length - 1] & kind)
+
     while end_idx < len(jyutping):
         component_found = False
 
@@ -1076,21 +1345,7 @@ def segment_jyutping(
             if initial_found:
                 initial = jyutping[start_idx:end_idx]
 
-                if remove_regex_characters:
-                    is_valid_final = initial in JYUTPING_FINALS
-                else:
-                    # Regex characters need to be handled in a special way;
-                    # essentially, we need to check every possibility. If at
-                    # least one possibility is a valid final, then the Jyutping
-                    # can be considered valid.
-                    _, strings_to_search = unfold_jyutping_regex(initial)
-
-                    is_valid_final = False
-                    for s in strings_to_search:
-                        if s in JYUTPING_FINALS:
-                            is_valid_final = True
-
-                if is_valid_final:
+                if is_component(start_idx, end_idx - start_idx, JYUTPING_FINAL):
                     initial_with_digit = initial + curr_string
                     res.append(initial_with_digit)
                     end_idx += 1
@@ -1114,20 +1369,8 @@ def segment_jyutping(
             max_initial_len = min(17, len(jyutping) - end_idx)
 
         for initial_len in range(max_initial_len, 0, -1):
-            curr_string = jyutping[end_idx:end_idx+initial_len]
-
-            if remove_regex_characters:
-                is_valid_initial = curr_string in JYUTPING_INITIALS
-                if not is_valid_initial:
-                    continue
-            else:
-                _, strings_to_search = unfold_jyutping_regex(curr_string)
-                is_valid_initial = False
-                for s in strings_to_search:
-                    if s in JYUTPING_INITIALS:
-                        is_valid_initial = True
-                if not is_valid_initial:
-                    continue
+            if not is_component(end_idx, initial_len, JYUTPING_INITIAL):
+                continue
 
             if initial_found:
                 # Multiple initials in a row are only valid if what the
@@ -1139,17 +1382,7 @@ def segment_jyutping(
                 # can be a syllable per se; in that case, it would also be
                 # a member of JYUTPING_FINALS
                 previous_initial = jyutping[start_idx:end_idx]
-                if remove_regex_characters:
-                    is_valid_final = previous_initial in JYUTPING_FINALS
-                else:
-                    _, strings_to_search = unfold_jyutping_regex(previous_initial)
-
-                    is_valid_final = False
-                    for s in strings_to_search:
-                        if s in JYUTPING_FINALS:
-                            is_valid_final = True
-
-                if is_valid_final:
+                if is_component(start_idx, end_idx - start_idx, JYUTPING_FINAL):
                     res.append(previous_initial)
                     start_idx = end_idx
                 else:
@@ -1168,19 +1401,7 @@ def segment_jyutping(
             max_final_len = min(17, len(jyutping) - end_idx)
 
         for final_len in range(max_final_len, 0, -1):
-            curr_string = jyutping[end_idx:end_idx+final_len]
-
-            if remove_regex_characters:
-                is_valid_final = curr_string in JYUTPING_FINALS
-            else:
-                _, strings_to_search = unfold_jyutping_regex(curr_string)
-
-                is_valid_final = False
-                for s in strings_to_search:
-                    if s in JYUTPING_FINALS:
-                        is_valid_final = True
-
-            if is_valid_final:
+            if is_component(end_idx, final_len, JYUTPING_FINAL):
                 end_idx += final_len
                 if end_idx < len(jyutping):
                     if jyutping[end_idx].isnumeric():
@@ -1211,3 +1432,126 @@ def segment_jyutping(
             valid_jyutping = False
 
     return [valid_jyutping, res]
+
+
+def jyutping_to_yale_batch(
+    jyutpings: Iterable[str],
+    use_spaces_to_segment: bool = False,
+    processes: int | None = None,
+) -> list[str]:
+    """Converts many Jyutping strings to Yale romanization at once, see
+    jyutping_to_yale. Each distinct string is segmented once, and each
+    distinct syllable converted once, for the whole batch.
+
+    Args:
+        jyutpings (Iterable[str]): Strings of valid Jyutping syllables
+        use_spaces_to_segment (bool, optional): See jyutping_to_yale.
+            Defaults to False.
+        processes (int | None, optional): Number of worker processes that
+            segment the strings, see batch_utils.map_distinct. Defaults to
+            None.
+
+    Returns:
+        list[str]: Strings of Yale syllables, in order
+    """
+    jyutpings = list(jyutpings)
+    segmentations = batch_utils.map_distinct(
+        functools.partial(split_jyutping, use_spaces_to_segment=use_spaces_to_segment),
+        filter(None, jyutpings),
+        processes,
+    )
+    yale = batch_utils.SyllableCache(get_jyutping_to_yale(), convert_yale_syllable)
+
+    return [
+        " ".join([yale[syllable] for syllable in segmentations[jyutping]])
+        if jyutping
+        else jyutping
+        for jyutping in jyutpings
+    ]
+
+
+def jyutping_to_IPA_batch(
+    jyutpings: Iterable[str],
+    use_spaces_to_segment: bool = False,
+    processes: int | None = None,
+) -> list[str]:
+    """Converts many Jyutping strings to Cantonese Sinological IPA at once,
+    see jyutping_to_IPA and jyutping_to_yale_batch.
+
+    Args:
+        jyutpings (Iterable[str]): Strings of valid Jyutping syllables
+        use_spaces_to_segment (bool, optional): See jyutping_to_IPA.
+            Defaults to False.
+        processes (int | None, optional): Number of worker processes that
+            segment the strings. Defaults to None.
+
+    Returns:
+        list[str]: Strings of Cantonese Sinological IPA syllables, in order
+    """
+    jyutpings = list(jyutpings)
+    segmentations = batch_utils.map_distinct(
+        functools.partial(split_jyutping, use_spaces_to_segment=use_spaces_to_segment),
+        filter(None, jyutpings),
+        processes,
+    )
+    ipa = batch_utils.SyllableCache(get_jyutping_to_IPA(), convert_IPA_syllable)
+
+    return [
+        " ".join([ipa[syllable] for syllable in segmentations[jyutping]])
+        if jyutping
+        else jyutping
+        for jyutping in jyutpings
+    ]
+
+
+def extract_jyutping_tones_batch(
+    jyutpings: Iterable[str], processes: int | None = None
+) -> list[list[int]]:
+    """Gets the list of tones of many Jyutping strings at once, see
+    extract_jyutping_tones. Repeated strings share the same list.
+
+    Args:
+        jyutpings (Iterable[str]): Strings of valid Jyutping syllables
+        processes (int | None, optional): Number of worker processes.
+            Defaults to None.
+
+    Returns:
+        list[list[int]]: The tones of each string, in order
+    """
+    return batch_utils.batch_map(extract_jyutping_tones, jyutpings, processes)
+
+
+def segment_jyutping_batch(
+    jyutpings: Iterable[str],
+    remove_special_characters: bool = True,
+    remove_glob_characters: bool = True,
+    remove_regex_characters: bool = True,
+    processes: int | None = None,
+) -> list[tuple[bool, list[str]]]:
+    """Segments many Jyutping strings at once, see segment_jyutping.
+    Repeated strings share the same segmentation.
+
+    Args:
+        jyutpings (Iterable[str]): Strings of valid Jyutping syllables
+        remove_special_characters (bool, optional): See segment_jyutping.
+            Defaults to True.
+        remove_glob_characters (bool, optional): See segment_jyutping.
+            Defaults to True.
+        remove_regex_characters (bool, optional): See segment_jyutping.
+            Defaults to True.
+        processes (int | None, optional): Number of worker processes.
+            Defaults to None.
+
+    Returns:
+        list[tuple[bool, list[str]]]: Segmentation of each string, in order
+    """
+    return batch_utils.batch_map(
+        functools.partial(
+            segment_jyutping,
+            remove_special_characters=remove_special_characters,
+            remove_glob_characters=remove_glob_characters,
+            remove_regex_characters=remove_regex_characters,
+        ),
+        jyutpings,
+        processes,
+    )
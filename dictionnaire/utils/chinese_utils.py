@@ -1,5 +1,10 @@
+import functools
+
+from dataclasses import dataclass
 from unicodedata import normalize
 
+from . import cantonese_utils, default_settings
+
 SPECIAL_CHARACTERS = (
     ".",
     "。",
@@ -25,6 +30,18 @@ SPECIAL_CHARACTERS = (
 SAME_CHARACTER_STRING = "－"
 
 
+@functools.cache
+def is_coloured(codepoint: str) -> bool:
+    # Special characters and letters are never coloured in, because the
+    # dictionary doesn't have tones for them
+    is_alphabetic = codepoint.isupper() or codepoint.islower()
+    return not (
+        codepoint == SAME_CHARACTER_STRING
+        or codepoint in SPECIAL_CHARACTERS
+        or is_alphabetic
+    )
+
+
 def apply_colours(original: str, tones: list[int], tone_colours: list[str]) -> str:
     """Adds HTML tags to each Chinese character with colours
     corresponding to the character's tone.
@@ -39,33 +56,26 @@ def apply_colours(original: str, tones: list[int], tone_colours: list[str]) -> s
     Returns:
         str: string of Chinese characters with HTML tags for colours
     """
-    res = ""
+    res = []
     tone_idx = 0
 
     for codepoint in original:
         if codepoint == SAME_CHARACTER_STRING:
             # Don't add colours to the same character string
             # But since they represent a character, increment the tone index
-            res += codepoint
+            res.append(codepoint)
             tone_idx += 1
             continue
 
-        is_alphabetic = codepoint.isupper() or codepoint.islower()
-        if codepoint in SPECIAL_CHARACTERS or is_alphabetic:
-            # Don't add colours to special characters or letters
-            # because the dictionary doesn't have tones for them
-            res += codepoint
-            continue
-
-        if tone_idx >= len(tones):
-            res += codepoint
+        if not is_coloured(codepoint) or tone_idx >= len(tones):
+            res.append(codepoint)
             continue
 
         tone = tones[tone_idx]
-        res += f'<span style="color: {tone_colours[tone]}">{codepoint}</span>'
+        res.append(f'<span style="color: {tone_colours[tone]}">{codepoint}</span>')
         tone_idx += 1
 
-    return res
+    return "".join(res)
 
 
 def compare_strings(original: str, comparison: str) -> str:
@@ -85,16 +95,110 @@ def compare_strings(original: str, comparison: str) -> str:
         str: Same as "comparison" arg but characters that are the
         same between original and comparison are replaced with a dash
     """
-    res = ""
-
     original, comparison = normalize("NFC", original), normalize("NFC", comparison)
-    for idx, codepoint in enumerate(original):
-        if idx < len(original) and idx < len(comparison):
-            res += (
-                SAME_CHARACTER_STRING
-                if (original[idx] == comparison[idx])
-                else comparison[idx]
-            )
+
+    # Characters past the end of the comparison string are kept as is
+    return "".join(
+        SAME_CHARACTER_STRING if codepoint == compared else compared
+        for codepoint, compared in zip(original, comparison)
+    ) + original[len(comparison):]
+
+
+@dataclass(frozen=True, slots=True)
+class HeadwordVariants:
+    coloured_traditional: str
+    coloured_simplified: str
+    traditional_difference: str
+    coloured_traditional_difference: str
+    simplified_difference: str
+    coloured_simplified_difference: str
+
+
+JYUTPING_COLOUR_TAGS = [
+    f'<span style="color: {colour}">' for colour in default_settings.DEFAULT_JYUTPING_TONES
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def render_headword(traditional: str, simplified: str, jyutping: str) -> HeadwordVariants:
+    """Builds every variant of a headword shown on the pages, coloured in
+    with the Jyutping tones, extracting the tones once.
+
+    Args:
+        traditional (str): Traditional form of the headword
+        simplified (str): Simplified form of the headword
+        jyutping (str): Jyutping of the headword
+
+    Returns:
+        HeadwordVariants: Same strings as apply_colours and compare_strings
+            return for each variant
+    """
+    tones = cantonese_utils.extract_jyutping_tones(jyutping)
+    normalized_traditional = normalize("NFC", traditional)
+    normalized_simplified = normalize("NFC", simplified)
+
+    if not (
+        traditional == normalized_traditional
+        and simplified == normalized_simplified
+        and all(map(is_coloured, traditional))
+        and all(map(is_coloured, simplified))
+    ):
+        # Letters and special characters do not move through the tones, so
+        # that each variant needs its own tone index
+        tone_colours = default_settings.DEFAULT_JYUTPING_TONES
+        traditional_difference = compare_strings(simplified, traditional)
+        simplified_difference = compare_strings(traditional, simplified)
+        return HeadwordVariants(
+            apply_colours(traditional, tones, tone_colours),
+            apply_colours(simplified, tones, tone_colours),
+            traditional_difference,
+            apply_colours(traditional_difference, tones, tone_colours),
+            simplified_difference,
+            apply_colours(simplified_difference, tones, tone_colours),
+        )
+
+    # Otherwise every character of every variant (including the same
+    # character strings) takes the tone at its own position, so that all the
+    # variants are built in a single pass
+    coloured_traditional, coloured_simplified = [], []
+    traditional_difference, coloured_traditional_difference = [], []
+    simplified_difference, coloured_simplified_difference = [], []
+
+    for idx in range(max(len(traditional), len(simplified))):
+        traditional_codepoint = traditional[idx] if idx < len(traditional) else None
+        simplified_codepoint = simplified[idx] if idx < len(simplified) else None
+        same = traditional_codepoint == simplified_codepoint
+
+        if idx < len(tones):
+            opening_tag, closing_tag = JYUTPING_COLOUR_TAGS[tones[idx]], "</span>"
         else:
-            res += original[idx]
-    return res
+            opening_tag, closing_tag = "", ""
+
+        if traditional_codepoint:
+            coloured_traditional.append(f"{opening_tag}{traditional_codepoint}{closing_tag}")
+            if same:
+                simplified_difference.append(SAME_CHARACTER_STRING)
+                coloured_simplified_difference.append(SAME_CHARACTER_STRING)
+            else:
+                codepoint = simplified_codepoint or traditional_codepoint
+                simplified_difference.append(codepoint)
+                coloured_simplified_difference.append(f"{opening_tag}{codepoint}{closing_tag}")
+
+        if simplified_codepoint:
+            coloured_simplified.append(f"{opening_tag}{simplified_codepoint}{closing_tag}")
+            if same:
+                traditional_difference.append(SAME_CHARACTER_STRING)
+                coloured_traditional_difference.append(SAME_CHARACTER_STRING)
+            else:
+                codepoint = traditional_codepoint or simplified_codepoint
+                traditional_difference.append(codepoint)
+                coloured_traditional_difference.append(f"{opening_tag}{codepoint}{closing_tag}")
+
+    return HeadwordVariants(
+        "".join(coloured_traditional),
+        "".join(coloured_simplified),
+        "".join(traditional_difference),
+        "".join(coloured_traditional_difference),
+        "".join(simplified_difference),
+        "".join(coloured_simplified_difference),
+    )
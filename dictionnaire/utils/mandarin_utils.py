@@ -1,6 +1,12 @@
+import functools
+import heapq
+import math
 import re
+from collections.abc import Iterable
 from unicodedata import normalize
 
+from . import batch_utils
+
 SPECIAL_CHARACTERS = (
     ".",
     "。",
@@ -410,6 +416,63 @@ def extract_pinyin_tones(pinyin: str) -> list[int]:
     return res
 
 
+def convert_pretty_syllable(syllable: str) -> str:
+    """Converts a single raw Pinyin syllable to pretty Pinyin, by applying
+    the conversion rules. Use get_pinyin_to_pretty for syllables in the Pinyin
+    inventory.
+
+    Args:
+        syllable (str): Raw Pinyin syllable, or any other token
+
+    Returns:
+        str: The pretty Pinyin syllable, or the token unchanged if it is not
+            Pinyin
+    """
+    if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
+        # Most numbers, single characters, etc are not Pinyin
+        return syllable
+
+    # If there is no tone, the syllable cannot be converted
+    tone = -1
+    for pinyin_tone in PINYIN_TONES:
+        if syllable.find(str(pinyin_tone)) != -1:
+            tone = pinyin_tone
+            break
+    if tone == -1:
+        return syllable
+
+    syllable = syllable.replace("u:", "ü")
+
+    # In Pinyin, the diacritic is always placed over the first
+    # A, E, or O if they exist.
+    diacritic_vowel_idx = float("inf")
+    diacritic_vowel = None
+    for priority_vowel in PINYIN_PRIORITY_DIACRITIC:
+        idx = syllable.find(priority_vowel)
+        if idx != -1 and idx < diacritic_vowel_idx:
+            diacritic_vowel_idx = idx
+            diacritic_vowel = priority_vowel
+    # Otherwise, the diacritic goes on the last U or I
+    if not diacritic_vowel:
+        diacritic_vowel_idx = float("-inf")
+        for secondary_vowel in PINYIN_SECONDARY_DIACRITIC:
+            idx = syllable.find(secondary_vowel)
+            if idx != -1 and idx > diacritic_vowel_idx:
+                diacritic_vowel_idx = idx
+                diacritic_vowel = secondary_vowel
+    if not diacritic_vowel:
+        # No vowel to put an accent on was found :(
+        return syllable
+
+    # Add the diacritic
+    syllable = syllable.replace(
+        diacritic_vowel, PINYIN_TONE_REPLACEMENTS[diacritic_vowel][tone - 1], 1
+    )
+
+    # Remove the tone
+    return syllable[:-1]
+
+
 def pretty_pinyin(pinyin: str) -> str:
     """Converts raw Pinyin in database (with u: and digits for tones)
     to the conventional Hanyu Pinyin representation
@@ -427,58 +490,11 @@ def pretty_pinyin(pinyin: str) -> str:
     if not syllables:
         return pinyin
 
-    res = []
-
-    for syllable in syllables:
-        if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
-            # Most numbers, single characters, etc are not Pinyin
-            res.append(syllable)
-            continue
-
-        # If there is no tone, the syllable cannot be converted
-        tone = -1
-        for pinyin_tone in PINYIN_TONES:
-            if syllable.find(str(pinyin_tone)) != -1:
-                tone = pinyin_tone
-                break
-        if tone == -1:
-            res.append(syllable)
-            continue
-
-        syllable = syllable.replace("u:", "ü")
-
-        # In Pinyin, the diacritic is always placed over the first
-        # A, E, or O if they exist.
-        diacritic_vowel_idx = float("inf")
-        diacritic_vowel = None
-        for priority_vowel in PINYIN_PRIORITY_DIACRITIC:
-            idx = syllable.find(priority_vowel)
-            if idx != -1 and idx < diacritic_vowel_idx:
-                diacritic_vowel_idx = idx
-                diacritic_vowel = priority_vowel
-        # Otherwise, the diacritic goes on the last U or I
-        if not diacritic_vowel:
-            diacritic_vowel_idx = float("-inf")
-            for secondary_vowel in PINYIN_SECONDARY_DIACRITIC:
-                idx = syllable.find(secondary_vowel)
-                if idx != -1 and idx > diacritic_vowel_idx:
-                    diacritic_vowel_idx = idx
-                    diacritic_vowel = secondary_vowel
-        if not diacritic_vowel:
-            # No vowel to put an accent on was found :(
-            res.append(syllable)
-            continue
-
-        # Add the diacritic
-        syllable = syllable.replace(
-            diacritic_vowel, PINYIN_TONE_REPLACEMENTS[diacritic_vowel][tone - 1], 1
-        )
-
-        # Remove the tone
-        syllable = syllable[:-1]
-        res.append(syllable)
-
-    return " ".join(res)
+    pretty = get_pinyin_to_pretty()
+    return " ".join(
+        pretty.get(syllable) or convert_pretty_syllable(syllable)
+        for syllable in syllables
+    )
 
 
 def numbered_pinyin(pinyin: str) -> str:
@@ -513,6 +529,77 @@ def pinyin_with_v(pinyin: str) -> str:
     return pinyin.replace("u:", "v")
 
 
+def convert_zhuyin_syllable(syllable: str) -> str:
+    """Converts a single raw Pinyin syllable to Zhuyin, by applying the
+    conversion rules. Use get_pinyin_to_zhuyin for syllables in the Pinyin
+    inventory.
+
+    Args:
+        syllable (str): Raw Pinyin syllable, or any other token
+
+    Returns:
+        str: The Zhuyin syllable, or the token unchanged if it is not Pinyin
+    """
+    if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
+        # Most numbers, single characters, etc are not Pinyin
+        return syllable
+
+    # If there is no tone, the syllable cannot be converted to Zhuyin
+    tone = -1
+    for pinyin_tone in PINYIN_TONES:
+        if syllable.find(str(pinyin_tone)) != -1:
+            tone = pinyin_tone
+            break
+    if tone == -1:
+        return syllable
+
+    syllable = pinyin_with_v(syllable)
+
+    # Handle some special cases for Zhuyin
+    for pattern, repl in ZHUYIN_PREPROCESS_INITIAL_REGEX.items():
+        syllable = pattern.sub(repl, syllable)
+    for pattern, repl in ZHUYIN_PREPROCESS_FINAL_REGEX.items():
+        syllable = pattern.sub(repl, syllable)
+
+    # Handle general case
+    match = ZHUYIN_INITIAL_REGEX.search(syllable)
+    if match:
+        if match.group(1):
+            syllable = ZHUYIN_INITIAL_REGEX.sub(
+                ZHUYIN_INITIALS[match.group(1)], syllable
+            )
+
+    match = ZHUYIN_FINAL_REGEX.search(syllable)
+    if match:
+        final, er = "", ""
+        if match.group(1):
+            if match.group(1) not in ZHUYIN_FINALS:
+                # Failed to match final, give up
+                return syllable
+            final = ZHUYIN_FINALS[match.group(1)]
+        if match.group(2):
+            er = "ㄦ"
+        syllable = ZHUYIN_FINAL_REGEX.sub(final + er, syllable)
+
+    er_idx = syllable.find("ㄦ")
+    if tone == 5:
+        syllable = ZHUYIN_TONES[tone] + syllable
+    elif er_idx != -1 and syllable != "ㄦ":
+        syllable = syllable[:er_idx] + ZHUYIN_TONES[tone] + syllable[er_idx:]
+    else:
+        syllable = syllable + ZHUYIN_TONES[tone]
+
+    return syllable
+
+
+def split_pinyin(pinyin: str, use_spaces_to_segment: bool) -> list[str]:
+    if use_spaces_to_segment:
+        return pinyin.split()
+
+    _, syllables = segment_pinyin(pinyin)
+    return syllables
+
+
 def pinyin_to_zhuyin(pinyin: str, use_spaces_to_segment: bool = False) -> str:
     """Converts raw Pinyin in database to Zhuyin/Bopomofo.
 
@@ -530,69 +617,117 @@ def pinyin_to_zhuyin(pinyin: str, use_spaces_to_segment: bool = False) -> str:
     if not pinyin:
         return pinyin
 
-    res = []
+    zhuyin = get_pinyin_to_zhuyin()
+    return " ".join(
+        zhuyin.get(syllable) or convert_zhuyin_syllable(syllable)
+        for syllable in split_pinyin(pinyin, use_spaces_to_segment)
+    )
 
-    if use_spaces_to_segment:
-        syllables = pinyin.split()
-    else:
-        _, syllables = segment_pinyin(pinyin)
-
-    for syllable in syllables:
-        if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
-            # Most numbers, single characters, etc are not Pinyin
-            res.append(syllable)
-            continue
 
-        # If there is no tone, the syllable cannot be converted to Zhuyin
-        tone = -1
-        for pinyin_tone in PINYIN_TONES:
-            if syllable.find(str(pinyin_tone)) != -1:
-                tone = pinyin_tone
-                break
-        if tone == -1:
-            res.append(syllable)
-            continue
-
-        syllable = pinyin_with_v(syllable)
-
-        # Handle some special cases for Zhuyin
-        for pattern, repl in ZHUYIN_PREPROCESS_INITIAL_REGEX.items():
-            syllable = pattern.sub(repl, syllable)
-        for pattern, repl in ZHUYIN_PREPROCESS_FINAL_REGEX.items():
-            syllable = pattern.sub(repl, syllable)
-
-        # Handle general case
-        match = ZHUYIN_INITIAL_REGEX.search(syllable)
-        if match:
-            if match.group(1):
-                syllable = ZHUYIN_INITIAL_REGEX.sub(
-                    ZHUYIN_INITIALS[match.group(1)], syllable
-                )
-
-        match = ZHUYIN_FINAL_REGEX.search(syllable)
-        if match:
-            final, er = "", ""
-            if match.group(1):
-                if match.group(1) not in ZHUYIN_FINALS:
-                    # Failed to match final, give up
-                    res.append(syllable)
-                    continue
-                final = ZHUYIN_FINALS[match.group(1)]
-            if match.group(2):
-                er = "ㄦ"
-            syllable = ZHUYIN_FINAL_REGEX.sub(final + er, syllable)
-
-        er_idx = syllable.find("ㄦ")
-        if tone == 5:
-            syllable = ZHUYIN_TONES[tone] + syllable
-        elif er_idx != -1 and syllable != "ㄦ":
-            syllable = syllable[:er_idx] + ZHUYIN_TONES[tone] + syllable[er_idx:]
-        else:
-            syllable = syllable + ZHUYIN_TONES[tone]
+def convert_IPA_components(syllable: str) -> tuple[str, str]:
+    initial, final = "", ""
+    if syllable == "ng":
+        final = MANDARIN_IPA_FINALS[syllable]
+    else:
+        match = MANDARIN_IPA_SYLLABLE_REGEX.match(syllable)
+        if not match:
+            return syllable
+
+        conversion_failure = False
+        if match.group(1):
+            if match.group(1) not in MANDARIN_IPA_INITIALS:
+                conversion_failure = True
+            else:
+                initial = MANDARIN_IPA_INITIALS[match.group(1)]
+        if match.group(2):
+            if match.group(2) not in MANDARIN_IPA_FINALS:
+                conversion_failure = True
+            else:
+                final = MANDARIN_IPA_FINALS[match.group(2)]
+
+        # Exit early if any initial or final could not be converted
+        if conversion_failure:
+            return match.group(1), match.group(2)
+
+    # Replace close front unrounded vowel with syllable retroflex sibilant
+    # fricative (+ voiced retroflex approximant if erhua) in Pinyin
+    # starting with ch, sh, zh, or r
+    if initial in ("ʈ͡ʂʰ", "ʂ", "ʈ͡ʂ", "ʐ"):
+        if final == "ir":
+            final = "ʐ̩ɻ"
+        elif final == "i":
+            final = "ʐ̩"
+
+    # Replace close front unrounded vowel with syllablic alveolar sibilant
+    # fricative (+ voiced retroflex approximant if erhua) in Pinyin
+    # starting with c, s, or z
+    if initial in ("t͡sʰ", "s", "t͡s"):
+        if final == "ir":
+            final = "z̩ɻ"
+        elif final == "i":
+            final = "z̩̩"
+
+    if initial == "ʐ" and final == "ʐ̩":
+        initial = ""
+
+    return initial, final
+
+
+def convert_IPA_syllable(syllable: str) -> tuple[int, str | None]:
+    """Converts a single raw Pinyin syllable to Mandarin Sinological IPA,
+    apart from its tone, which depends on the surrounding syllables. Use
+    get_pinyin_to_IPA for syllables in the Pinyin inventory.
 
-        res.append(syllable)
+    Args:
+        syllable (str): Raw Pinyin syllable, or any other token
 
-    return " ".join(res)
+    Returns:
+        tuple[int, str | None]: Tone of the syllable (or -1 if it has none),
+            and the IPA syllable without its tone (or None if the token is
+            not Pinyin, and should be kept unchanged)
+    """
+    syllable_tone, syllable_tone_idx = -1, -1
+    for pinyin_tone in PINYIN_TONES:
+        syllable_tone_idx = syllable.find(str(pinyin_tone))
+        if syllable_tone_idx != -1:
+            syllable_tone = pinyin_tone
+            break
+
+    if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
+        # Most numbers, single characters, etc are not Pinyin
+        return syllable_tone, None
+
+    if syllable_tone_idx == -1:
+        # If there is no tone, the syllable cannot be converted to IPA
+        return syllable_tone, None
+
+    glottal = ""
+
+    # Figure out whether this syllable needs a glottal stop
+    syllable_without_tone = (
+        syllable[:syllable_tone_idx] + syllable[syllable_tone_idx + 1:]
+    )
+    if syllable_without_tone in MANDARIN_IPA_GLOTTAL:
+        glottal = "ˀ"
+
+    # Mark close front rounded vowel with v instead of "u"
+    syllable_without_tone = syllable_without_tone.replace("u:", "v")
+    syllable_without_tone = MANDARIN_CLOSE_FRONT_ROUNDED_VOWEL_REGEX.sub(
+        r"\1v", syllable_without_tone
+    )
+
+    # Convert main part of the Mandarin syllable
+    initial, final = convert_IPA_components(syllable_without_tone)
+
+    if syllable_tone == 5:
+        # When neutral tone, some initials must be replaced with
+        # their voiceless versions
+        if initial in MANDARIN_IPA_VOICELESS_INITIALS:
+            initial = MANDARIN_IPA_VOICELESS_INITIALS[initial]
+        if final == "ɤ":
+            final = "ə"
+
+    return syllable_tone, normalize("NFC", glottal + initial + final)
 
 
 def pinyin_to_IPA(pinyin: str, use_spaces_to_segment: bool = False) -> str:
@@ -609,129 +744,57 @@ def pinyin_to_IPA(pinyin: str, use_spaces_to_segment: bool = False) -> str:
     Returns:
         str: String of Mandarin Sinological IPA syllables
     """
-
-    def convert_ipa_syllable(syllable):
-        initial, final = "", ""
-        if syllable == "ng":
-            final = MANDARIN_IPA_FINALS[syllable]
-        else:
-            match = MANDARIN_IPA_SYLLABLE_REGEX.match(syllable)
-            if not match:
-                return syllable
-
-            conversion_failure = False
-            if match.group(1):
-                if match.group(1) not in MANDARIN_IPA_INITIALS:
-                    conversion_failure = True
-                else:
-                    initial = MANDARIN_IPA_INITIALS[match.group(1)]
-            if match.group(2):
-                if match.group(2) not in MANDARIN_IPA_FINALS:
-                    conversion_failure = True
-                else:
-                    final = MANDARIN_IPA_FINALS[match.group(2)]
-
-            # Exit early if any initial or final could not be converted
-            if conversion_failure:
-                return match.group(1), match.group(2)
-
-        # Replace close front unrounded vowel with syllable retroflex sibilant
-        # fricative (+ voiced retroflex approximant if erhua) in Pinyin
-        # starting with ch, sh, zh, or r
-        if initial in ("ʈ͡ʂʰ", "ʂ", "ʈ͡ʂ", "ʐ"):
-            if final == "ir":
-                final = "ʐ̩ɻ"
-            elif final == "i":
-                final = "ʐ̩"
-
-        # Replace close front unrounded vowel with syllablic alveolar sibilant
-        # fricative (+ voiced retroflex approximant if erhua) in Pinyin
-        # starting with c, s, or z
-        if initial in ("t͡sʰ", "s", "t͡s"):
-            if final == "ir":
-                final = "z̩ɻ"
-            elif final == "i":
-                final = "z̩̩"
-
-        if initial == "ʐ" and final == "ʐ̩":
-            initial = ""
-
-        return initial, final
-
     if not pinyin:
         return pinyin
 
-    if use_spaces_to_segment:
-        syllables = pinyin.split()
-    else:
-        _, syllables = segment_pinyin(pinyin)
+    syllables = split_pinyin(pinyin, use_spaces_to_segment)
 
-    # Precompute list of tones corresponding to each syllable
-    # This list is later used for tone sandhi reasons
+    # Convert every syllable first, as the tone of each syllable is later
+    # needed by its neighbours for tone sandhi reasons
     # (e.g. 3->3 sandhi, x->5 sandhi, etc.)
-    syllable_tones = []
-    for syllable in syllables:
-        syllable_tone = -1
-        for pinyin_tone in PINYIN_TONES:
-            syllable_tone_idx = syllable.find(str(pinyin_tone))
-            if syllable_tone_idx != -1:
-                syllable_tone = pinyin_tone
-                syllable_tones.append((pinyin_tone, syllable_tone_idx))
-                break
-        if syllable_tone == -1:
-            syllable_tones.append((-1, -1))
+    ipa = get_pinyin_to_IPA()
+    converted = [
+        ipa.get(syllable) or convert_IPA_syllable(syllable)
+        for syllable in syllables
+    ]
 
-    res = []
-
-    for syllable_idx, syllable in enumerate(syllables):
-        glottal, initial, final, tone = "", "", "", ""
+    return apply_IPA_tones(syllables, converted)
 
-        if (len(syllable) == 1) or (syllable in SPECIAL_CHARACTERS):
-            # Most numbers, single characters, etc are not Pinyin
-            res.append(syllable)
-            continue
 
-        syllable_tone, syllable_tone_idx = syllable_tones[syllable_idx]
-        if syllable_tone_idx == -1:
-            # If there is no tone, the syllable cannot be converted to Zhuyin
-            res.append(syllable)
-            continue
+def apply_IPA_tones(
+    syllables: list[str], converted: list[tuple[int, str | None]]
+) -> str:
+    """Adds the tone letters to converted Pinyin syllables, taking the tone
+    sandhi with the neighbouring syllables into account.
 
-        # Figure out whether this syllable needs a glottal stop
-        syllable_without_tone = (
-            syllable[:syllable_tone_idx] + syllable[syllable_tone_idx + 1:]
-        )
-        if syllable_without_tone in MANDARIN_IPA_GLOTTAL:
-            glottal = "ˀ"
+    Args:
+        syllables (list[str]): Raw Pinyin syllables
+        converted (list[tuple[int, str | None]]): Tone and toneless IPA of
+            each syllable, as returned by convert_IPA_syllable
 
-        # Mark close front rounded vowel with v instead of "u"
-        syllable_without_tone = syllable_without_tone.replace("u:", "v")
-        syllable_without_tone = MANDARIN_CLOSE_FRONT_ROUNDED_VOWEL_REGEX.sub(
-            r"\1v", syllable_without_tone
-        )
+    Returns:
+        str: String of Mandarin Sinological IPA syllables
+    """
+    res = []
 
-        # Convert main part of the Mandarin syllable
-        initial, final = convert_ipa_syllable(syllable_without_tone)
+    for syllable_idx, (syllable_tone, ipa_syllable) in enumerate(converted):
+        if ipa_syllable is None:
+            res.append(syllables[syllable_idx])
+            continue
 
         # Convert tone
         if syllable_idx + 1 < len(syllables):
-            next_tone = syllable_tones[syllable_idx + 1][0]
+            next_tone = converted[syllable_idx + 1][0]
         else:
             next_tone = "-1"
 
         if syllable_idx > 0:
-            prev_tone = syllable_tones[syllable_idx - 1][0]
+            prev_tone = converted[syllable_idx - 1][0]
         else:
             prev_tone = "-1"
 
         match int(syllable_tone):
             case 5:
-                # When neutral tone, some initials must be replaced with
-                # their voiceless versions
-                if initial in MANDARIN_IPA_VOICELESS_INITIALS:
-                    initial = MANDARIN_IPA_VOICELESS_INITIALS[initial]
-                if final == "ɤ":
-                    final = "ə"
                 tone = (
                     ""
                     if prev_tone == "-1"
@@ -759,11 +822,60 @@ def pinyin_to_IPA(pinyin: str, use_spaces_to_segment: bool = False) -> str:
             case _:
                 tone = MANDARIN_IPA_TONES[syllable_tone - 1]
 
-        res.append(normalize("NFC", glottal + initial + final + tone))
+        # Tone letters never combine with the preceding characters, so the
+        # syllable stays in NFC
+        res.append(ipa_syllable + tone)
 
     return " ".join(res)
 
 
+# Every toned syllable that can be written with the Pinyin initials and
+# finals (including ones that do not occur in Mandarin, and the ü and v
+# spellings of u:) or as an interjection, mapped to its pretty Pinyin,
+# Zhuyin and IPA forms, so that conversions are a single lookup per
+# syllable. Tokens that are not in the inventory go through the conversion
+# rules instead.
+# The inventory and tables are built the first time they are used rather
+# than on import, as building them takes a good part of the startup time of
+# a worker.
+PINYIN_INTERJECTIONS = ("m", "n", "ng", "hm", "hng", "r")
+
+
+@functools.cache
+def get_pinyin_syllables() -> tuple[str, ...]:
+    return tuple(
+        dict.fromkeys(
+            [
+                f"{initial}{spelling}{tone}"
+                for initial in ("", *PINYIN_INITIALS, "y", "w")
+                for final in PINYIN_FINALS
+                for spelling in (final, final.replace("u:", "ü"), final.replace("u:", "v"))
+                for tone in PINYIN_TONES
+            ]
+            + [
+                f"{interjection}{tone}"
+                for interjection in PINYIN_INTERJECTIONS
+                for tone in PINYIN_TONES
+            ]
+        )
+    )
+
+
+@functools.cache
+def get_pinyin_to_pretty() -> dict[str, str]:
+    return {syllable: convert_pretty_syllable(syllable) for syllable in get_pinyin_syllables()}
+
+
+@functools.cache
+def get_pinyin_to_zhuyin() -> dict[str, str]:
+    return {syllable: convert_zhuyin_syllable(syllable) for syllable in get_pinyin_syllables()}
+
+
+@functools.cache
+def get_pinyin_to_IPA() -> dict[str, tuple[int, str | None]]:
+    return {syllable: convert_IPA_syllable(syllable) for syllable in get_pinyin_syllables()}
+
+
 def pinyin_sound_changes(syllables: list[str]) -> list[str]:
     """Accounts for changes in pronunciation by modifying syllables
     *after* being segmented.
@@ -834,6 +946,37 @@ def pinyin_sound_changes(syllables: list[str]) -> list[str]:
     return res
 
 
+# Initials that pinyin_sound_changes lets match each other, mapped to the
+# one that stands for them in fuzzy keys
+PINYIN_FUZZY_KEY_INITIALS = {"zh": "z", "ch": "c", "sh": "s", "n": "l", "r": "l"}
+
+
+def get_pinyin_fuzzy_key(syllable: str) -> str:
+    """Gives the same key to the spellings of a Pinyin syllable that
+    pinyin_sound_changes lets match each other, such as "shang4" and "san4".
+
+    Args:
+        syllable (str): Pinyin syllable, with or without its tone
+
+    Returns:
+        str: Syllable with merged sounds replaced by a single spelling, e.g.
+        "san4"
+    """
+    tone = ""
+    if syllable[-1:].isdigit():
+        syllable, tone = syllable[:-1], syllable[-1]
+
+    for initial in (syllable[:2], syllable[:1]):
+        if initial in PINYIN_FUZZY_KEY_INITIALS:
+            syllable = PINYIN_FUZZY_KEY_INITIALS[initial] + syllable[len(initial):]
+            break
+
+    if syllable.endswith(("ang", "eng", "ing")):
+        syllable = syllable[:-1]
+
+    return syllable + tone
+
+
 def segment_pinyin(
     pinyin: str,
     remove_special_characters: bool = True,
@@ -970,3 +1113,312 @@ def segment_pinyin(
             valid_pinyin = False
 
     return [valid_pinyin, res]
+
+
+# Syllables that Pinyin can be split into: every initial followed by every
+# final, or a final on its own (a final starting with i, u or u: is written
+# with y or w when it has no initial)
+PINYIN_SEGMENTATION_SYLLABLES = frozenset(
+    f"{initial}{spelling}"
+    for initial in ("", *PINYIN_INITIALS, "y", "w")
+    for final in PINYIN_FINALS
+    if initial or final[0] not in "iu"
+    for spelling in (final, final.replace("u:", "ü"), final.replace("u:", "v"))
+)
+# Longest syllable, with erhua and a tone
+PINYIN_MAX_SYLLABLE_LEN = max(map(len, PINYIN_SEGMENTATION_SYLLABLES)) + 2
+# Number of segmentations searched for ambiguous Pinyin
+PINYIN_SEGMENTATION_LIMIT = 3
+
+PINYIN_SEPARATORS = frozenset((" ", "'", "*", "?", *SPECIAL_CHARACTERS))
+
+
+def get_toneless_syllable(syllable: str) -> str:
+    if syllable and syllable[-1].isnumeric():
+        return syllable[:-1]
+    return syllable
+
+
+def get_syllable_cost(
+    syllable: str, syllable_frequencies: dict[str, int] | None
+) -> float | None:
+    syllable = get_toneless_syllable(syllable)
+    if syllable not in PINYIN_SEGMENTATION_SYLLABLES:
+        if not (syllable.endswith("r") and syllable[:-1] in PINYIN_SEGMENTATION_SYLLABLES):
+            return None
+        # Erhua
+        syllable = syllable[:-1]
+
+    if not syllable_frequencies:
+        return 0.0
+    return -math.log1p(syllable_frequencies.get(syllable, 0))
+
+
+def rank_pinyin_word_segmentations(
+    word: str, limit: int, syllable_frequencies: dict[str, int] | None = None
+) -> list[tuple[tuple[int, float], tuple[str, ...]]]:
+    """Finds the best ways of splitting a word into Pinyin syllables, by
+    going through the lattice of every syllable that starts and ends at each
+    position of the word.
+
+    Args:
+        word (str): Lowercase Pinyin without separators, such as "fangan"
+        limit (int): Number of segmentations to return
+        syllable_frequencies (dict[str, int] | None, optional): Number of
+            occurrences of each toneless syllable, used to rank segmentations
+            with as many syllables. Defaults to None.
+
+    Returns:
+        list[tuple[tuple[int, float], tuple[str, ...]]]: Score (number of
+            syllables, then rarity of the syllables) and syllables of each
+            segmentation, best first. Empty if the word cannot be split into
+            syllables.
+    """
+    # Best segmentations of each prefix of the word
+    best = [[] for _ in range(len(word) + 1)]
+    best[0] = [((0, 0.0), ())]
+
+    for end in range(1, len(word) + 1):
+        candidates = []
+        for start in range(max(0, end - PINYIN_MAX_SYLLABLE_LEN), end):
+            if not best[start]:
+                continue
+
+            syllable = word[start:end]
+            cost = get_syllable_cost(syllable, syllable_frequencies)
+            if cost is None:
+                continue
+
+            for (count, rarity), syllables in best[start]:
+                candidates.append(((count + 1, rarity + cost), (*syllables, syllable)))
+
+        best[end] = heapq.nsmallest(limit, candidates)
+
+    return best[-1]
+
+
+def segment_pinyin_alternatives(
+    pinyin: str,
+    remove_special_characters: bool = True,
+    remove_glob_characters: bool = True,
+    limit: int = PINYIN_SEGMENTATION_LIMIT,
+    syllable_frequencies: dict[str, int] | None = None,
+) -> list[list[str]]:
+    """Lists the most likely segmentations of ambiguous Pinyin, such as
+    "xian" (xian or xi an) or "fangan" (fang an or fan gan).
+
+    Words between separators are split with rank_pinyin_word_segmentations;
+    every combination of their best splits is then segmented by
+    segment_pinyin, with apostrophes marking the syllable boundaries. Words
+    that cannot be split into syllables are left to segment_pinyin as is.
+
+    Args:
+        pinyin (str): String of Pinyin syllables, possibly with special
+            characters or glob characters
+        remove_special_characters (bool, optional): Do not include special
+            characters in output lists. Defaults to True.
+        remove_glob_characters (bool, optional): Do not include glob characters
+            in output lists. Defaults to True.
+        limit (int, optional): Maximum number of segmentations. Defaults to
+            PINYIN_SEGMENTATION_LIMIT.
+        syllable_frequencies (dict[str, int] | None, optional): Number of
+            occurrences of each toneless syllable, used to rank segmentations
+            with as many syllables. Defaults to None.
+
+    Returns:
+        list[list[str]]: Segmentations, in the format of segment_pinyin,
+            starting with the one returned by segment_pinyin
+    """
+    pinyin = pinyin.lower()
+    res = [
+        segment_pinyin(pinyin, remove_special_characters, remove_glob_characters)[1]
+    ]
+    if limit <= 1:
+        return res
+
+    # Best combinations of the splits of each word, with the spans of the
+    # words and the syllables they are split into
+    combinations = [((0, 0.0), ())]
+    word_start = None
+    for idx in range(len(pinyin) + 1):
+        if idx < len(pinyin) and pinyin[idx] not in PINYIN_SEPARATORS:
+            if word_start is None:
+                word_start = idx
+            continue
+        if word_start is None:
+            continue
+
+        splits = rank_pinyin_word_segmentations(
+            pinyin[word_start:idx], limit, syllable_frequencies
+        )
+        if splits:
+            combinations = heapq.nsmallest(
+                limit,
+                (
+                    (
+                        (count + word_count, rarity + word_rarity),
+                        (*words, (word_start, idx, syllables)),
+                    )
+                    for (count, rarity), words in combinations
+                    for (word_count, word_rarity), syllables in splits
+                ),
+            )
+        word_start = None
+
+    for _, words in combinations:
+        separated, prev_end = "", 0
+        for start, end, syllables in words:
+            separated += pinyin[prev_end:start] + "'".join(syllables)
+            prev_end = end
+        separated += pinyin[prev_end:]
+
+        _, syllables = segment_pinyin(
+            separated, remove_special_characters, remove_glob_characters
+        )
+        if syllables not in res:
+            res.append(syllables)
+
+    return res[:limit]
+
+
+def pretty_pinyin_batch(pinyins: Iterable[str]) -> list[str]:
+    """Converts many raw Pinyin strings to pretty Pinyin at once, see
+    pretty_pinyin. Each distinct syllable is converted once for the whole
+    batch.
+
+    Args:
+        pinyins (Iterable[str]): Strings of valid raw Pinyin syllables
+
+    Returns:
+        list[str]: Strings of pretty Pinyin syllables, in order
+    """
+    pretty = batch_utils.SyllableCache(get_pinyin_to_pretty(), convert_pretty_syllable)
+
+    return [
+        " ".join([pretty[syllable] for syllable in pinyin.split()])
+        if pinyin and not pinyin.isspace()
+        else pinyin
+        for pinyin in pinyins
+    ]
+
+
+def pinyin_to_zhuyin_batch(
+    pinyins: Iterable[str],
+    use_spaces_to_segment: bool = False,
+    processes: int | None = None,
+) -> list[str]:
+    """Converts many raw Pinyin strings to Zhuyin at once, see
+    pinyin_to_zhuyin. Each distinct string is segmented once, and each
+    distinct syllable converted once, for the whole batch.
+
+    Args:
+        pinyins (Iterable[str]): Strings of valid raw Pinyin syllables
+        use_spaces_to_segment (bool, optional): See pinyin_to_zhuyin.
+            Defaults to False.
+        processes (int | None, optional): Number of worker processes that
+            segment the strings, see batch_utils.map_distinct. Defaults to
+            None.
+
+    Returns:
+        list[str]: Strings of Zhuyin syllables, in order
+    """
+    pinyins = list(pinyins)
+    segmentations = batch_utils.map_distinct(
+        functools.partial(split_pinyin, use_spaces_to_segment=use_spaces_to_segment),
+        filter(None, pinyins),
+        processes,
+    )
+    zhuyin = batch_utils.SyllableCache(get_pinyin_to_zhuyin(), convert_zhuyin_syllable)
+
+    return [
+        " ".join([zhuyin[syllable] for syllable in segmentations[pinyin]])
+        if pinyin
+        else pinyin
+        for pinyin in pinyins
+    ]
+
+
+def pinyin_to_IPA_batch(
+    pinyins: Iterable[str],
+    use_spaces_to_segment: bool = False,
+    processes: int | None = None,
+) -> list[str]:
+    """Converts many raw Pinyin strings to Mandarin Sinological IPA at once,
+    see pinyin_to_IPA and pinyin_to_zhuyin_batch.
+
+    Args:
+        pinyins (Iterable[str]): Strings of valid raw Pinyin syllables
+        use_spaces_to_segment (bool, optional): See pinyin_to_IPA.
+            Defaults to False.
+        processes (int | None, optional): Number of worker processes that
+            segment the strings. Defaults to None.
+
+    Returns:
+        list[str]: Strings of Mandarin Sinological IPA syllables, in order
+    """
+    pinyins = list(pinyins)
+    segmentations = batch_utils.map_distinct(
+        functools.partial(split_pinyin, use_spaces_to_segment=use_spaces_to_segment),
+        filter(None, pinyins),
+        processes,
+    )
+    ipa = batch_utils.SyllableCache(get_pinyin_to_IPA(), convert_IPA_syllable)
+
+    return [
+        apply_IPA_tones(
+            segmentations[pinyin],
+            [ipa[syllable] for syllable in segmentations[pinyin]],
+        )
+        if pinyin
+        else pinyin
+        for pinyin in pinyins
+    ]
+
+
+def extract_pinyin_tones_batch(
+    pinyins: Iterable[str], processes: int | None = None
+) -> list[list[int]]:
+    """Gets the list of tones of many Pinyin strings at once, see
+    extract_pinyin_tones. Repeated strings share the same list.
+
+    Args:
+        pinyins (Iterable[str]): Strings of valid Pinyin syllables
+        processes (int | None, optional): Number of worker processes.
+            Defaults to None.
+
+    Returns:
+        list[list[int]]: The tones of each string, in order
+    """
+    return batch_utils.batch_map(extract_pinyin_tones, pinyins, processes)
+
+
+def segment_pinyin_batch(
+    pinyins: Iterable[str],
+    remove_special_characters: bool = True,
+    remove_glob_characters: bool = True,
+    processes: int | None = None,
+) -> list[tuple[bool, list[str]]]:
+    """Segments many Pinyin strings at once, see segment_pinyin. Repeated
+    strings share the same segmentation.
+
+    Args:
+        pinyins (Iterable[str]): Strings of valid Pinyin syllables
+        remove_special_characters (bool, optional): See segment_pinyin.
+            Defaults to True.
+        remove_glob_characters (bool, optional): See segment_pinyin.
+            Defaults to True.
+        processes (int | None, optional): Number of worker processes.
+            Defaults to None.
+
+    Returns:
+        list[tuple[bool, list[str]]]: Segmentation of each string, in order
+    """
+    return batch_utils.batch_map(
+        functools.partial(
+            segment_pinyin,
+            remove_special_characters=remove_special_characters,
+            remove_glob_characters=remove_glob_characters,
+        ),
+        pinyins,
+        processes,
+    )
@@ -1,16 +1,26 @@
 import copy
+import itertools
 import json
 
+from collections.abc import Callable, Iterable, Iterator
+
 from . import cantonese_utils, chinese_utils, mandarin_utils
 from ..models import (
     Definition,
     DefinitionsSet,
+    EntriesPage,
     Entry,
     SourceSentence,
     Translation,
     TranslationSet,
 )
 
+# Characters that may appear in a syllable looked up in a syllable index;
+# anything else (such as glob characters) requires the regex fallback
+SYLLABLE_INDEX_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789:")
+# Maximum number of spellings a single fuzzy syllable may expand into
+MAX_SYLLABLE_ALTERNATIVES = 64
+
 
 def construct_romanization_query(syllables: list[str], delimiter: str) -> str:
     """Appends wildcard delimiter to each syllable if the syllable does
@@ -101,7 +111,7 @@ def prepare_jyutping_bind_values(jyutping: str, fuzzy_jyutping: bool) -> str:
         query_param = construct_romanization_query(jyutping_syllables, "?")
 
     if fuzzy_jyutping:
-        query_param = f"^{query_param.replace("*", ".*").replace("?", ".").replace("!", "?")}"
+        query_param = f"^{query_param.replace('*', '.*').replace('?', '.').replace('!', '?')}"
         if search_exact_match or not append_wildcard:
             query_param = f"{query_param}$"
         else:
@@ -124,6 +134,32 @@ def prepare_pinyin_bind_values(pinyin: str, fuzzy_pinyin: bool) -> str:
     Returns:
         str: Formatted, segmented, cleaned up Pinyin string
     """
+    return prepare_pinyin_bind_value_alternatives(pinyin, fuzzy_pinyin, limit=1)[0]
+
+
+def prepare_pinyin_bind_value_alternatives(
+    pinyin: str,
+    fuzzy_pinyin: bool,
+    syllable_frequencies: dict[str, int] | None = None,
+    limit: int = mandarin_utils.PINYIN_SEGMENTATION_LIMIT,
+) -> tuple[str, ...]:
+    """Formats a Pinyin bind value for each likely segmentation of the user
+    input, so that ambiguous Pinyin (such as "xian", for xian or xi an) can
+    be searched for in a single statement.
+
+    Args:
+        pinyin (str): String containing raw user input
+        fuzzy_pinyin (bool): Bool to toggle processing of fuzzy Pinyin modifications
+        syllable_frequencies (dict[str, int] | None, optional): Number of
+            occurrences of each toneless syllable, used to rank
+            segmentations. Defaults to None.
+        limit (int, optional): Maximum number of bind values. Defaults to
+            mandarin_utils.PINYIN_SEGMENTATION_LIMIT.
+
+    Returns:
+        tuple[str, ...]: Formatted bind values, starting with the one for the
+            segmentation returned by mandarin_utils.segment_pinyin
+    """
     # Exact match is specified by enclosing the query in double-quotes
     search_exact_match = len(pinyin) >= 3 and pinyin[0] == '"' and pinyin[-1] == '"'
     # Wildcard character should only be appended if the last character is not "$"
@@ -131,29 +167,215 @@ def prepare_pinyin_bind_values(pinyin: str, fuzzy_pinyin: bool) -> str:
 
     if search_exact_match:
         # Remove the double-quotes
-        pinyin_syllables = pinyin[1:-1].split()
+        segmentations = [pinyin[1:-1].split()]
     else:
-        _, pinyin_syllables = mandarin_utils.segment_pinyin(pinyin)
-
-    if not search_exact_match and fuzzy_pinyin:
-        pinyin_syllables = mandarin_utils.pinyin_sound_changes(pinyin_syllables)
+        segmentations = mandarin_utils.segment_pinyin_alternatives(
+            pinyin, limit=limit, syllable_frequencies=syllable_frequencies
+        )
 
-    if search_exact_match:
-        query_param = " ".join(pinyin_syllables)
-    else:
-        query_param = construct_romanization_query(pinyin_syllables, "?")
+    res = []
+    for pinyin_syllables in segmentations:
+        if not search_exact_match and fuzzy_pinyin:
+            pinyin_syllables = mandarin_utils.pinyin_sound_changes(pinyin_syllables)
 
-    if fuzzy_pinyin:
-        query_param = f"^{query_param.replace("*", ".*").replace("?", ".").replace("!", "?")}"
-        if search_exact_match or not append_wildcard:
-            query_param = f"{query_param}$"
+        if search_exact_match:
+            query_param = " ".join(pinyin_syllables)
         else:
-            query_param = f"{query_param}.*"
+            query_param = construct_romanization_query(pinyin_syllables, "?")
+
+        if fuzzy_pinyin:
+            query_param = f"^{query_param.replace('*', '.*').replace('?', '.').replace('!', '?')}"
+            if search_exact_match or not append_wildcard:
+                query_param = f"{query_param}$"
+            else:
+                query_param = f"{query_param}.*"
+        else:
+            if append_wildcard and not search_exact_match:
+                query_param = f"{query_param}*"
+
+        res.append(query_param)
+
+    return tuple(dict.fromkeys(res))
+
+
+def unfold_fuzzy_syllable(syllable: str) -> list[str] | None:
+    """Lists every spelling matched by a syllable of a fuzzy bind value,
+    which may contain groups of alternatives and optional characters or
+    groups (e.g. "(n|l)ei" or "(ng)?o").
+
+    Args:
+        syllable (str): Single syllable from the regex produced by
+            prepare_jyutping_bind_values or prepare_pinyin_bind_values
+
+    Returns:
+        list[str] | None: All possible spellings of that syllable, or None
+            if the syllable uses regex syntax that cannot be unfolded
+    """
+
+    def unfold_sequence(idx: int) -> tuple[list[str], int]:
+        res = [""]
+        while idx < len(syllable) and syllable[idx] not in "|)":
+            if syllable[idx] == "(":
+                options, idx = unfold_alternatives(idx + 1)
+            elif syllable[idx] in SYLLABLE_INDEX_CHARACTERS:
+                options = [syllable[idx]]
+                idx += 1
+            else:
+                raise ValueError(f"Unsupported character {syllable[idx]}")
+
+            if idx < len(syllable) and syllable[idx] == "?":
+                # The previous character or group is optional
+                options = options + [""]
+                idx += 1
+
+            res = [prefix + option for prefix in res for option in options]
+            if len(res) > MAX_SYLLABLE_ALTERNATIVES:
+                raise ValueError("Too many alternatives")
+        return res, idx
+
+    def unfold_alternatives(idx: int) -> tuple[list[str], int]:
+        res, idx = unfold_sequence(idx)
+        while idx < len(syllable) and syllable[idx] == "|":
+            options, idx = unfold_sequence(idx + 1)
+            res += options
+        if idx >= len(syllable) or syllable[idx] != ")":
+            raise ValueError("Unbalanced parentheses")
+        return res, idx + 1
+
+    try:
+        res, idx = unfold_sequence(0)
+    except ValueError:
+        return None
+
+    if idx != len(syllable):
+        return None
+
+    return list(dict.fromkeys(res))
+
+
+def parse_fuzzy_bind_value(query_param: str) -> tuple[list[list[str]], bool] | None:
+    """Converts a fuzzy bind value into the GLOB patterns that each syllable
+    of a matching entry must satisfy, so that it can be looked up in a
+    syllable index rather than matched against every entry.
+
+    Args:
+        query_param (str): Regex produced by prepare_jyutping_bind_values
+            or prepare_pinyin_bind_values with fuzzy matching enabled
+
+    Returns:
+        tuple[list[list[str]], bool] | None: For each syllable position,
+            the GLOB patterns of which at least one must match, and whether
+            the entry must end after the last position. None if the bind
+            value cannot be expressed as per-syllable patterns (e.g. because
+            it contains a wildcard spanning several syllables).
+    """
+    if not query_param.startswith("^"):
+        return None
+
+    if query_param.endswith("$"):
+        anchored = True
+        body = query_param[1:-1]
+    elif query_param.endswith(".*"):
+        anchored = False
+        body = query_param[1:-2]
     else:
-        if append_wildcard and not search_exact_match:
-            query_param = f"{query_param}*"
+        return None
+
+    syllables = body.split(" ")
+    res = []
+    for idx, syllable in enumerate(syllables):
+        # A trailing "." stands in for the (unspecified) tone
+        any_tone = syllable.endswith(".")
+        if any_tone:
+            syllable = syllable[:-1]
+
+        spellings = unfold_fuzzy_syllable(syllable)
+        if not spellings:
+            return None
+
+        suffix = "?" if any_tone else ""
+        if not anchored and idx == len(syllables) - 1:
+            # The last syllable may be the beginning of a longer entry
+            suffix += "*"
+
+        patterns = [spelling + suffix for spelling in spellings if spelling + suffix]
+        if not patterns:
+            return None
+        res.append(patterns)
+
+    return res, anchored
+
+
+def get_fuzzy_key_patterns(
+    patterns: list[list[str]], get_fuzzy_key: Callable[[str], str]
+) -> list[list[str] | None]:
+    """Converts the GLOB patterns returned by parse_fuzzy_bind_value into
+    GLOB patterns of fuzzy keys, so that the spellings that only differ by
+    a sound change are looked up at once.
+
+    Args:
+        patterns (list[list[str]]): GLOB patterns for each position
+        get_fuzzy_key (Callable[[str], str]): Function giving the fuzzy key
+            of a syllable, such as cantonese_utils.get_jyutping_fuzzy_key
+
+    Returns:
+        list[list[str] | None]: Fuzzy key patterns for each position, or
+            None for a position that may be the beginning of a longer
+            syllable, whose fuzzy key could start differently
+    """
+    res = []
+    for position_patterns in patterns:
+        if any(pattern.endswith("*") for pattern in position_patterns):
+            res.append(None)
+            continue
+
+        keys = []
+        for pattern in position_patterns:
+            if pattern.endswith("?"):
+                # Keep the placeholder for the tone after the key
+                keys.append(get_fuzzy_key(pattern[:-1]) + "?")
+            else:
+                keys.append(get_fuzzy_key(pattern))
+        res.append(list(dict.fromkeys(keys)))
+
+    return res
 
-    return query_param
+
+def construct_syllable_index_query(
+    table: str | list[str], patterns: list[list[str]], anchored: bool, name: str
+) -> tuple[str, dict[str, str]]:
+    """Builds a statement that selects the ids of entries matching the
+    patterns returned by parse_fuzzy_bind_value, by taking the union of
+    the posting lists of every alternative at a position, then the
+    intersection across positions.
+
+    Args:
+        table (str | list[str]): Name of the syllable index table, or of
+            the table to look up each position in
+        patterns (list[list[str]]): GLOB patterns for each position
+        anchored (bool): Whether the entry must end after the last position
+        name (str): Prefix for the names of the bind parameters
+
+    Returns:
+        tuple[str, dict[str, str]]: The statement, and its named bind values
+    """
+    selects = []
+    bind_values = {}
+    for position, position_patterns in enumerate(patterns):
+        is_last = " AND is_last" if anchored and position == len(patterns) - 1 else ""
+        position_table = table if isinstance(table, str) else table[position]
+
+        unions = []
+        for idx, pattern in enumerate(position_patterns):
+            param = f"{name}_{position}_{idx}"
+            bind_values[param] = pattern
+            unions.append(
+                f"SELECT fk_entry_id FROM {position_table} "
+                f"WHERE position = {position} AND syllable GLOB :{param}{is_last}"
+            )
+        selects.append(f"SELECT fk_entry_id FROM ({' UNION '.join(unions)})")
+
+    return " INTERSECT ".join(selects), bind_values
 
 
 def parse_returned_records(records: list[str]) -> list[Entry]:
@@ -221,21 +443,174 @@ def parse_returned_records(records: list[str]) -> list[Entry]:
     return res
 
 
-def parse_existence(records: list[str]) -> bool:
-    """Given a cursor's readall(), parses whether record contains 0 or 1
+def encode_cursor(keys: tuple) -> str:
+    """Serializes the sort keys of the last entry of a page, so that the
+    next page can start right after it.
 
     Args:
-        records (list[str]): Result from a cursor.readall()
+        keys (tuple): Values of the columns that results are ordered by
 
     Returns:
-        bool: True if the record contains 1, 0 otherwise
+        str: Cursor that can be passed back to decode_cursor
+    """
+    return ",".join(repr(key) for key in keys)
+
+
+def decode_cursor(cursor: str | None, length: int) -> tuple | None:
+    """Parses a cursor produced by encode_cursor.
+
+    Args:
+        cursor (str | None): Cursor provided by the client
+        length (int): Number of sort keys expected by the query
+
+    Returns:
+        tuple | None: The sort keys, or None if the cursor is missing or
+            malformed (in which case the first page should be returned)
+    """
+    if not cursor:
+        return None
+
+    try:
+        keys = tuple(float(key) for key in cursor.split(","))
+    except ValueError:
+        return None
+
+    if len(keys) != length:
+        return None
+
+    return keys
+
+
+def parse_entry_rows(rows: Iterable[tuple]) -> Entry:
+    """Builds an entry from the flat rows containing its definitions.
+
+    Each row is expected to contain, in order: the traditional, simplified,
+    Jyutping and Pinyin of the entry, the id and name of the source of the
+    definition, then the definition. Rows must be ordered by source.
+
+    Args:
+        rows (Iterable[tuple]): Rows of a single entry
+
+    Returns:
+        Entry: The entry
+    """
+    sets = []
+    for _, source_rows in itertools.groupby(rows, key=lambda row: row[4]):
+        source_rows = list(source_rows)
+        definitions = [
+            Definition(row[6].replace(r"\n", "\n"), "", []) for row in source_rows
+        ]
+        sets.append(DefinitionsSet(source_rows[0][5], definitions))
+
+    return Entry(
+        traditional=source_rows[0][0],
+        simplified=source_rows[0][1],
+        jyutping=source_rows[0][2],
+        pinyin=source_rows[0][3],
+        definitions_sets=sets,
+    )
+
+
+def construct_search_query(
+    matching_query: str,
+    order: tuple[tuple[str, bool], ...],
+    common_tables: str | None = None,
+) -> str:
+    """Builds the statement that selects one page of the entries returned by
+    a search, ordered by the given columns and starting after the entry
+    whose sort keys are bound to :cursor_0, :cursor_1, etc. (or at the first
+    entry if :cursor_0 is NULL).
+
+    The statement returns the id of each entry, the total number of matching
+    entries (counted up to one more than :count_limit, so that broad
+    searches are not counted in full), then the sort keys of each entry, for
+    one more entry than the page size bound to :limit (to detect whether
+    there is a next page).
+
+    Args:
+        matching_query (str): Statement selecting the id and the sort
+            columns of every matching entry
+        order (tuple[tuple[str, bool], ...]): Name of each sort column, and
+            whether it is sorted in descending order
+        common_tables (str | None, optional): Common table expressions
+            that matching_query depends on. Defaults to None.
+
+    Returns:
+        str: The statement
     """
-    if len(records) > 1 or not len(records):
-        return False
+    # Entries after the cursor have a sort key past the cursor's, with all
+    # previous sort keys being equal
+    after_cursor = []
+    for idx, (column, descending) in enumerate(order):
+        conditions = [f"{order[prev][0]} = :cursor_{prev}" for prev in range(idx)]
+        conditions.append(f"{column} {'<' if descending else '>'} :cursor_{idx}")
+        after_cursor.append(f"({' AND '.join(conditions)})")
+
+    with_common_tables = f"{common_tables}," if common_tables else ""
+    after_cursor_condition = "\n  OR ".join(after_cursor)
+    columns = ", ".join(column for column, _ in order)
+    order_by = ", ".join(
+        f"{column} {'DESC' if descending else 'ASC'}" for column, descending in order
+    )
+
+    return f"""
+WITH {with_common_tables}
+
+matching_entries AS MATERIALIZED (
+{matching_query}
+),
+
+matching_count AS (
+SELECT COUNT(*) AS total
+FROM (SELECT 1 FROM matching_entries LIMIT :count_limit + 1)
+)
+
+SELECT entry_id, (SELECT total FROM matching_count) AS total, {columns}
+FROM matching_entries
+WHERE :cursor_0 IS NULL
+  OR {after_cursor_condition}
+ORDER BY {order_by}
+LIMIT :limit + 1
+"""
+
 
-    record = records[0]
-    existence_col = record[0]
-    return existence_col
+def parse_returned_rows_page(
+    id_rows: list[tuple], rows: Iterable[tuple], limit: int, count_limit: int
+) -> EntriesPage:
+    """Parses the results of a search run by queries.search_entries into a
+    page of entries, grouping the rows of each entry as they are read.
+
+    Args:
+        id_rows (list[tuple]): Rows returned by the statement built by
+            construct_search_query
+        rows (Iterable[tuple]): Rows of the hydration statement, containing
+            the columns described in parse_entry_rows followed by the entry
+            id, ordered like id_rows; may be the cursor itself
+        limit (int): Number of entries per page
+        count_limit (int): Number of matching entries past which they are
+            no longer counted
+
+    Returns:
+        EntriesPage: The entries in this page, with the total number of
+            entries and the cursor of the next page
+    """
+    next_cursor = None
+    if len(id_rows) > limit:
+        id_rows = id_rows[:limit]
+        next_cursor = encode_cursor(id_rows[-1][2:])
+
+    entries = [
+        parse_entry_rows(entry_rows)
+        for _, entry_rows in itertools.groupby(rows, key=lambda row: row[7])
+    ]
+
+    total = id_rows[0][1]
+    return EntriesPage(
+        entries=entries,
+        total=min(total, count_limit),
+        total_capped=total > count_limit,
+        next_cursor=next_cursor,
+    )
 
 
 def parse_returned_sentences(records: list[str]) -> list[SourceSentence]:
@@ -1,8 +1,7 @@
-from flask import render_template
+from flask import g, render_template
 from flask_babel import _, pgettext
 
 from . import queries
-from .utils import script_detector
 
 
 def render_index(search_term: str = "", search_type: str = "auto"):
@@ -11,95 +10,85 @@ def render_index(search_term: str = "", search_type: str = "auto"):
     )
 
 
-def render_search_auto(search_term: str) -> str:
-    if script_detector.contains_simplified_chinese(search_term):
-        entries = queries.query_simplified(search_term)
-        detected_search_type = _("caractères simplifiés")
-    elif script_detector.contains_traditional_chinese(
-        search_term
-    ) or script_detector.contains_chinese(search_term):
-        entries = queries.query_traditional(search_term)
-        detected_search_type = _("caractères traditionnels")
-    elif queries.query_jyutping_exists(search_term, fuzzy=False):
-        entries = queries.query_jyutping(search_term, fuzzy=False)
-        detected_search_type = _("Jyutping")
-    elif queries.query_jyutping_exists(search_term, fuzzy=True):
-        entries = queries.query_jyutping(search_term, fuzzy=True)
-        detected_search_type = pgettext("views.py", "Jyutping approximatif")
-    elif queries.query_pinyin_exists(search_term, fuzzy=False):
-        entries = queries.query_pinyin(search_term, fuzzy=False)
-        detected_search_type = _("Pinyin")
-    elif queries.query_pinyin_exists(search_term, fuzzy=True):
-        entries = queries.query_pinyin(search_term, fuzzy=True)
-        detected_search_type = pgettext("views.py", "Pinyin approximatif")
-    else:
-        entries = queries.query_full_text(search_term)
-        detected_search_type = _("français")
+def render_search_auto(search_term: str, cursor: str | None = None) -> str:
+    interpretation, page = queries.query_auto(search_term, cursor)
+    detected_search_type = {
+        queries.AUTO_SIMPLIFIED: _("caractères simplifiés"),
+        queries.AUTO_TRADITIONAL: _("caractères traditionnels"),
+        queries.AUTO_JYUTPING: _("Jyutping"),
+        queries.AUTO_FUZZY_JYUTPING: pgettext("views.py", "Jyutping approximatif"),
+        queries.AUTO_PINYIN: _("Pinyin"),
+        queries.AUTO_FUZZY_PINYIN: pgettext("views.py", "Pinyin approximatif"),
+        queries.AUTO_FULL_TEXT: _("français"),
+    }[interpretation]
+
+    # Keep track of the chosen interpretation so that it can be reported
+    # alongside the response
+    g.search_interpretation = interpretation
 
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=_("auto"),
         detected_search_type=detected_search_type,
-        entries=entries,
+        page=page,
     )
 
 
-def render_search_traditional(search_term: str) -> str:
-    entries = queries.query_traditional(search_term)
+def render_search_traditional(search_term: str, cursor: str | None = None) -> str:
+    page = queries.query_traditional(search_term, cursor)
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=_("traditionnel"),
-        entries=entries,
+        page=page,
     )
 
 
-def render_search_simplified(search_term: str) -> str:
-    entries = queries.query_simplified(search_term)
+def render_search_simplified(search_term: str, cursor: str | None = None) -> str:
+    page = queries.query_simplified(search_term, cursor)
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=_("simplifie"),
-        entries=entries,
+        page=page,
     )
 
 
-def render_search_jyutping(search_term: str, fuzzy: bool) -> str:
-    entries = queries.query_jyutping(search_term, fuzzy)
+def render_search_jyutping(search_term: str, fuzzy: bool, cursor: str | None = None) -> str:
+    page = queries.query_jyutping(search_term, fuzzy, cursor)
     search_type = _("jyutping-approximatif") if fuzzy else _("jyutping")
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=search_type,
-        entries=entries,
+        page=page,
     )
 
 
-def render_search_pinyin(search_term: str, fuzzy: bool) -> str:
-    entries = queries.query_pinyin(search_term, fuzzy)
+def render_search_pinyin(search_term: str, fuzzy: bool, cursor: str | None = None) -> str:
+    page = queries.query_pinyin(search_term, fuzzy, cursor)
     search_type = _("pinyin-approximatif") if fuzzy else _("pinyin")
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=search_type,
-        entries=entries,
+        page=page,
     )
 
 
-def render_search_french(search_term: str) -> str:
-    entries = queries.query_full_text(search_term)
+def render_search_french(search_term: str, cursor: str | None = None) -> str:
+    page = queries.query_full_text(search_term, cursor)
     return render_template(
         "dictionary_search.html",
         search_term=search_term,
         search_type=_("fr"),
-        entries=entries,
+        page=page,
     )
 
 
 def render_entry(entry: str, search_term: str = "", search_type: str = "search_traditional") -> str:
-    entries = queries.get_traditional(entry)
-    example_sample = queries.get_example_sample(entry)
+    entries, example_sample = queries.get_entry_page(entry)
 
     return render_template(
         "dictionary_entry.html",